@@ -1,17 +1,20 @@
 # app.py
 
-import matplotlib
-# 设置后端为 Agg，确保在无显示器的服务器环境下也能运行
-matplotlib.use('Agg') 
+import os
+# 设置后端为 Agg，确保在无显示器的服务器环境下也能运行 (matplotlib 在首次绘图时才导入)
+os.environ.setdefault('MPLBACKEND', 'Agg')
 
 from flask import Flask
-from waitress import serve
+from waitress import create_server
 import config
 from routes import bp as main_bp
 from utils.auth import load_keys # 确保启动时加载 Key
+from utils.warmup import start_warmup
 
 app = Flask(__name__)
 app.secret_key = config.SECRET_KEY 
+# 请求体总上限 (上传上限 + 表单字段余量)，超出时 Werkzeug 在解析阶段直接拒绝
+app.config['MAX_CONTENT_LENGTH'] = (config.UPLOAD_MAX_REQUEST_MB + 16) * 1024 * 1024
 
 # 注册蓝图 (路由)
 app.register_blueprint(main_bp)
@@ -24,5 +27,7 @@ if __name__ == '__main__':
     print("⚠️  请访问 http://223.109.143.195:8001 (或服务器IP)")
     print("✅ 已启用 Waitress 高并发模式，支持多任务同时运行")
     
-    # ✅ 使用 Waitress 启动
-    serve(app, host="0.0.0.0", port=8001, threads=100, connection_limit=200, channel_timeout=300)
\ No newline at end of file
+    # ✅ 使用 Waitress 启动：先绑定端口，再在后台预热 (字体、Pandoc、进程池)，预热期间即可接受请求
+    server = create_server(app, host="0.0.0.0", port=8001, threads=100, connection_limit=200, channel_timeout=300)
+    start_warmup()
+    server.run()
\ No newline at end of file
@@ -0,0 +1,152 @@
+# benchmarks/bench_charts.py
+# 图表规格 (内置渲染器) vs Python 绘图代码 (exec)：同一张图两种写法的渲染耗时与输出长度
+# 语料为按提示词模板生成的典型代码块，以及与之等价的 ```chart 规格
+# 用法: python benchmarks/bench_charts.py [--rounds 5] [--profile print]
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.plotpool import get_plot_pool, get_profile, normalize_plot_code, plot_source, _render, _render_chart
+
+HEADER = """import matplotlib.pyplot as plt
+import seaborn as sns
+import pandas as pd
+import numpy as np
+
+sns.set_theme(style="whitegrid", font='SimHei')
+plt.rcParams['axes.unicode_minus'] = False
+"""
+
+CORPUS = [
+    ("bar", HEADER + """
+data = {
+    '年份': ['2019', '2020', '2021', '2022', '2023'],
+    '营业收入': [12.5, 13.1, 15.8, 17.2, 19.6]
+}
+df = pd.DataFrame(data)
+fig, ax = plt.subplots(figsize=(10, 6))
+sns.barplot(data=df, x='年份', y='营业收入', hue='年份', palette='viridis', legend=False, ax=ax)
+ax.set_title("2019-2023年营业收入")
+ax.set_xlabel("年份")
+ax.set_ylabel("营业收入 (亿元)")
+""", {"type": "bar", "title": "2019-2023年营业收入", "x_label": "年份", "y_label": "营业收入", "unit": "亿元",
+      "labels": ["2019", "2020", "2021", "2022", "2023"],
+      "series": [{"name": "营业收入", "values": [12.5, 13.1, 15.8, 17.2, 19.6]}]}),
+
+    ("line", HEADER + """
+data = {
+    '季度': ['Q1', 'Q2', 'Q3', 'Q4'],
+    '线上': [320, 410, 380, 520],
+    '线下': [280, 300, 310, 290]
+}
+df = pd.DataFrame(data)
+df_long = df.melt(id_vars='季度', var_name='渠道', value_name='销售额')
+fig, ax = plt.subplots(figsize=(10, 6))
+sns.lineplot(data=df_long, x='季度', y='销售额', hue='渠道', marker='o', ax=ax)
+ax.set_title("各渠道季度销售额")
+ax.set_xlabel("季度")
+ax.set_ylabel("销售额 (万元)")
+""", {"type": "line", "title": "各渠道季度销售额", "x_label": "季度", "y_label": "销售额", "unit": "万元",
+      "labels": ["Q1", "Q2", "Q3", "Q4"],
+      "series": [{"name": "线上", "values": [320, 410, 380, 520]}, {"name": "线下", "values": [280, 300, 310, 290]}]}),
+
+    ("pie", HEADER + """
+data = {
+    '地区': ['东部', '中部', '西部', '东北'],
+    '占比': [45, 25, 20, 10]
+}
+df = pd.DataFrame(data)
+fig, ax = plt.subplots(figsize=(8, 8))
+ax.pie(df['占比'], labels=df['地区'], autopct='%1.1f%%', startangle=90, colors=sns.color_palette('viridis', 4))
+ax.set_title("样本区域分布")
+""", {"type": "pie", "title": "样本区域分布", "labels": ["东部", "中部", "西部", "东北"],
+      "series": [{"name": "占比", "values": [45, 25, 20, 10]}]}),
+
+    ("grouped_bar", HEADER + """
+data = {
+    '指标': ['满意度', '忠诚度', '推荐意愿', '复购率'],
+    '实验组': [4.2, 3.9, 4.1, 3.6],
+    '对照组': [3.6, 3.4, 3.5, 3.1]
+}
+df = pd.DataFrame(data)
+df_long = df.melt(id_vars='指标', var_name='组别', value_name='得分')
+fig, ax = plt.subplots(figsize=(10, 6))
+sns.barplot(data=df_long, x='指标', y='得分', hue='组别', palette='viridis', ax=ax)
+ax.set_title("实验组与对照组得分对比")
+ax.set_xlabel("指标")
+ax.set_ylabel("平均得分")
+""", {"type": "bar", "title": "实验组与对照组得分对比", "x_label": "指标", "y_label": "平均得分",
+      "labels": ["满意度", "忠诚度", "推荐意愿", "复购率"],
+      "series": [{"name": "实验组", "values": [4.2, 3.9, 4.1, 3.6]}, {"name": "对照组", "values": [3.6, 3.4, 3.5, 3.1]}]}),
+
+    ("barh", HEADER + """
+data = {
+    '因素': ['价格', '质量', '品牌', '服务', '渠道', '口碑'],
+    '权重': [0.28, 0.24, 0.16, 0.14, 0.10, 0.08]
+}
+df = pd.DataFrame(data)
+fig, ax = plt.subplots(figsize=(10, 6))
+sns.barplot(data=df, y='因素', x='权重', hue='因素', palette='viridis', legend=False, ax=ax)
+ax.set_title("影响因素权重")
+ax.set_xlabel("权重")
+ax.set_ylabel("因素")
+""", {"type": "barh", "title": "影响因素权重", "x_label": "因素", "y_label": "权重",
+      "labels": ["价格", "质量", "品牌", "服务", "渠道", "口碑"],
+      "series": [{"name": "权重", "values": [0.28, 0.24, 0.16, 0.14, 0.10, 0.08]}]}),
+
+    ("scatter", HEADER + """
+data = {
+    '广告投入': [10, 15, 20, 25, 30, 35, 40, 45],
+    '销售额': [120, 150, 185, 200, 240, 260, 300, 310]
+}
+df = pd.DataFrame(data)
+fig, ax = plt.subplots(figsize=(10, 6))
+sns.scatterplot(data=df, x='广告投入', y='销售额', ax=ax)
+ax.set_title("广告投入与销售额")
+ax.set_xlabel("广告投入 (万元)")
+ax.set_ylabel("销售额 (万元)")
+""", {"type": "scatter", "title": "广告投入与销售额", "x_label": "广告投入 (万元)", "y_label": "销售额", "unit": "万元",
+      "series": [{"name": "样本", "x": [10, 15, 20, 25, 30, 35, 40, 45], "values": [120, 150, 185, 200, 240, 260, 300, 310]}]}),
+]
+
+def timed(func, *args):
+    start = time.perf_counter()
+    data = func(*args)
+    return time.perf_counter() - start, len(data)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--profile', default='print', help="preview / print")
+    args = parser.parse_args()
+
+    options = get_profile(args.profile)
+    render_args = (options['dpi'], options['format'], options['quality'])
+    pool = get_plot_pool()
+    # 先各渲染一次，排除首次调用的字体/模块开销
+    for _, code, spec in CORPUS:
+        pool.run(_render, normalize_plot_code(code), *render_args)
+        pool.run(_render_chart, plot_source(json.dumps(spec, ensure_ascii=False)), *render_args)
+
+    print(f"档位 {args.profile} ({options['dpi']} dpi, {options['format']})，每种写法 {args.rounds} 轮，绕过渲染缓存")
+    print(f"{'图表':<12}{'exec (ms)':>12}{'规格 (ms)':>12}{'加速':>8}{'代码字数':>10}{'规格字数':>10}")
+    total_exec = total_spec = 0.0
+    for name, code, spec in CORPUS:
+        code_src = normalize_plot_code(code)
+        spec_src = plot_source(json.dumps(spec, ensure_ascii=False))
+        exec_times = [timed(pool.run, _render, code_src, *render_args)[0] for _ in range(args.rounds)]
+        spec_times = [timed(pool.run, _render_chart, spec_src, *render_args)[0] for _ in range(args.rounds)]
+        e, s = statistics.median(exec_times) * 1000, statistics.median(spec_times) * 1000
+        total_exec += e
+        total_spec += s
+        print(f"{name:<12}{e:>12.1f}{s:>12.1f}{e / s:>7.1f}x{len(code):>10}{len(json.dumps(spec, ensure_ascii=False)):>10}")
+    print(f"{'合计':<12}{total_exec:>12.1f}{total_spec:>12.1f}{total_exec / total_spec:>7.1f}x")
+    pool.shutdown()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+# benchmarks/bench_import.py
+# 启动耗时：在全新解释器中导入 app (即服务开始监听前的全部工作)，重复多次取中位数
+# 同时列出耗时最多的模块 (python -X importtime)，并检查重量级依赖是否被提前导入
+# 用法: python benchmarks/bench_import.py [--runs 7] [--top 15] [--module app]
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ('openai', 'pandas', 'numpy', 'matplotlib', 'seaborn', 'pypdf', 'pypandoc')
+
+PROBE = """
+import sys, time, json
+t = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - t
+print(json.dumps({{'elapsed': elapsed, 'heavy': [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+def run_probe(module):
+    out = subprocess.run(
+        [sys.executable, '-c', PROBE.format(module=module, heavy=HEAVY_MODULES)],
+        cwd=ROOT, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+def import_profile(module, top):
+    """python -X importtime 输出到 stderr，格式: import time: self | cumulative | name"""
+    err = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=ROOT, capture_output=True, text=True, check=True
+    ).stderr
+    rows = []
+    for line in err.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line: continue
+        _, self_us, cum_us, name = [part.strip() for part in line.replace('import time:', '|', 1).split('|')]
+        rows.append((int(cum_us), int(self_us), name))
+    return sorted(rows, reverse=True)[:top]
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=7)
+    parser.add_argument('--top', type=int, default=15)
+    parser.add_argument('--module', default='app')
+    args = parser.parse_args()
+
+    run_probe(args.module)  # 首次运行生成 .pyc，不计入
+    results = [run_probe(args.module) for _ in range(args.runs)]
+    times = [r['elapsed'] * 1000 for r in results]
+    print(f"import {args.module}: 中位数 {statistics.median(times):.0f} ms "
+          f"(最小 {min(times):.0f} / 最大 {max(times):.0f} ms，{args.runs} 次全新进程)")
+    heavy = results[-1]['heavy']
+    print(f"导入阶段已加载的重量级模块: {', '.join(heavy) if heavy else '无'}")
+
+    print(f"\n累计耗时最多的 {args.top} 个模块:")
+    print(f"{'累计 (ms)':>10}{'自身 (ms)':>10}  模块")
+    for cum_us, self_us, name in import_profile(args.module, args.top):
+        print(f"{cum_us / 1000:>10.1f}{self_us / 1000:>10.1f}  {name}")
+
+if __name__ == '__main__':
+    main()
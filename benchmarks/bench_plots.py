@@ -0,0 +1,96 @@
+# benchmarks/bench_plots.py
+# 绘图吞吐量：绘图进程池 vs 旧的线程内 exec (pyplot 全局状态共享)
+# 用法: python benchmarks/bench_plots.py [--plots 48] [--threads 8]
+import os
+import io
+import sys
+import time
+import argparse
+import concurrent.futures
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+from utils.plotpool import render_plot, get_plot_pool, normalize_plot_code, plot_cache, _render
+
+SAMPLE_CODES = [
+    """
+years = [2019, 2020, 2021, 2022, 2023]
+values = [120, 135, 150, 171, 198]
+plt.figure(figsize=(8, 5))
+plt.plot(years, values, marker='o')
+plt.title('产业规模变化趋势')
+plt.xlabel('年份'); plt.ylabel('规模 (亿元)')
+""",
+    """
+df = pd.DataFrame({'地区': ['东部', '中部', '西部', '东北'], '占比': [45, 25, 20, 10]})
+plt.figure(figsize=(6, 6))
+plt.pie(df['占比'], labels=df['地区'], autopct='%1.1f%%')
+plt.title('区域分布')
+""",
+    """
+data = np.random.default_rng(0).normal(size=(200, 4))
+df = pd.DataFrame(data, columns=['A', 'B', 'C', 'D'])
+plt.figure(figsize=(7, 5))
+sns.heatmap(df.corr(), annot=True, cmap='Blues')
+plt.title('相关系数矩阵')
+""",
+]
+
+def legacy_render(code):
+    """旧实现：在调用线程中直接 exec (并发时各线程共用同一个 pyplot 状态)"""
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    import pandas as pd
+    import numpy as np
+    from utils.plotpool import normalize_plot_code
+    from utils.fonts import get_font_name
+    plt.close('all'); plt.clf()
+    sns.set_theme(style="whitegrid")
+    plt.rcParams['font.sans-serif'] = [get_font_name()]
+    plt.rcParams['axes.unicode_minus'] = False
+    exec(normalize_plot_code(code), {}, {'plt': plt, 'sns': sns, 'pd': pd, 'np': np})
+    buf = io.BytesIO()
+    plt.tight_layout()
+    plt.savefig(buf, format='png', dpi=300, bbox_inches='tight')
+    plt.close('all')
+    return buf.getvalue()
+
+def pool_render(code):
+    """直接提交到绘图进程池 (绕过渲染缓存，测纯渲染吞吐)"""
+    return get_plot_pool().run(_render, normalize_plot_code(code), 300, 'png')
+
+def run(render, plots, threads):
+    errors = 0
+    start = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=threads) as ex:
+        futures = [ex.submit(render, SAMPLE_CODES[i % len(SAMPLE_CODES)]) for i in range(plots)]
+        for f in futures:
+            try:
+                f.result()
+            except Exception:
+                errors += 1
+    return time.perf_counter() - start, errors
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--plots', type=int, default=48)
+    parser.add_argument('--threads', type=int, default=8)
+    args = parser.parse_args()
+
+    t = time.perf_counter()
+    get_plot_pool().start()
+    render_plot("plt.plot([1, 2])")  # 等待进程预热完成
+    print(f"绘图进程池启动 + 预热: {time.perf_counter() - t:.1f}s ({config.PLOT_WORKERS} 个进程)")
+
+    elapsed, errors = run(legacy_render, args.plots, args.threads)
+    print(f"线程内 exec : {args.plots / elapsed:6.2f} 张/秒  ({elapsed:.1f}s, 失败 {errors})")
+    elapsed, errors = run(pool_render, args.plots, args.threads)
+    print(f"绘图进程池   : {args.plots / elapsed:6.2f} 张/秒  ({elapsed:.1f}s, 失败 {errors})")
+    elapsed, errors = run(render_plot, args.plots, args.threads)
+    print(f"进程池+缓存  : {args.plots / elapsed:6.2f} 张/秒  ({elapsed:.1f}s, 失败 {errors})")
+    print(f"进程池统计: {get_plot_pool().stats()}")
+    print(f"渲染缓存统计: {plot_cache.stats()}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,178 @@
+# benchmarks/bench_postprocess.py
+# 生成 / 改写结果后处理：改写前散落在 PaperAutoWriter / routes 中的逐条正则实现 vs utils.postprocess
+# 样本为 benchmarks/data/llm_outputs.json 中按模型实际输出形态整理的章节与改写结果
+# (含续写标记、缩进表格、未闭合代码块、绘图解说行、重复标题等)；绘图以固定 URL 代替，不计渲染耗时
+# 先逐条校验三条流水线 (字数统计、章节格式化、改写清洗) 输出一致 (章节格式化另加随机文本校验)，再把样本拼接放大后计时
+# 用法: python benchmarks/bench_postprocess.py [--repeat 200] [--rounds 5] [--cases 20000]
+import os
+import re
+import sys
+import json
+import random
+import time
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.postprocess import count_chars, sub_code_blocks, format_chapter, remove_code_chatter, collapse_blank_lines, strip_section_heading
+
+SAMPLES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'llm_outputs.json')
+IMG_URL = "/img/" + "0" * 64 + ".png"
+
+# ===================== 改写前的实现 =====================
+
+def legacy_count(text):
+    content_no_code = re.sub(r'```[\s\S]*?```', '', text)
+    return len(re.sub(r'\s', '', content_no_code))
+
+def legacy_process_code_blocks(content):
+    if content.count('```') % 2 != 0:
+        content += "\n```"
+    code_block_pattern = re.compile(r'(```\s*(?:python|py)?\s*[\s\S]*?```)', re.IGNORECASE)
+    def replacer(match):
+        full_block = match.group(1)
+        lines = full_block.strip().split('\n')
+        code_lines = [line for line in lines if '```' not in line]
+        if not code_lines: return match.group(0)
+        code = '\n'.join(code_lines).strip()
+        if not code: return match.group(0)
+        return f"\n![统计图]({IMG_URL})\n"
+    return code_block_pattern.sub(replacer, content)
+
+def legacy_clean_and_format(raw_content, sec_title):
+    if "摘要" in sec_title or "Abstract" in sec_title:
+        raw_content = re.sub(r'^#+\s*(摘要|Abstract)\s*', '', raw_content, flags=re.IGNORECASE).strip()
+    dirty_patterns = [r'[\(（]接上文[\)）]', r'[\(（]空两格[\)）]', r'^\.\.\.', r'接上文：']
+    for p in dirty_patterns:
+        raw_content = re.sub(p, '', raw_content)
+    lines = []
+    for line in raw_content.split('\n'):
+        line = line.strip()
+        if (line and not line.startswith('　　') and not line.startswith('#') and
+            not line.startswith('|') and not line.startswith('```') and "import" not in line):
+            line = '　　' + line
+        lines.append(line)
+    return '\n\n'.join(lines)
+
+def legacy_fix_markdown_table_format(text):
+    lines = text.split('\n')
+    new_lines = []
+    in_table = False
+    for line in lines:
+        stripped = line.strip().replace('　', '')
+        is_table_row = stripped.startswith('|') and stripped.count('|') >= 2
+        if is_table_row:
+            if not in_table:
+                if new_lines and new_lines[-1].strip() != '':
+                    new_lines.append('')
+                in_table = True
+            new_lines.append(stripped)
+        else:
+            if in_table:
+                if stripped != '':
+                    new_lines.append('')
+                in_table = False
+            new_lines.append(line)
+    return '\n'.join(new_lines)
+
+def legacy_rewrite(content, section_title):
+    garbage_patterns = [
+        r'^\s*(?:#+|\*\*|)?\s*(?:设置|定义|创建|绘制|添加|导入|准备)(?:绘图)?(?:风格|数据|变量|画布|条形图|折线图|饼图|统计图|图表|数值|标签|引用|相关库|代码).*?$',
+        r'^\s*(?:#+|\*\*|)?\s*Python\s*代码(?:如下|示例)?[:：]?\s*$',
+        r'^\s*(?:#+|\*\*|)?\s*代码如下[:：]?\s*$'
+    ]
+    for pat in garbage_patterns:
+        content = re.sub(pat, '', content, flags=re.MULTILINE | re.IGNORECASE)
+    if content.count('```') % 2 != 0:
+        content += "\n```"
+    code_block_pattern = re.compile(r'(```\s*(?:python|py)?\s*[\s\S]*?```)', re.IGNORECASE)
+    def image_replacer(match):
+        full_block = match.group(1).strip()
+        code_lines = [line for line in full_block.split('\n') if '```' not in line]
+        if not code_lines: return ""
+        code = '\n'.join(code_lines).strip()
+        if not code: return ""
+        return f'\n\n<div align="center" class="plot-container"><img src="{IMG_URL}"></div>\n\n'
+    new_content = code_block_pattern.sub(image_replacer, content)
+    new_content = re.sub(r'\n{3,}', '\n\n', new_content).strip()
+    clean_pattern = r'^#+\s*' + re.escape(section_title) + r'.*\n'
+    return re.sub(clean_pattern, '', new_content, flags=re.IGNORECASE|re.MULTILINE).strip()
+
+# ===================== 新实现 (与 PaperAutoWriter / routes 中的调用方式一致) =====================
+
+def chapter_image(code, block):
+    return f"\n![统计图]({IMG_URL})\n" if code else block
+
+def rewrite_image(code, block):
+    return f'\n\n<div align="center" class="plot-container"><img src="{IMG_URL}"></div>\n\n' if code else ""
+
+def new_chapter(text, title):
+    return format_chapter(sub_code_blocks(text, chapter_image), title)
+
+def new_rewrite(text, title):
+    content = collapse_blank_lines(sub_code_blocks(remove_code_chatter(text), rewrite_image)).strip()
+    return strip_section_heading(content, title)
+
+def legacy_chapter(text, title):
+    return legacy_fix_markdown_table_format(legacy_clean_and_format(legacy_process_code_blocks(text), title))
+
+PIPELINES = [
+    ("字数统计", 'all', legacy_count, count_chars),
+    ("章节格式化", 'chapter', legacy_chapter, new_chapter),
+    ("改写清洗", 'rewrite', legacy_rewrite, new_rewrite),
+]
+
+# 随机行：覆盖缩进、全角空格、表格行、标题、代码标记、续写标记的组合 (校验合并后的单遍格式化)
+LINE_PARTS = ['', ' ', '  ', '　', '　　', '\t', '|', '| a |', '| 均值 | 1.2 |', '|---|---|', '#', '## 标题', '```', '```python',
+              'import numpy', '正文', 'text', '(接上文)', '（空两格）', '接上文：', '...', '摘要', '\r']
+
+def fuzz_chapter(cases, seed=0):
+    rng = random.Random(seed)
+    for _ in range(cases):
+        text = '\n'.join(''.join(rng.choice(LINE_PARTS) for _ in range(rng.randint(0, 4))) for _ in range(rng.randint(0, 12)))
+        title = rng.choice(["摘要", "3.1 研究设计"])
+        if legacy_chapter(text, title) != new_chapter(text, title):
+            sys.exit(f"章节格式化 (随机) 不一致: {text!r}")
+
+def median_ms(func, rounds):
+    times = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times) * 1000
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=200, help="计时时每条样本放大的倍数 (模拟长章节)")
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--cases', type=int, default=20000, help="章节格式化随机校验条数")
+    args = parser.parse_args()
+
+    with open(SAMPLES, 'r', encoding='utf-8') as f:
+        samples = json.load(f)
+
+    for label, kind, legacy, new in PIPELINES:
+        cases = [s for s in samples if kind in ('all', s['kind'])]
+        for s in cases:
+            args_ = (s['text'],) if kind == 'all' else (s['text'], s['title'])
+            if legacy(*args_) != new(*args_):
+                sys.exit(f"{label} 不一致: {s['title']}\n原实现: {legacy(*args_)!r}\n新实现: {new(*args_)!r}")
+        print(f"{label}: {len(cases)} 条样本输出一致")
+    fuzz_chapter(args.cases)
+    print(f"章节格式化: {args.cases} 条随机文本输出一致")
+
+    for label, kind, legacy, new in PIPELINES:
+        cases = [(s['text'] + '\n\n') * args.repeat for s in samples if kind in ('all', s['kind'])]
+        titles = [s['title'] for s in samples if kind in ('all', s['kind'])]
+        if kind == 'all':
+            run = lambda f: [f(text) for text in cases]
+        else:
+            run = lambda f: [f(text, title) for text, title in zip(cases, titles)]
+        legacy_ms, new_ms = median_ms(lambda: run(legacy), args.rounds), median_ms(lambda: run(new), args.rounds)
+        size = sum(len(c) for c in cases)
+        print(f"{label} ({size // 1000}k 字): 原实现 {legacy_ms:.1f} ms，postprocess {new_ms:.1f} ms  ({legacy_ms / new_ms:.1f}x)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+# benchmarks/bench_punctuation.py
+# 标点规范化：改写前的 15 轮正则替换实现 vs TextCleaner.correct_punctuation 的单次扫描
+# 1) 随机语料对拍：由中英文、各类半角标点、空白、引号、代码/链接/图片片段随机拼接，逐条比较输出
+# 2) 计时：整篇 (约 10 万字) 一次、按段落逐段调用 (导出时的实际调用方式)、标记密集的文档
+# 用法: python benchmarks/bench_punctuation.py [--cases 20000] [--seed 0] [--chars 100000] [--rounds 3]
+import os
+import re
+import sys
+import time
+import random
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.word import TextCleaner
+from bench_markdown_docx import build_thesis
+
+# ===================== 改写前的实现 (原 TextCleaner.correct_punctuation) =====================
+
+def legacy_correct_punctuation(text):
+    masks = {}
+    def save_mask(match):
+        key = f"__MASK_{len(masks)}__"
+        masks[key] = match.group(0)
+        return key
+
+    text = re.sub(r'```[\s\S]*?```', save_mask, text)
+    text = re.sub(r'`[^`\n]+`', save_mask, text)
+    text = re.sub(r'!\[.*?\]\(.*?\)', save_mask, text)
+    text = re.sub(r'\[.*?\]\(.*?\)', save_mask, text)
+
+    pairs = [
+        (r'(?<=[一-龥]),', '，'),
+        (r',(?=[一-龥])', '，'),
+        (r'(?<=[一-龥])\.', '。'),
+        (r'(?<=[一-龥]):', '：'),
+        (r':(?=[一-龥])', '：'),
+        (r'(?<=[一-龥]);', '；'),
+        (r';(?=[一-龥])', '；'),
+        (r'(?<=[一-龥])\?', '？'),
+        (r'\?(?=[一-龥])', '？'),
+        (r'(?<=[一-龥])!', '！'),
+        (r'!(?=[一-龥])', '！'),
+        (r'(?<=[一-龥])\s*\(', '（'),
+        (r'\((?=[一-龥])', '（'),
+        (r'(?<=[一-龥])\)', '）'),
+        (r'\)(?=[一-龥])', '）')
+    ]
+    for p, r in pairs:
+        text = re.sub(p, r, text)
+
+    def quote_replacer(match):
+        content = match.group(1)
+        if re.search(r'[一-龥]', content):
+            return f'“{content}”'
+        return match.group(0)
+    text = re.sub(r'"(.*?)"', quote_replacer, text, flags=re.DOTALL)
+
+    for key in reversed(list(masks.keys())):
+        text = text.replace(key, masks[key])
+    return text
+
+# ===================== 随机语料 =====================
+
+# 偏向边界情况的片段：标点紧邻中文/英文/空白、嵌套与交错的代码、链接、图片标记
+TOKENS = ['中', '文', '研究', 'a', 'b', 'x1', '2023', ' ', '  ', '\n', '\n\n', '\t', '　', '。', '，', '“',
+          ',', '.', ':', ';', '?', '!', '(', ')', '"', '`', '```', '[', ']', '](', '![', '_', '*', '|', '#']
+SNIPPETS = ['`code,中`', '```\nprint("中,文")\n```', '[链接,中文](http://a.b/c?d=1)', '![图1](/img/x.png)',
+            '"中文引用"', '"plain"', '中 (注)', '(English)', 'e.g.', '3.14', '[1]', '**加粗,中**']
+
+def random_text(rng):
+    parts = []
+    for _ in range(rng.randint(0, 40)):
+        parts.append(rng.choice(SNIPPETS) if rng.random() < 0.15 else rng.choice(TOKENS))
+    return ''.join(parts)
+
+def fuzz(cases, seed):
+    rng = random.Random(seed)
+    for i in range(cases):
+        text = random_text(rng)
+        expected, actual = legacy_correct_punctuation(text), TextCleaner.correct_punctuation(text)
+        if expected != actual:
+            print(f"第 {i} 条不一致:\n  输入: {text!r}\n  原实现: {expected!r}\n  新实现: {actual!r}")
+            return False
+    return True
+
+def median_ms(func, rounds):
+    times = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times) * 1000
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--cases', type=int, default=20000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--chars', type=int, default=100000)
+    parser.add_argument('--rounds', type=int, default=3)
+    args = parser.parse_args()
+
+    if not fuzz(args.cases, args.seed): sys.exit(1)
+    print(f"随机语料对拍: {args.cases} 条一致 (seed={args.seed})")
+
+    markdown = build_thesis(args.chars)
+    if legacy_correct_punctuation(markdown) != TextCleaner.correct_punctuation(markdown): sys.exit("整篇输出不一致")
+    lines = markdown.split('\n')
+    # 标记密集：每句话带一个行内代码与一个链接 (原实现每个占位符都要对全文做一次 str.replace)
+    dense = ''.join(f"第{i}个变量 `x_{i}` 的定义见[附录,{i}](#a{i}), 结果稳健. " for i in range(args.chars // 40))
+    if legacy_correct_punctuation(dense) != TextCleaner.correct_punctuation(dense): sys.exit("标记密集文档输出不一致")
+    print(f"测试文档: {len(markdown)} 字，{len(lines)} 行；标记密集文档 {len(dense)} 字")
+    cases = [("整篇", lambda f: f(markdown)), ("逐段", lambda f: [f(line) for line in lines]), ("标记密集", lambda f: f(dense))]
+    for label, run in cases:
+        legacy_ms = median_ms(lambda: run(legacy_correct_punctuation), args.rounds)
+        new_ms = median_ms(lambda: run(TextCleaner.correct_punctuation), args.rounds)
+        print(f"{label}: 正则级联 {legacy_ms:.1f} ms，单次扫描 {new_ms:.1f} ms  ({legacy_ms / new_ms:.1f}x)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,203 @@
+# benchmarks/bench_reference.py
+# 参考文献管理：改写前的 ReferenceManager (pop(0) 分配、逐次 += 拼接、每次调用重新匹配中文) vs utils.reference
+# 1) 不含重复文献时，分配结果、引用填充、文末列表与原实现逐项一致
+# 2) 构建 / 分配 / 填充 / 生成列表 在 1 万条文献下的耗时 (新实现的构建包含去重索引，原实现没有)，
+#    以及 构建 + 分配 + 填充 + 生成列表 的总耗时 (避免构建阶段的损失被其余阶段的提升掩盖)：
+#    国内、国外两份列表都填写时构建包含去重；只有一份列表时不去重 (dedup=False)
+# 3) 去重：国内、国外两份列表中同一文献的不同写法 (全角标点、序号、DOI 大小写) 合并为一条；同名的不同著作不合并
+# 用法: python benchmarks/bench_reference.py [--refs 10000] [--rounds 3]
+import os
+import re
+import sys
+import math
+import time
+import random
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.reference import ReferenceManager
+
+# ===================== 改写前的实现 (原 utils/reference.py) =====================
+
+class LegacyReferenceManager:
+    def __init__(self, raw_references: str):
+        raw_lines = [r.strip() for r in raw_references.split('\n') if r.strip()]
+        self.all_refs = []
+        clean_pattern = re.compile(r'^(\[\d+\]|\d+\.|（\d+）|\(\d+\))\s*')
+        for line in raw_lines:
+            self.all_refs.append(clean_pattern.sub('', line))
+        self.current_chapter_refs = []
+
+    def is_chinese(self, text):
+        return bool(re.search(r'[一-龥]', text))
+
+    def distribute_references_smart(self, chapters):
+        if not self.all_refs: return {}
+        cn_refs = [(i+1, r) for i, r in enumerate(self.all_refs) if self.is_chinese(r)]
+        en_refs = [(i+1, r) for i, r in enumerate(self.all_refs) if not self.is_chinese(r)]
+        domestic_idxs, foreign_idxs, general_idxs = [], [], []
+        last_content_idx = -1
+        for i, chapter in enumerate(chapters):
+            if chapter.get('is_parent'): continue
+            title = chapter['title']
+            if "参考文献" not in title and "致谢" not in title and "摘要" not in title:
+                last_content_idx = i
+            if any(k in title for k in ["现状", "综述", "Review", "Status", "背景"]):
+                if "国内" in title or "我国" in title or "China" in title:
+                    domestic_idxs.append(i)
+                elif "国外" in title or "国际" in title or "Foreign" in title:
+                    foreign_idxs.append(i)
+                else:
+                    general_idxs.append(i)
+        allocation = {}
+        def assign_chunks(refs_list, target_idxs):
+            if not target_idxs: return refs_list
+            if not refs_list: return []
+            chunk_size = math.ceil(len(refs_list) / len(target_idxs))
+            for k, idx in enumerate(target_idxs):
+                chunk = refs_list[k * chunk_size : k * chunk_size + chunk_size]
+                if not chunk: continue
+                if idx not in allocation: allocation[idx] = []
+                allocation[idx].extend(chunk)
+            return []
+        rem_cn = assign_chunks(cn_refs, domestic_idxs)
+        rem_en = assign_chunks(en_refs, foreign_idxs)
+        rem_all = rem_cn + rem_en
+        rem_all.sort(key=lambda x: x[0])
+        rem_final = assign_chunks(rem_all, general_idxs)
+        if rem_final and last_content_idx != -1:
+            if last_content_idx not in allocation: allocation[last_content_idx] = []
+            allocation[last_content_idx].extend(rem_final)
+        for idx in allocation:
+            allocation[idx].sort(key=lambda x: x[0])
+        return allocation
+
+    def set_current_chapter_refs(self, refs):
+        self.current_chapter_refs = list(refs)
+
+    def process_text_deterministic(self, text):
+        result_text = ""
+        parts = text.split('[REF]')
+        for i, part in enumerate(parts):
+            result_text += part
+            if i < len(parts) - 1:
+                if self.current_chapter_refs:
+                    global_id, _ = self.current_chapter_refs.pop(0)
+                    result_text += f"[{global_id}]"
+        if self.current_chapter_refs:
+            result_text += "\n\n"
+            connectors = ["此外，", "另有研究表明，", "相关学者还指出，", "补充研究发现，", "同时，"]
+            for i, (global_id, content) in enumerate(self.current_chapter_refs):
+                clean_content = content.replace('\n', ' ').strip()
+                summary = clean_content[:60] + "..." if len(clean_content) > 60 else clean_content
+                result_text += f"{connectors[i % len(connectors)]}文献“{summary}”对本领域亦有重要贡献[{global_id}]。 "
+        return result_text
+
+    def generate_bibliography(self):
+        if not self.all_refs: return ""
+        res = "## 参考文献\n\n"
+        for i, ref_content in enumerate(self.all_refs):
+            res += f"[{i+1}] {ref_content}\n\n"
+        return res
+
+# ===================== 测试数据 =====================
+
+SURNAMES = ["王", "李", "张", "刘", "陈", "杨", "赵", "黄", "周", "吴"]
+TOPICS = ["数字化转型", "绿色金融", "企业创新", "供应链韧性", "人力资本", "产业集聚", "碳排放权交易", "营商环境"]
+JOURNALS_CN = ["经济研究", "管理世界", "中国工业经济", "金融研究"]
+AUTHORS_EN = ["Smith J", "Brown K", "Zhang W", "Miller R", "Garcia L", "Chen Y"]
+JOURNALS_EN = ["Journal of Finance", "Management Science", "Research Policy", "Strategic Management Journal"]
+
+def make_refs(n, seed=0):
+    """约六成中文、四成英文文献，题名带编号保证互不重复"""
+    rng = random.Random(seed)
+    domestic, foreign = [], []
+    for i in range(n):
+        if rng.random() < 0.6:
+            authors = "，".join(rng.choice(SURNAMES) + rng.choice(SURNAMES) for _ in range(rng.randint(1, 3)))
+            domestic.append(f"[{len(domestic) + 1}] {authors}. {rng.choice(TOPICS)}对企业绩效的影响研究({i})[J]. "
+                            f"{rng.choice(JOURNALS_CN)}, {rng.randint(2005, 2024)}({rng.randint(1, 12)}): {rng.randint(1, 200)}-{rng.randint(201, 400)}.")
+        else:
+            foreign.append(f"[{len(foreign) + 1}] {rng.choice(AUTHORS_EN)}, {rng.choice(AUTHORS_EN)}. Firm productivity and "
+                           f"digital adoption: evidence {i}[J]. {rng.choice(JOURNALS_EN)}, {rng.randint(2005, 2024)}, "
+                           f"{rng.randint(1, 80)}({rng.randint(1, 6)}): {rng.randint(1, 900)}. doi:10.{1000 + i % 9000}/ref.{i}")
+    return domestic, foreign
+
+def variant(ref):
+    """同一文献的另一种写法：全角标点、不同序号格式、DOI 大写"""
+    ref = re.sub(r'^\[\d+\]\s*', '（7）', ref)
+    return ref.replace('. ', '．').replace(', ', '，').replace('doi:10.', 'DOI: 10.').upper() if 'doi' in ref else ref.replace('. ', '．').replace(', ', '，')
+
+CHAPTERS = [{'title': "1 绪论", 'is_parent': True}, {'title': "1.1 研究背景"}, {'title': "1.2 国内研究现状"},
+            {'title': "1.3 国外研究现状"}, {'title': "1.4 文献综述"}, {'title': "2 理论基础", 'is_parent': True},
+            {'title': "2.1 相关理论"}, {'title': "3.1 研究设计"}, {'title': "6 结论"}, {'title': "参考文献"}]
+
+def median_ms(func, rounds):
+    times = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times) * 1000
+
+def fill_all(manager, allocation):
+    """按章节依次填充引用：每章正文的 [REF] 标记数为分配文献数的一半，其余生成补充句"""
+    out = []
+    for idx in sorted(allocation):
+        refs = allocation[idx]
+        manager.set_current_chapter_refs(refs)
+        out.append(manager.process_text_deterministic("学者指出数字化转型提升了效率[REF]。" * (len(refs) // 2)))
+    return out
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--refs', type=int, default=10000)
+    parser.add_argument('--rounds', type=int, default=3)
+    args = parser.parse_args()
+
+    domestic, foreign = make_refs(args.refs)
+    raw = "\n".join(domestic) + "\n" + "\n".join(foreign)
+    legacy, new = LegacyReferenceManager(raw), ReferenceManager(raw)
+    if new.all_refs != legacy.all_refs or new.duplicates: sys.exit("文献列表不一致")
+    legacy_alloc, new_alloc = legacy.distribute_references_smart(CHAPTERS), new.distribute_references_smart(CHAPTERS)
+    if legacy_alloc != new_alloc: sys.exit("分配结果不一致")
+    if fill_all(legacy, legacy_alloc) != fill_all(new, new_alloc): sys.exit("引用填充不一致")
+    if legacy.generate_bibliography() != new.generate_bibliography(): sys.exit("文末列表不一致")
+    print(f"{len(new.all_refs)} 条文献 (中文 {len(domestic)} / 英文 {len(foreign)})：分配、填充、文末列表与原实现一致")
+
+    def pipeline(cls, **kwargs):
+        manager = cls(raw, **kwargs)
+        fill_all(manager, manager.distribute_references_smart(CHAPTERS))
+        return manager.generate_bibliography()
+
+    steps = [
+        ("构建", lambda cls: cls(raw)),
+        ("分配", lambda m: m.distribute_references_smart(CHAPTERS)),
+        ("填充", lambda m: fill_all(m, m.distribute_references_smart(CHAPTERS))),
+        ("文末列表", lambda m: m.generate_bibliography()),
+        ("合计 (含去重)", pipeline),
+        ("合计 (不去重)", lambda cls: pipeline(cls) if cls is LegacyReferenceManager else pipeline(cls, dedup=False)),
+    ]
+    for label, step in steps:
+        from_scratch = label == "构建" or label.startswith("合计")
+        args_legacy, args_new = (LegacyReferenceManager, ReferenceManager) if from_scratch else (legacy, new)
+        legacy_ms = median_ms(lambda: step(args_legacy), args.rounds)
+        new_ms = median_ms(lambda: step(args_new), args.rounds)
+        print(f"{label}: 原实现 {legacy_ms:.1f} ms，新实现 {new_ms:.1f} ms  ({legacy_ms / new_ms:.1f}x)")
+
+    # 去重：国外列表中混入 1/5 的国内文献变体，国内列表中混入 1/5 的国外文献变体
+    mixed = domestic + [variant(r) for r in foreign[::5]] + ["(3) " + r.split('] ', 1)[1] for r in domestic[::5]] + foreign
+    manager = ReferenceManager("\n".join(mixed))
+    expected = len(foreign[::5]) + len(domestic[::5])
+    print(f"去重: 输入 {len(mixed)} 条，合并 {manager.duplicates} 条 (预期 {expected})，保留 {len(manager.all_refs)} 条")
+    if manager.duplicates != expected: sys.exit(1)
+    same_title = ReferenceManager("张三. 数字经济发展研究[J]. 经济研究, 2019(3): 1-10.\n李四. 数字经济发展研究[M]. 北京: 科学出版社, 2022.")
+    if same_title.duplicates: sys.exit("同名的不同著作被合并")
+    start = time.perf_counter()
+    hits = sum(1 for r in mixed if manager.find(r))
+    print(f"按去重键查找 {len(mixed)} 次: {(time.perf_counter() - start) * 1000:.1f} ms，命中 {hits}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+# benchmarks/bench_report_parser.py
+# 开题报告文本解析：改写前的多正则实现 vs TextReportParser.parse 的逐行单遍扫描
+# 测试文本按常见开题报告结构生成 (题目、选题背景、国内外研究现状 (含二级小节)、研究内容、论文提纲、参考文献)，
+# 并模拟从 Word 粘贴时常见的大段空行 / 只含空格的行 (原实现切分参考文献的 ^\s*...\s*$ 在此处退化为平方级)
+# 题目、提纲、参考文献要求与原实现一致；综述原实现受 MULTILINE 下 $ 影响只截到第一行，这里只输出两者长度对比
+# 用法: python benchmarks/bench_report_parser.py [--kb 100] [--blank-lines 20000] [--rounds 3]
+import os
+import re
+import sys
+import time
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.word import TextReportParser
+
+# ===================== 改写前的实现 (原 TextReportParser.parse) =====================
+
+def legacy_parse(text):
+    data = { "title": "", "outline_content": "", "cn_refs": [], "en_refs": [], "review": "" }
+    if not text: return data
+    title_match = re.search(r'(?:论文)?(?:题目|Title)[:：]\s*(.*)', text, re.IGNORECASE)
+    if title_match: data["title"] = title_match.group(1).strip()
+    else:
+        lines = [l.strip() for l in text.split('\n') if l.strip()]
+        if lines and len(lines[0]) < 100: data["title"] = lines[0]
+    ref_split = re.split(r'^\s*(?:参考文献|References)[:：]?\s*$', text, flags=re.MULTILINE | re.IGNORECASE)
+    main_body = text
+    if len(ref_split) > 1:
+        ref_text = ref_split[-1].strip()
+        main_body = ref_split[0]
+        for ref in [line.strip() for line in ref_text.split('\n') if line.strip()]:
+            clean_ref = re.sub(r'^(\[\d+\]|\d+\.|（\d+）|\(\d+\))\s*', '', ref)
+            if len(clean_ref) < 5: continue
+            if re.search(r'[一-龥]', clean_ref): data["cn_refs"].append(clean_ref)
+            else: data["en_refs"].append(clean_ref)
+    for kw in ["文献综述", "研究现状", "国内外研究", "Literature Review", "Related Work"]:
+        pattern = rf'{kw}[:：]?\s*([\s\S]*?)(?=(?:研究内容|研究方法|论文提纲|论文目录|第[一二三]章|3\.|^3\s|Chapter|Methodology|Research Content)|$)'
+        match = re.search(pattern, main_body, re.IGNORECASE | re.MULTILINE)
+        if match:
+            review_content = match.group(1).strip()
+            if len(review_content) > 50:
+                data["review"] = review_content
+                break
+    outline_match = re.search(r'(?:目录|提纲|章节安排|结构安排|Table of Contents|Outline)[:：]?\s*([\s\S]*)', main_body, re.MULTILINE | re.IGNORECASE)
+    source_for_outline = outline_match.group(1) if outline_match else main_body
+    outline_patterns = [
+        r'^Chapter\s+\d+', r'^Section\s+\d+', r'^Part\s+\d+',
+        r'^第[一二三四五六七八九十0-9]+章', r'^\d+(\.\d+)*\s', r'^\d+\.\s',
+        r'^[一二三四五六]+、',
+        r'^(?:Abstract|Introduction|Literature Review|Methodology|Results|Discussion|Conclusion|References|Appendix)',
+        r'^(?:摘要|绪论|结论|参考文献|致谢|附录)'
+    ]
+    combined_pattern = '|'.join(outline_patterns)
+    outline_lines = [l.strip() for l in source_for_outline.split('\n') if len(l.strip()) < 100 and re.match(combined_pattern, l.strip(), re.IGNORECASE)]
+    if outline_lines: data["outline_content"] = "\n".join(outline_lines)
+    return data
+
+# ===================== 测试文本 =====================
+
+PARA = ("近年来，数字经济快速发展，数字化转型已成为企业提升竞争力的重要途径。已有研究从技术采纳、组织变革、"
+        "资源配置等角度讨论了数字化转型的动因与经济后果，但对其作用机制的系统考察仍显不足。")
+
+def build_report(kb, blank_lines=0):
+    """按开题报告常见结构拼接，研究现状各小节重复段落直到达到目标大小；blank_lines 模拟 Word 粘贴的空行"""
+    body = []
+    while sum(len(p) for p in body) < kb * 1000 * 0.7:
+        body.append(PARA)
+    half = len(body) // 2
+    parts = [
+        "论文题目：数字化转型对制造业企业全要素生产率的影响研究", "",
+        "一、选题背景与意义", PARA, PARA, "",
+        "二、国内外研究现状",
+        "（一）国内研究现状", *body[:half], "",
+        "（二）国外研究现状", *body[half:], "",
+        "（三）文献述评", PARA, "",
+        "三、研究内容与方法", PARA, "",
+        "四、论文提纲",
+        "第一章 绪论", "1.1 研究背景", "1.2 研究意义", "第二章 文献综述与理论基础", "2.1 国内外研究现状", "2.2 理论基础",
+        "第三章 研究设计", "3.1 样本选择与数据来源", "3.2 变量定义", "第四章 实证分析", "4.1 描述性统计", "4.2 基准回归",
+        "第五章 结论与建议", "参考文献", "致谢",
+        "  \n" * blank_lines,
+        "五、参考文献",
+        "参考文献",
+    ]
+    for i in range(1, 61):
+        if i % 3:
+            parts.append(f"[{i}] 张三，李四. 数字化转型与企业生产率研究({i})[J]. 经济研究, 2021(3): 1-10.")
+        else:
+            parts.append(f"[{i}] Smith J, Brown K. Digital transformation and productivity {i}[J]. Journal of Finance, 2020, 75(2): 1-30.")
+    return "\n".join(parts)
+
+def median_ms(func, rounds):
+    times = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times) * 1000
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--kb', type=int, default=100)
+    parser.add_argument('--blank-lines', type=int, default=20000)
+    parser.add_argument('--rounds', type=int, default=3)
+    args = parser.parse_args()
+
+    for label, text in [("正常粘贴", build_report(args.kb)), (f"含 {args.blank_lines} 行空白", build_report(args.kb, args.blank_lines))]:
+        legacy, new = legacy_parse(text), TextReportParser.parse(text)
+        for key in ("title", "outline_content", "cn_refs", "en_refs"):
+            if legacy[key] != new[key]: sys.exit(f"{label}: {key} 不一致\n原实现: {legacy[key]!r}\n新实现: {new[key]!r}")
+        rounds = 1 if args.blank_lines and label != "正常粘贴" else args.rounds
+        legacy_ms = median_ms(lambda: legacy_parse(text), rounds)
+        new_ms = median_ms(lambda: TextReportParser.parse(text), args.rounds)
+        print(f"{label} ({len(text) // 1000}k 字, {text.count(chr(10)) + 1} 行): 题目/提纲/参考文献一致 "
+              f"(文献 {len(new['cn_refs'])}+{len(new['en_refs'])} 条，提纲 {new['outline_content'].count(chr(10)) + 1} 行)")
+        print(f"  综述: 原实现 {len(legacy['review'])} 字，新实现 {len(new['review'])} 字 (从 \"{new['review'][:12]}\" 到 \"{new['review'][-12:]}\")")
+        print(f"  耗时: 原实现 {legacy_ms:.1f} ms，单遍扫描 {new_ms:.1f} ms  ({legacy_ms / new_ms:.1f}x)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+# benchmarks/check_export_temp.py
+# 导出临时文件检查：连续执行 N 次导出 (经 /export_docx 路由，Pandoc 与 python-docx 两条路径)，
+# 断言系统临时目录与导出临时目录的文件数、总大小在导出前后保持不变
+# 用法: python benchmarks/check_export_temp.py [--exports 20]
+import os
+import sys
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SAMPLE = """# 测试论文
+
+## 第一章 绪论
+
+近年来，数字经济快速发展，企业数字化转型成为研究热点 [1]。
+
+| 变量 | 均值 | 标准差 |
+|---|---|---|
+| TFP | 3.21 | 0.87 |
+| DID | 0.42 | 0.49 |
+
+```chart
+{"type": "bar", "title": "营业收入", "labels": ["2021", "2022"], "series": [{"name": "营业收入", "values": [12.5, 15.3]}]}
+```
+
+$$
+TFP_{it} = \\alpha + \\beta DID_{it} + \\epsilon_{it}
+$$
+"""
+
+def snapshot(path, recursive=True) -> dict:
+    """目录快照：{相对路径: 大小}；系统临时目录只看顶层 (其中可能有其他程序或缓存目录在写入)"""
+    files = {}
+    if not recursive:
+        for entry in os.scandir(path):
+            try: files[entry.name] = entry.stat().st_size if entry.is_file() else 0
+            except OSError: continue
+        return files
+    for root, _, names in os.walk(path):
+        for name in names:
+            full = os.path.join(root, name)
+            try: files[os.path.relpath(full, path)] = os.path.getsize(full)
+            except OSError: continue
+    return files
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--exports', type=int, default=20)
+    args = parser.parse_args()
+
+    import app
+    from utils.auth import VALID_KEYS
+    from utils.exporter import export_temp_root, pandoc_path, convert_with_python, get_export_service
+    VALID_KEYS.add('__check_export_temp__')
+    client = app.app.test_client()
+    headers = {'X-User-ID': '__check_export_temp__'}
+
+    # 先导出一次：排除首次导出时创建的目录、字体缓存等一次性文件
+    client.post('/export_docx', json={'content': SAMPLE}, headers=headers)
+    roots = {'系统临时目录': (tempfile.gettempdir(), False), '导出临时目录': (export_temp_root(), True)}
+    before = {name: snapshot(*root) for name, root in roots.items()}
+
+    engines = {}
+    for i in range(args.exports):
+        # 每次内容不同，绕过导出缓存
+        resp = client.post('/export_docx', json={'content': f"{SAMPLE}\n\n第 {i} 次导出\n"}, headers=headers)
+        assert resp.status_code == 200, resp.get_data(as_text=True)
+        resp.close()
+        engine = resp.headers.get('X-Export-Engine')
+        engines[engine] = engines.get(engine, 0) + 1
+    for i in range(args.exports):
+        convert_with_python(f"{SAMPLE}\n\n备用路径第 {i} 次\n")
+    engines['python (直接调用)'] = args.exports
+    print(f"Pandoc: {pandoc_path() or '未安装'}，导出次数: {engines}")
+
+    failed = False
+    for name, (path, recursive) in roots.items():
+        after = snapshot(path, recursive)
+        added = sorted(set(after) - set(before[name]))
+        grown = sum(after.values()) - sum(before[name].values())
+        print(f"{name} {path}: 文件 {len(before[name])} -> {len(after)}，大小变化 {grown} 字节")
+        if added:
+            failed = True
+            print("  新增文件: " + ", ".join(added[:10]) + (" ..." if len(added) > 10 else ""))
+    get_export_service()._executor.shutdown(wait=False)
+    if failed: sys.exit("❌ 导出后临时目录有遗留文件")
+    print("✅ 临时目录大小不随导出次数增长")
+
+if __name__ == '__main__':
+    main()
@@ -13,4 +13,89 @@ ADMIN_PASSWORD = "admin123"
 
 # 文件路径
 KEYS_FILE = "valid_keys.json"
-SECRET_KEY = "super_secret_key_for_session"
\ No newline at end of file
+SECRET_KEY = "super_secret_key_for_session"
+
+# 启动预热配置 (服务开始监听后在后台执行：字体注册、Pandoc 探测、预加载 openai)
+WARMUP_PROCESS_POOLS = True   # 同时预先拉起绘图/解析进程池 (关闭则在首次使用时启动)
+
+# 文件解析配置
+FILE_PARSE_PROCESSES = 4      # 文档解析 (PDF/DOCX/Excel) 进程池大小
+VISION_MAX_WORKERS = 4        # 图片识别 (Vision) 并发线程上限
+FILE_PARSE_TIMEOUT = 180      # 单个文件解析超时 (秒)
+FILE_PARSE_MEMORY_MB = 1024   # 每个解析进程在预热后可额外占用的内存上限 (MB，仅 Linux/macOS 生效)
+PDF_PAGES_PER_JOB = 5         # 大 PDF 按页分段并行解析，每段页数
+
+# 绘图配置 (LLM 生成的 matplotlib 代码在独立进程中执行)
+PLOT_WORKERS = 4              # 绘图进程数
+PLOT_TIMEOUT = 30             # 单张图墙钟时限 (秒)，超时强制结束进程
+PLOT_CPU_SECONDS = 20         # 单张图 CPU 时间上限 (秒)
+PLOT_MEMORY_MB = 512          # 每个绘图进程在预热后可额外占用的内存上限 (MB)
+PLOT_CACHE_MEMORY_MB = 64     # 渲染结果内存缓存上限 (MB)
+PLOT_CACHE_DISK_MB = 512      # 渲染结果磁盘缓存上限 (MB)
+PLOT_CHART_SPEC = True        # 提示词要求常规图表输出 ```chart JSON 规格，由内置渲染器绘制 (不执行代码)
+# 渲染档位：preview 用于生成/改写时的流式预览 (体积小)，print 仅在导出 Word 时按需渲染
+# format 可选 png / jpeg / webp / svg (svg 仅适合预览)
+PLOT_PROFILES = {
+    'preview': {'dpi': 100, 'format': 'webp', 'quality': 80},
+    'print': {'dpi': 300, 'format': 'png'},
+}
+
+# Word 导出配置 (Pandoc 转换服务)
+EXPORT_PANDOC_WORKERS = 2     # 同时运行的 Pandoc 转换数
+EXPORT_QUEUE_MAX = 8          # 排队上限，超出后按 EXPORT_FALLBACK_ON_BUSY 处理
+EXPORT_FALLBACK_ON_BUSY = True  # 排队已满时改用 python-docx 直接生成 (False 则返回 503)
+EXPORT_PANDOC_TIMEOUT = 120   # 单次 Pandoc 转换超时 (秒)，超时结束进程并改用 python-docx
+EXPORT_JOB_TIMEOUT = 300      # 导出请求最长排队等待 (秒)，超时仍未开始转换即失败 (转换本身受 EXPORT_PANDOC_TIMEOUT 限制)
+EXPORT_CACHE_DISK_MB = 256    # 导出结果磁盘缓存上限 (MB)，按 内容哈希 + 排版选项 寻址
+EXPORT_CACHE_TTL_HOURS = 24   # 导出结果超过该时长未被下载即过期
+EXPORT_TEMP_DIR = None        # 转换临时目录 (None 表示 系统临时目录/articalcreator_export)
+EXPORT_TEMP_MAX_AGE = 3600    # 超过该秒数的临时子目录视为遗留 (进程异常退出)，定期清理
+
+# 图片库配置 (统计图按内容哈希存储，正文只保留 /img/<hash> 引用)
+IMAGE_STORE_DISK_MB = 1024    # 磁盘上限 (MB)，超出按最近访问时间淘汰
+IMAGE_STORE_TTL_DAYS = 30     # 超过该天数未被访问的图片自动过期
+
+# 开题报告解析配置 (粘贴文本)
+REPORT_TEXT_MAX_CHARS = 200000  # 粘贴文本字数上限，超出直接拒绝 (约为 100 页 Word)
+
+# 文档库配置 (服务端按章节保存每个任务的正文，位于 CACHE_DIR/documents)
+DOCSTORE_TTL_DAYS = 90        # 超过该天数未修改的任务文档自动清理
+
+# 缓存配置
+CACHE_DIR = "cache"                 # 磁盘缓存根目录
+EXTRACT_CACHE_MEMORY_ITEMS = 256    # 文件解析结果内存缓存条数
+EXTRACT_CACHE_DISK_MB = 512         # 文件解析结果磁盘缓存上限 (MB)
+
+# 图片识别 (Vision) 配置
+VISION_MODEL = "gemini-2.5-pro"     # 支持图片输入的模型
+VISION_MAX_EDGE = 1600              # 图片最长边缩放上限 (像素)
+VISION_IMAGE_FORMAT = "JPEG"        # 重新编码格式: JPEG / WEBP
+VISION_IMAGE_QUALITY = 85           # 重新编码质量
+VISION_BATCH_SIZE = 4               # 小图合批：单次请求最多几张 (1 表示不合批)
+VISION_BATCH_MAX_BYTES = 300 * 1024 # 压缩后不超过该体积的图片才参与合批
+
+# 上传配置
+UPLOAD_SPOOL_THRESHOLD = 1024 * 1024   # 超过该大小的上传文件转存到临时文件
+UPLOAD_SPOOL_DIR = None                # 临时文件目录 (None 表示系统默认)
+UPLOAD_MAX_REQUEST_MB = 100            # 单次请求上传总量上限 (MB)
+UPLOAD_MAX_USER_MB = 300               # 单用户同时驻留的上传总量上限 (MB)
+
+# 表格数据 (CSV/Excel) 摘要配置
+TABULAR_CHUNK_ROWS = 50000     # 分块读取行数
+TABULAR_SAMPLE_BYTES = 6000    # 摘要 + 抽样输出的字节预算
+
+# 文档提取预算 (生成与改写共用)
+EXTRACT_MAX_CHARS = 15000      # 单个文件最多提取字符数
+EXTRACT_MAX_PAGES = 15         # PDF 最多提取页数
+EXTRACT_MAX_SECONDS = 120      # 单个文件提取时限 (秒)
+
+# 超长文档摘要配置 (超过 EXTRACT_MAX_CHARS 的文档改为分段摘要，而不是直接截断)
+LLM_POOL_WORKERS = 8             # 全局共享的后台 LLM 调用并发上限 (分段摘要等)
+SUMMARY_MODEL = MODEL_NAME       # 摘要使用的模型
+SUMMARY_SOURCE_MAX_CHARS = 400000  # 摘要时最多读取的原文字数
+SUMMARY_SOURCE_MAX_PAGES = 300   # 摘要时 PDF 最多读取的页数
+SUMMARY_CHUNK_CHARS = 8000       # 每段原文的目标字数 (也是合并阶段单次输入上限)
+SUMMARY_CHUNK_OUTPUT = 800       # 每段摘要字数上限
+SUMMARY_DIGEST_CHARS = 12000     # 最终摘要字数上限
+SUMMARY_TIMEOUT = 300            # 单个文件摘要总时限 (秒)
+SUMMARY_CACHE_MB = 128           # 分段摘要磁盘缓存上限 (MB)
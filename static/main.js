@@ -20,6 +20,7 @@ window.isPaused = false;
 window.abortController = null; 
 window.selectedFiles = [];     
 window.currentEventIndex = 0;
+window.docVersion = 0;          // 服务端文档库版本号 (0 表示未同步)
 window.sectionUndoHistory = {}; 
 window.activeRefineTasks = 0;
 
@@ -420,6 +421,7 @@ window.saveCurrentTaskState = function() {
         content: fullMarkdownText,
         structure: parsedStructure,
         eventIndex: currentEventIndex, 
+        docVersion: docVersion, 
         logsHtml: document.getElementById('logArea').innerHTML, 
         undoHistory: sectionUndoHistory, 
         timestamp: Date.now()
@@ -450,6 +452,7 @@ window.loadTaskState = function(id) {
     parsedStructure = data.structure || [];
     fullMarkdownText = data.content || "";
     currentEventIndex = data.eventIndex || 0;
+    docVersion = data.docVersion || 0;
     sectionUndoHistory = data.undoHistory || {}; 
 
     if (parsedStructure.length > 0) renderConfigArea();
@@ -464,6 +467,7 @@ window.resetWorkspaceVariables = function() {
     parsedStructure = [];
     selectedFiles = []; 
     currentEventIndex = 0;
+    docVersion = 0;
     isPaused = false;
     currentRewritingTitle = null; 
     sectionUndoHistory = {}; 
@@ -557,6 +561,8 @@ if (paperForm) {
         
         if (fullMarkdownText && fullMarkdownText.length > 50) {
                 formData.append('initial_context', fullMarkdownText.slice(-3000));
+                // 续写：新章节追加到服务端文档，先确保服务端与本地一致
+                await ensureServerDocument().catch(() => {});
         }
 
         try {
@@ -621,6 +627,7 @@ window.subscribeTask = async function(taskId) {
                             appendLog(data.msg); 
                         } else if (data.type === 'content') {
                             fullMarkdownText += data.md;
+                            if (data.version) docVersion = data.version;
                             renderEnrichedResult(fullMarkdownText);
                             saveCurrentTaskState(); 
                         } else if (data.type === 'done') {
@@ -765,9 +772,14 @@ window.executeRewrite = async function() {
         formData.append('title', document.getElementById('paperTitle').value);
         formData.append('section_title', sectionTitle);
         formData.append('instruction', instruction);
-        formData.append('context', fullMarkdownText.slice(0, 1500));
         formData.append('custom_data', document.getElementById('customData').value);
-        formData.append('original_content', originalContent);
+        // 服务端已有同版本文档时只提交任务 id，原文与上下文由服务端读取
+        if (await ensureServerDocument().catch(() => false)) {
+            formData.append('task_id', currentTaskId);
+        } else {
+            formData.append('context', fullMarkdownText.slice(0, 1500));
+            formData.append('original_content', originalContent);
+        }
 
         // 【新增】循环添加所有选中的文件
         if (fileInput.files.length > 0) {
@@ -787,7 +799,9 @@ window.executeRewrite = async function() {
         if (data.status === 'success') {
             const newContent = data.content;
             currentRewritingTitle = null;
-            replaceSectionContent(sectionTitle, newContent);
+            // 带版本号说明服务端已写回，本地替换即可，无需再同步
+            replaceSectionContent(sectionTitle, newContent, !data.version);
+            if (data.version) docVersion = data.version;
             appendLog(`✅ 章节 [${sectionTitle}] 重写完成！`, 'info');
             saveCurrentTaskState(); 
         } else {
@@ -882,10 +896,14 @@ window.refineSection = async function(title) {
             title: document.getElementById('paperTitle').value,
             section_title: title,
             instruction: `请将上述内容精简到 ${targetWords} 字左右。要求：保留核心论点和数据，删除冗余修饰，确保语句通顺。`,
-            context: fullMarkdownText.slice(0, 1500), 
-            custom_data: document.getElementById('customData').value,
-            original_content: currentContent
+            custom_data: document.getElementById('customData').value
         };
+        if (await ensureServerDocument().catch(() => false)) {
+            formData.task_id = currentTaskId;
+        } else {
+            formData.context = fullMarkdownText.slice(0, 1500);
+            formData.original_content = currentContent;
+        }
 
         const res = await authenticatedFetch('/rewrite_section', {
             method: 'POST',
@@ -897,7 +915,8 @@ window.refineSection = async function(title) {
         if (data.status === 'success') {
             const newContent = data.content;
             currentRewritingTitle = null;
-            replaceSectionContent(title, newContent);
+            replaceSectionContent(title, newContent, !data.version);
+            if (data.version) docVersion = data.version;
             
             const newLen = newContent.replace(/\s/g, '').length;
             appendLog(`✅ 章节 [${title}] 精简完成！(当前: ${newLen}字)`, 'info');
@@ -916,7 +935,7 @@ window.refineSection = async function(title) {
     }
 };
 
-window.replaceSectionContent = function(title, newContent) {
+window.replaceSectionContent = function(title, newContent, syncServer = true) {
     const escapedTitle = escapeRegExp(title);
     let lines = newContent.trimEnd().replace(/\r\n/g, '\n').split('\n');
     let formattedLines = [];
@@ -967,10 +986,65 @@ window.replaceSectionContent = function(title, newContent) {
         
         renderEnrichedResult(fullMarkdownText);
         setTimeout(() => { if(container) container.scrollTop = scrollPos; }, 50);
+        if (syncServer) patchServerSection(title, formattedText);
         
     } else {
         console.warn("未在正文中找到章节，追加到末尾");
         fullMarkdownText += `\n\n### ${title}\n\n${formattedText}\n\n`;
         renderEnrichedResult(fullMarkdownText);
+        docVersion = 0; // 章节结构变化，下次导出/改写时整篇同步
+    }
+};
+
+// ============================================================
+// 服务端文档库同步 (导出、改写按 task_id 进行，请求体只含改动部分)
+// ============================================================
+
+// 单个章节改动提交到服务端；失败时标记为未同步，下次使用前整篇同步
+window.patchServerSection = async function(title, body) {
+    if (!docVersion || !currentTaskId) return;
+    const taskId = currentTaskId;
+    try {
+        const res = await authenticatedFetch(`/api/tasks/${taskId}/sections`, {
+            method: 'PATCH',
+            body: JSON.stringify({ title: title, body: body, formatted: true })
+        });
+        const data = await res.json();
+        if (taskId !== currentTaskId) return;
+        if (res.ok) { docVersion = data.version; saveCurrentTaskState(); }
+        else docVersion = 0;
+    } catch (e) {
+        if (taskId === currentTaskId) docVersion = 0;
     }
+};
+
+// 确保服务端文档与本地一致：版本相同直接返回；服务端更新则拉取全文；缺失或未同步则整篇上传
+window.ensureServerDocument = async function() {
+    if (!fullMarkdownText || !currentTaskId) return false;
+    const taskId = currentTaskId;
+    if (docVersion) {
+        const res = await authenticatedFetch(`/api/tasks/${taskId}/document?since=${docVersion}`, { method: 'GET' });
+        if (res.ok) {
+            const data = await res.json();
+            if (data.version === docVersion) return true;
+            if (data.version > docVersion) {
+                // 服务端有本地未见过的改动 (如其他页面的改写)：以服务端为准
+                const full = await (await authenticatedFetch(`/api/tasks/${taskId}/document?since=0`, { method: 'GET' })).json();
+                if (taskId !== currentTaskId) return false;
+                fullMarkdownText = full.sections.map(s => [s.heading, s.body].filter(Boolean).join('\n\n') + '\n\n').join('');
+                docVersion = full.version;
+                renderEnrichedResult(fullMarkdownText);
+                saveCurrentTaskState();
+                return true;
+            }
+        }
+    }
+    const res = await authenticatedFetch(`/api/tasks/${taskId}/document`, {
+        method: 'PUT',
+        body: JSON.stringify({ content: fullMarkdownText })
+    });
+    if (!res.ok || taskId !== currentTaskId) return false;
+    docVersion = (await res.json()).version;
+    saveCurrentTaskState();
+    return true;
 };
\ No newline at end of file
@@ -127,6 +127,32 @@ window.exportToMarkdown = function() {
     a.download = `${document.getElementById('paperTitle').value || 'thesis'}.md`; a.click();
 };
 
+// 读取导出任务的事件流，直到完成或失败；onProgress 接收排队/转换进度
+window.waitExportJob = async function(jobId, onProgress) {
+    const response = await authenticatedFetch(`/stream_progress?task_id=${jobId}&last_index=0`, { method: 'GET' });
+    if (!response.ok) throw new Error("连接导出进度失败");
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const lines = buffer.split('\n\n');
+        buffer = lines.pop();
+        for (const line of lines) {
+            const trimmed = line.trim();
+            if (!trimmed.startsWith('data: ')) continue;
+            const data = JSON.parse(trimmed.replace('data: ', ''));
+            if (data.type === 'export_progress') onProgress(data);
+            else if (data.type === 'export_done') { reader.cancel(); return data; }
+            else if (data.type === 'export_error') { reader.cancel(); throw new Error(data.msg); }
+        }
+    }
+    throw new Error("导出进度连接中断");
+};
+
 window.exportToDocx = async function() {
     if(!fullMarkdownText) return alert("无内容可导出");
     
@@ -135,34 +161,49 @@ window.exportToDocx = async function() {
     if(btn) { btn.innerText = "生成中..."; btn.disabled = true; }
 
     try {
-        const res = await authenticatedFetch('/export_docx', { 
+        // 1. 提交导出任务 (服务端异步转换，未修改的论文直接命中缓存)
+        //    服务端文档与本地同步时只提交 task_id + 版本号，否则提交全文
+        const synced = await ensureServerDocument().catch(() => false);
+        let submit = await authenticatedFetch('/api/export_jobs', { 
             method: 'POST', 
-            body: JSON.stringify({ content: fullMarkdownText }) 
+            body: JSON.stringify(synced ? { task_id: currentTaskId, version: docVersion } : { content: fullMarkdownText }) 
         });
-        
+        if (synced && (submit.status === 404 || submit.status === 409)) {
+            docVersion = 0;
+            submit = await authenticatedFetch('/api/export_jobs', { 
+                method: 'POST', 
+                body: JSON.stringify({ content: fullMarkdownText }) 
+            });
+        }
+        const job = await submit.json();
+        if (!submit.ok) return alert("导出失败: " + (job.error || "未知错误"));
+
+        // 2. 等待完成 (排队位置、转换状态实时显示在按钮上)
+        if (!job.cached) {
+            await waitExportJob(job.job_id, (p) => { if (btn) btn.innerText = p.msg; });
+        }
+
+        // 3. 下载结果
+        const res = await authenticatedFetch(`/api/export_jobs/${job.job_id}`, { method: 'GET' });
         if (res.ok) {
-            // 1. 获取 Blob 数据
             const blob = await res.blob();
             
-            // 2. 强制指定 MIME 类型 (关键)
+            // 强制指定 MIME 类型 (关键)
             const newBlob = new Blob([blob], {
                 type: "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
             });
 
-            // 3. 创建下载链接
             const url = window.URL.createObjectURL(newBlob);
             const a = document.createElement('a');
             a.style.display = 'none';
             a.href = url;
             
-            // 4. 获取文件名
             const title = document.getElementById('paperTitle').value || 'thesis';
             a.download = `${title}.docx`;
             
             document.body.appendChild(a);
             a.click();
             
-            // 5. 清理
             setTimeout(() => {
                 document.body.removeChild(a);
                 window.URL.revokeObjectURL(url);
@@ -174,7 +215,7 @@ window.exportToDocx = async function() {
         }
     } catch(e) { 
         console.error(e);
-        alert("网络请求失败或浏览器拦截了下载。请检查浏览器地址栏是否允许'不安全内容'。"); 
+        alert("导出失败: " + e.message); 
     } finally {
         if(btn) { btn.innerText = originalText; btn.disabled = false; }
     }
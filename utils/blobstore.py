@@ -0,0 +1,59 @@
+# utils/blobstore.py
+import re
+import json
+import hashlib
+import config
+from utils.cache import ContentCache
+
+# 按内容哈希寻址的图片存储：正文中只保留 /img/<hash>.<ext> 短引用，
+# 生成事件、浏览器草稿、导出请求都不再携带 base64 图片数据
+_TTL = config.IMAGE_STORE_TTL_DAYS * 24 * 3600
+
+image_store = ContentCache(
+    'images',
+    max_items=256,
+    max_memory_bytes=32 * 1024 * 1024,
+    max_disk_bytes=config.IMAGE_STORE_DISK_MB * 1024 * 1024,
+    ttl_seconds=_TTL
+)
+# 元数据：{'mime', 'size', 'code'}，code 为统计图的绘图代码 (导出时据此重新渲染)
+image_meta = ContentCache(
+    'image_meta',
+    max_items=2048,
+    max_memory_bytes=8 * 1024 * 1024,
+    max_disk_bytes=64 * 1024 * 1024,
+    ttl_seconds=_TTL
+)
+
+_EXT_BY_MIME = {'image/png': 'png', 'image/jpeg': 'jpg', 'image/webp': 'webp', 'image/gif': 'gif', 'image/svg+xml': 'svg'}
+
+# 匹配正文中的图片引用 (Markdown 与 <img> 中的 URL 均可)
+IMAGE_REF_PATTERN = re.compile(r'/img/(?P<hash>[0-9a-f]{64})(?:\.(?P<ext>[a-z]+))?')
+
+def image_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+def put_image(data: bytes, mime: str, code: str = None) -> str:
+    """存入图片，返回内容哈希 (重复内容只存一份)"""
+    h = image_hash(data)
+    if image_meta.get(h) is None or image_store.get(h) is None:
+        image_store.set(h, data)
+        meta = {'mime': mime, 'size': len(data)}
+        if code: meta['code'] = code
+        image_meta.set_text(h, json.dumps(meta, ensure_ascii=False))
+    return h
+
+def get_image(h: str) -> tuple:
+    """返回 (图片字节, 元数据)；不存在或已过期返回 (None, None)"""
+    data = image_store.get(h)
+    raw_meta = image_meta.get_text(h)
+    if data is None or raw_meta is None:
+        return None, None
+    return data, json.loads(raw_meta)
+
+def get_image_meta(h: str):
+    raw_meta = image_meta.get_text(h)
+    return json.loads(raw_meta) if raw_meta is not None else None
+
+def image_url(h: str, mime: str) -> str:
+    return f"/img/{h}.{_EXT_BY_MIME.get(mime, 'png')}"
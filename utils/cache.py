@@ -0,0 +1,218 @@
+# utils/cache.py
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+import config
+
+# 所有缓存实例的注册表，用于统一输出命中率统计
+_CACHES = {}
+
+def content_key(data, *options) -> str:
+    """
+    计算内容哈希键：SHA-256(文件字节) + 版本/选项
+    data 可以是 bytes 或可 seek 的文件流 (分块读取，不整体复制)
+    """
+    h = hashlib.sha256()
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        h.update(data)
+    else:
+        data.seek(0)
+        while True:
+            chunk = data.read(1024 * 1024)
+            if not chunk: break
+            h.update(chunk)
+        data.seek(0)
+    for opt in options:
+        h.update(b'\x00' + str(opt).encode('utf-8'))
+    return h.hexdigest()
+
+class ContentCache:
+    """
+    两级缓存 (内存 + 磁盘)，按内容哈希寻址，值为 bytes
+    - 内存层：OrderedDict 实现 LRU，按条数与字节数双重限制
+    - 磁盘层：按访问时间 (mtime) 淘汰，超出容量时清理到 90%
+    - ttl_seconds (可选)：磁盘条目超过该时长未被访问即过期 (每次命中都会续期)
+    多进程共享磁盘目录是安全的 (写入走临时文件 + os.replace)
+    """
+    def __init__(self, name, max_items=256, max_memory_bytes=64 * 1024 * 1024, max_disk_bytes=512 * 1024 * 1024, disk_dir=None, ttl_seconds=None):
+        self.name = name
+        self.ttl_seconds = ttl_seconds
+        self.max_items = max_items
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.disk_dir = disk_dir if disk_dir is not None else os.path.join(config.CACHE_DIR, name)
+
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._disk_bytes = None  # 首次写盘时再统计，避免启动时扫描目录
+        self._last_purge = time.time()
+        self._evicting = False
+        self._stats = {'hits': 0, 'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'sets': 0, 'evictions': 0}
+        _CACHES[name] = self
+
+    # ---------- 内存层 ----------
+    def _memory_put(self, key, value):
+        if key in self._memory:
+            self._memory_bytes -= len(self._memory.pop(key))
+        if len(value) > self.max_memory_bytes: return
+        self._memory[key] = value
+        self._memory_bytes += len(value)
+        while len(self._memory) > self.max_items or self._memory_bytes > self.max_memory_bytes:
+            _, old = self._memory.popitem(last=False)
+            self._memory_bytes -= len(old)
+            self._stats['evictions'] += 1
+
+    # ---------- 磁盘层 ----------
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, key[:2], key)
+
+    def _disk_get(self, key):
+        if not self.disk_dir: return None
+        path = self._disk_path(key)
+        try:
+            if self.ttl_seconds and time.time() - os.stat(path).st_mtime > self.ttl_seconds:
+                os.remove(path)
+                return None
+            with open(path, 'rb') as f:
+                value = f.read()
+            os.utime(path, None)  # 刷新访问时间，供 LRU 淘汰参考
+            return value
+        except OSError:
+            return None
+
+    def _disk_touch(self, key):
+        if not self.disk_dir: return
+        try:
+            os.utime(self._disk_path(key), None)
+        except OSError:
+            pass
+
+    def _disk_put(self, key, value):
+        """写入磁盘 (临时文件 + os.replace)，在锁外调用；只在更新字节计数与判断是否淘汰时短暂持锁"""
+        if not self.disk_dir or len(value) > self.max_disk_bytes: return
+        path = self._disk_path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            try:
+                old_size = os.stat(path).st_size  # 覆盖已有条目时扣除旧文件大小
+            except OSError:
+                old_size = 0
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(value)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"[Cache:{self.name}] 写入磁盘失败: {e}")
+            return
+        with self._lock:
+            need_scan = self._disk_bytes is None
+            if not need_scan:
+                self._disk_bytes += len(value) - old_size
+        if need_scan:
+            total = self._scan_disk_bytes()
+            with self._lock:
+                if self._disk_bytes is None: self._disk_bytes = total
+        with self._lock:
+            # 设置了 TTL 时每小时顺带清理一次过期条目；同一时间只有一个线程执行淘汰
+            due = (self.ttl_seconds and time.time() - self._last_purge > 3600) or self._disk_bytes > self.max_disk_bytes
+            if not due or self._evicting: return
+            self._evicting = True
+            self._last_purge = time.time()
+        try:
+            self._evict_disk()
+        finally:
+            with self._lock: self._evicting = False
+
+    def _list_disk_files(self):
+        files = []
+        for root, _, names in os.walk(self.disk_dir):
+            for n in names:
+                if n.endswith('.tmp'): continue
+                p = os.path.join(root, n)
+                try:
+                    st = os.stat(p)
+                    files.append((st.st_mtime, st.st_size, p))
+                except OSError:
+                    pass
+        return files
+
+    def _scan_disk_bytes(self):
+        return sum(size for _, size, _ in self._list_disk_files())
+
+    def _evict_disk(self):
+        """扫描目录并按访问时间淘汰 (锁外执行，完成后更新字节计数)"""
+        files = sorted(self._list_disk_files())
+        total = sum(size for _, size, _ in files)
+        target = int(self.max_disk_bytes * 0.9) if total > self.max_disk_bytes else total
+        expire_before = time.time() - self.ttl_seconds if self.ttl_seconds else 0
+        removed = 0
+        for mtime, size, p in files:
+            if total <= target and mtime >= expire_before: break
+            try:
+                os.remove(p)
+                total -= size
+                removed += 1
+            except OSError:
+                pass
+        with self._lock:
+            self._disk_bytes = total
+            self._stats['evictions'] += removed
+
+    # ---------- 对外接口 ----------
+    def get(self, key):
+        # 锁只保护内存 LRU 与计数；磁盘读取、续期在锁外进行 (内存命中不会被其他线程的磁盘读写阻塞)
+        with self._lock:
+            value = self._memory.get(key)
+            if value is not None:
+                self._memory.move_to_end(key)
+                self._stats['hits'] += 1
+                self._stats['memory_hits'] += 1
+        if value is not None:
+            if self.ttl_seconds: self._disk_touch(key)  # 内存命中也为磁盘条目续期
+            return value
+        value = self._disk_get(key)
+        with self._lock:
+            if value is not None:
+                self._memory_put(key, value)
+                self._stats['hits'] += 1
+                self._stats['disk_hits'] += 1
+            else:
+                self._stats['misses'] += 1
+        return value
+
+    def set(self, key, value: bytes):
+        with self._lock:
+            self._memory_put(key, value)
+            self._stats['sets'] += 1
+        self._disk_put(key, value)
+
+    def get_text(self, key):
+        value = self.get(key)
+        return value.decode('utf-8') if value is not None else None
+
+    def set_text(self, key, text: str):
+        self.set(key, text.encode('utf-8'))
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._stats['hits'] + self._stats['misses']
+            return {
+                **self._stats,
+                'hit_rate': round(self._stats['hits'] / lookups, 4) if lookups else 0.0,
+                'memory_items': len(self._memory),
+                'memory_bytes': self._memory_bytes,
+                'disk_bytes': self._disk_bytes,
+            }
+
+def all_cache_stats() -> dict:
+    return {name: cache.stats() for name, cache in _CACHES.items()}
+
+# 上传文件解析结果缓存 (跨任务、跨用户共享)
+extraction_cache = ContentCache(
+    'extraction',
+    max_items=config.EXTRACT_CACHE_MEMORY_ITEMS,
+    max_disk_bytes=config.EXTRACT_CACHE_DISK_MB * 1024 * 1024
+)
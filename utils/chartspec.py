@@ -0,0 +1,152 @@
+# utils/chartspec.py
+import json
+
+# 声明式图表规格：常规统计图由 LLM 输出 ```chart JSON，内置渲染器直接绘制，
+# 不执行任意代码；规格无法表达的图仍走 Python 代码 (exec) 路径
+#
+# {"type": "bar", "title": "...", "x_label": "...", "y_label": "...", "unit": "亿元",
+#  "labels": ["2021", "2022"], "series": [{"name": "营业收入", "values": [12.5, 15.3]}]}
+CHART_TYPES = ('bar', 'barh', 'stacked_bar', 'line', 'pie', 'scatter')
+MAX_POINTS = 200
+MAX_SERIES = 8
+
+class ChartSpecError(ValueError):
+    """图表规格无法解析或不受支持"""
+    pass
+
+def is_chart_spec(source: str) -> bool:
+    """Python 绘图代码不可能以 { 开头，据此区分两种代码块"""
+    return source.lstrip().startswith('{')
+
+def _numbers(values, field) -> list:
+    if not isinstance(values, list) or not values:
+        raise ChartSpecError(f"{field} 必须是非空数组")
+    if len(values) > MAX_POINTS:
+        raise ChartSpecError(f"{field} 数据点过多 (>{MAX_POINTS})")
+    result = []
+    for v in values:
+        if isinstance(v, bool): raise ChartSpecError(f"{field} 含非数值: {v}")
+        try:
+            result.append(float(v))
+        except (TypeError, ValueError):
+            raise ChartSpecError(f"{field} 含非数值: {v}")
+    return result
+
+def _text(spec, key) -> str:
+    value = spec.get(key)
+    return str(value).strip() if value is not None else ""
+
+def parse_chart_spec(source: str) -> dict:
+    """解析并校验图表规格，返回规范化后的 dict (字段齐全、数值为 float)；不合法时抛出 ChartSpecError"""
+    try:
+        spec = json.loads(source)
+    except json.JSONDecodeError as e:
+        raise ChartSpecError(f"图表规格不是合法 JSON: {e.msg} (第 {e.lineno} 行)")
+    if not isinstance(spec, dict):
+        raise ChartSpecError("图表规格必须是 JSON 对象")
+
+    chart_type = _text(spec, 'type').lower()
+    if chart_type not in CHART_TYPES:
+        raise ChartSpecError(f"不支持的图表类型: {chart_type or '(空)'}，可选 {'/'.join(CHART_TYPES)}")
+
+    raw_series = spec.get('series')
+    if isinstance(raw_series, dict): raw_series = [raw_series]
+    if not isinstance(raw_series, list) or not raw_series:
+        raise ChartSpecError("series 必须是非空数组")
+    if len(raw_series) > MAX_SERIES:
+        raise ChartSpecError(f"series 过多 (>{MAX_SERIES})")
+
+    labels = [str(label) for label in spec.get('labels') or []]
+    series = []
+    for idx, s in enumerate(raw_series):
+        if not isinstance(s, dict): raise ChartSpecError(f"series[{idx}] 必须是对象")
+        item = {'name': _text(s, 'name'), 'values': _numbers(s.get('values', s.get('y')), f"series[{idx}].values")}
+        if chart_type == 'scatter':
+            item['x'] = _numbers(s.get('x'), f"series[{idx}].x")
+            if len(item['x']) != len(item['values']):
+                raise ChartSpecError(f"series[{idx}] 的 x 与 values 长度不一致")
+        elif len(item['values']) != len(labels):
+            raise ChartSpecError(f"series[{idx}].values 与 labels 长度不一致 ({len(item['values'])} != {len(labels)})")
+        series.append(item)
+
+    if chart_type == 'pie':
+        if len(series) != 1: raise ChartSpecError("饼图只能有一个 series")
+        if any(v < 0 for v in series[0]['values']) or sum(series[0]['values']) <= 0:
+            raise ChartSpecError("饼图数值必须非负且总和大于 0")
+
+    return {
+        'type': chart_type,
+        'title': _text(spec, 'title'),
+        'x_label': _text(spec, 'x_label'),
+        'y_label': _text(spec, 'y_label'),
+        'unit': _text(spec, 'unit'),
+        'labels': labels,
+        'series': series,
+    }
+
+def canonical_spec(spec: dict) -> str:
+    """规范化 JSON 文本 (缓存键、图片库元数据均使用该形式)"""
+    return json.dumps(spec, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+
+# ===================== 绘制 (在绘图进程中执行) =====================
+
+def _palette(n: int) -> list:
+    from matplotlib import colormaps
+    cmap = colormaps['viridis']
+    return [cmap(0.5)] if n == 1 else [cmap(0.9 * i / (n - 1)) for i in range(n)]
+
+def draw_chart(fig, spec: dict):
+    """在给定 Figure 上绘制规范化后的图表 (调用前 fig 已清空)，风格与代码模板一致 (whitegrid + viridis)"""
+    import numpy as np
+    ax = fig.add_subplot(111)
+    chart_type, labels, series = spec['type'], spec['labels'], spec['series']
+    y_label = f"{spec['y_label']} ({spec['unit']})" if spec['unit'] and spec['y_label'] else (spec['y_label'] or spec['unit'])
+    multi = len(series) > 1
+
+    if chart_type == 'pie':
+        ax.pie(series[0]['values'], labels=labels, autopct='%1.1f%%', startangle=90,
+               colors=_palette(len(labels)), wedgeprops={'edgecolor': 'white'})
+        ax.axis('equal')
+    elif chart_type == 'scatter':
+        colors = _palette(len(series))
+        for color, s in zip(colors, series):
+            ax.scatter(s['x'], s['values'], label=s['name'] or None, color=color, alpha=0.8)
+    elif chart_type == 'line':
+        x = np.arange(len(labels))
+        colors = _palette(len(series))
+        for color, s in zip(colors, series):
+            ax.plot(x, s['values'], marker='o', linewidth=2, label=s['name'] or None, color=color)
+        ax.set_xticks(x, labels)
+    else:
+        x = np.arange(len(labels))
+        horizontal = chart_type == 'barh'
+        bar = ax.barh if horizontal else ax.bar
+        if not multi:
+            # 单系列：每个类别一种颜色 (与模板中 hue=x, palette='viridis' 一致)
+            bar(x, series[0]['values'], 0.8, color=_palette(len(labels)))
+        elif chart_type == 'stacked_bar':
+            bottom = np.zeros(len(labels))
+            for color, s in zip(_palette(len(series)), series):
+                ax.bar(x, s['values'], 0.8, bottom=bottom, label=s['name'] or None, color=color)
+                bottom += np.array(s['values'])
+        else:
+            width = 0.8 / len(series)
+            for i, (color, s) in enumerate(zip(_palette(len(series)), series)):
+                offset = (i - (len(series) - 1) / 2) * width
+                bar(x + offset, s['values'], width, label=s['name'] or None, color=color)
+        if horizontal:
+            ax.set_yticks(x, labels)
+            ax.invert_yaxis()
+        else:
+            ax.set_xticks(x, labels)
+        if len(labels) > 8 and not horizontal:
+            ax.tick_params(axis='x', labelrotation=30)
+
+    if spec['title']: ax.set_title(spec['title'])
+    if chart_type != 'pie':
+        x_label, value_label = spec['x_label'], y_label
+        if chart_type == 'barh': x_label, value_label = value_label, x_label
+        if x_label: ax.set_xlabel(x_label)
+        if value_label: ax.set_ylabel(value_label)
+    if multi: ax.legend()
+    return ax
@@ -0,0 +1,266 @@
+# utils/docstore.py
+import os
+import re
+import json
+import math
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+import config
+
+# 服务端论文文档库：每个任务的正文按章节保存为有序列表，带版本号
+# - 生成过程中每产出一个章节即追加一节
+# - 改写 / 人工编辑只提交单个章节 (PATCH)，导出按 task_id 直接取全文
+# - 客户端凭版本号拉取增量 (since=N 只返回之后改动过的章节)
+# 写入即落盘 (JSON，临时文件 + os.replace)，重启后按需加载
+
+_HEADING_RE = re.compile(r'^\s*(#{1,6})\s*(.*?)\s*$')
+_HEADING_LINE_RE = re.compile(r'^\s*#{1,6}\s')
+_FENCE_RE = re.compile(r'^\s*```')
+_TASK_ID_RE = re.compile(r'^[\w\-]{1,64}$')
+_LIST_PREFIX_RE = re.compile(r'^(\#|\||`|- |\* |> )')
+_LEADING_SPACES_RE = re.compile(r'^( +)')
+
+class DocumentNotFound(KeyError):
+    """任务没有服务端文档 (或章节不存在)"""
+    pass
+
+class VersionConflict(Exception):
+    """章节在 base_version 之后已被修改"""
+    def __init__(self, current):
+        self.current = current
+        super().__init__(f"章节已被修改 (当前版本 {current})，请刷新后重试")
+
+def normalize_title(title: str) -> str:
+    """章节标题比较用：去掉空白 (与前端 normalizeTitle 一致)"""
+    return re.sub(r'\s+', '', title or '')
+
+def format_section_body(text: str) -> str:
+    """
+    章节正文排版 (与前端 replaceSectionContent 相同)：
+    去空行，普通段落首行缩进两个全角空格，表格行去缩进，表格后补空行
+    """
+    lines = (text or '').rstrip().replace('\r\n', '\n').split('\n')
+    formatted = []
+    for line in lines:
+        line = line.rstrip()
+        if not line: continue
+        if not _LIST_PREFIX_RE.match(line.lstrip()):
+            if line.startswith('　　'): processed = line
+            elif line.startswith('  '): processed = _LEADING_SPACES_RE.sub(lambda m: '　' * math.ceil(len(m.group(1)) / 2), line)
+            else: processed = '　　' + line.lstrip()
+        else:
+            processed = line.strip() if line.lstrip().startswith('|') else line
+        if formatted and formatted[-1].strip().startswith('|') and not processed.strip().startswith('|'):
+            formatted.append('')
+        formatted.append(processed)
+    return '\n'.join(formatted)
+
+def split_sections(markdown: str) -> list:
+    """按标题行切分为 [(标题行, 正文)]；代码块内的 # 不算标题，首个标题之前的内容标题行为空"""
+    sections, heading, body, in_fence = [], '', [], False
+    for line in (markdown or '').replace('\r\n', '\n').split('\n'):
+        if _FENCE_RE.match(line): in_fence = not in_fence
+        if not in_fence and _HEADING_LINE_RE.match(line):
+            if heading or '\n'.join(body).strip():
+                sections.append((heading, '\n'.join(body).strip()))
+            heading, body = line.strip(), []
+        else:
+            body.append(line)
+    if heading or '\n'.join(body).strip():
+        sections.append((heading, '\n'.join(body).strip()))
+    return sections
+
+def _parse_heading(heading: str) -> tuple:
+    """标题行 -> (级别, 标题文本)；无标题的前置内容为 (0, '')"""
+    match = _HEADING_RE.match(heading)
+    return (len(match.group(1)), match.group(2)) if match and heading else (0, '')
+
+class TaskDocument:
+    """单个任务的文档：sections 为有序章节列表，每节 {'id', 'heading', 'title', 'level', 'body', 'version'}"""
+    def __init__(self, data=None):
+        data = data or {}
+        self.version = data.get('version', 0)
+        self.next_id = data.get('next_id', 1)
+        self.sections = data.get('sections', [])
+        self.updated = data.get('updated', time.time())
+
+    def to_dict(self) -> dict:
+        return {'version': self.version, 'next_id': self.next_id, 'sections': self.sections, 'updated': self.updated}
+
+    @staticmethod
+    def section_markdown(section) -> str:
+        parts = [p for p in (section['heading'], section['body']) if p]
+        return '\n\n'.join(parts) + '\n\n'
+
+    def to_markdown(self) -> str:
+        return ''.join(self.section_markdown(s) for s in self.sections)
+
+    def _bump(self) -> int:
+        self.version += 1
+        self.updated = time.time()
+        return self.version
+
+    def _new_section(self, heading, body) -> dict:
+        level, title = _parse_heading(heading)
+        section = {'id': f"s{self.next_id}", 'heading': heading, 'title': title, 'level': level,
+                   'body': body, 'version': self.version}
+        self.next_id += 1
+        return section
+
+    def append(self, markdown: str) -> list:
+        """追加一段 Markdown (通常是生成的一个章节)，返回新章节 id 列表"""
+        self._bump()
+        new = [self._new_section(h, b) for h, b in split_sections(markdown)]
+        self.sections.extend(new)
+        return [s['id'] for s in new]
+
+    def replace_all(self, markdown: str):
+        self._bump()
+        self.sections = [self._new_section(h, b) for h, b in split_sections(markdown)]
+
+    def find(self, section_id=None, title=None) -> dict:
+        if section_id:
+            for s in self.sections:
+                if s['id'] == section_id: return s
+        elif title:
+            key = normalize_title(title)
+            for s in self.sections:
+                if s['title'] and normalize_title(s['title']) == key: return s
+        raise DocumentNotFound(section_id or title)
+
+    def patch(self, section, body: str, base_version=None) -> dict:
+        """替换章节正文 (已排版)；base_version 之后该节被改过则抛出 VersionConflict"""
+        if base_version is not None and section['version'] > base_version:
+            raise VersionConflict(section['version'])
+        section['body'] = body
+        section['version'] = self._bump()
+        return section
+
+    def changes_since(self, since: int) -> dict:
+        """增量：版本号、全部章节顺序、since 之后改动过的章节"""
+        return {
+            'version': self.version,
+            'order': [s['id'] for s in self.sections],
+            'sections': [s for s in self.sections if s['version'] > since],
+        }
+
+class DocumentStore:
+    """
+    按 (user_id, task_id) 存取 TaskDocument：内存中保留最近使用的文档 (LRU)，每次修改同步写盘
+    所有操作在一把锁内完成 (单次操作只涉及一个文档，耗时在毫秒级)
+    """
+    def __init__(self, root=None, max_memory_docs=256):
+        self.root = root or os.path.join(config.CACHE_DIR, 'documents')
+        self.max_memory_docs = max_memory_docs
+        self._lock = threading.RLock()
+        self._docs = OrderedDict()
+        self._swept = False
+
+    def _path(self, user_id, task_id) -> str:
+        if not task_id or not _TASK_ID_RE.match(task_id):
+            raise ValueError(f"非法的 task_id: {task_id}")
+        user_dir = hashlib.sha256(str(user_id).encode('utf-8')).hexdigest()[:16]
+        return os.path.join(self.root, user_dir, f"{task_id}.json")
+
+    def _sweep(self):
+        """首次访问时清理超过 DOCSTORE_TTL_DAYS 未修改的文档"""
+        self._swept = True
+        if not os.path.isdir(self.root): return
+        expire = time.time() - config.DOCSTORE_TTL_DAYS * 24 * 3600
+        for dirpath, _, names in os.walk(self.root):
+            for name in names:
+                path = os.path.join(dirpath, name)
+                try:
+                    if os.path.getmtime(path) < expire: os.remove(path)
+                except OSError:
+                    continue
+
+    def _load(self, user_id, task_id):
+        key = (user_id, task_id)
+        doc = self._docs.get(key)
+        if doc is not None:
+            self._docs.move_to_end(key)
+            return doc
+        if not self._swept: self._sweep()
+        try:
+            with open(self._path(user_id, task_id), 'r', encoding='utf-8') as f:
+                doc = TaskDocument(json.load(f))
+        except (OSError, ValueError):
+            return None
+        self._remember(key, doc)
+        return doc
+
+    def _remember(self, key, doc):
+        self._docs[key] = doc
+        self._docs.move_to_end(key)
+        while len(self._docs) > self.max_memory_docs:
+            self._docs.popitem(last=False)
+
+    def _save(self, user_id, task_id, doc):
+        path = self._path(user_id, task_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(doc.to_dict(), f, ensure_ascii=False)
+        os.replace(tmp, path)
+
+    def get(self, user_id, task_id) -> TaskDocument:
+        """返回文档，不存在抛出 DocumentNotFound"""
+        with self._lock:
+            doc = self._load(user_id, task_id)
+            if doc is None: raise DocumentNotFound(task_id)
+            return doc
+
+    def markdown(self, user_id, task_id) -> tuple:
+        """返回 (全文 Markdown, 版本号)"""
+        with self._lock:
+            doc = self.get(user_id, task_id)
+            return doc.to_markdown(), doc.version
+
+    def changes_since(self, user_id, task_id, since: int = 0) -> dict:
+        with self._lock:
+            changes = self.get(user_id, task_id).changes_since(since)
+            return {**changes, 'sections': [dict(s) for s in changes['sections']]}
+
+    def append(self, user_id, task_id, markdown: str) -> tuple:
+        """追加章节 (文档不存在时新建)，返回 (新章节 id 列表, 版本号)"""
+        with self._lock:
+            doc = self._load(user_id, task_id)
+            if doc is None:
+                doc = TaskDocument()
+                self._remember((user_id, task_id), doc)
+            ids = doc.append(markdown)
+            self._save(user_id, task_id, doc)
+            return ids, doc.version
+
+    def replace(self, user_id, task_id, markdown: str) -> int:
+        """整篇替换 (客户端首次同步或重新生成)，返回版本号；版本号延续旧文档，保证单调递增"""
+        with self._lock:
+            doc = self._load(user_id, task_id)
+            if doc is None:
+                doc = TaskDocument()
+                self._remember((user_id, task_id), doc)
+            doc.replace_all(markdown)
+            self._save(user_id, task_id, doc)
+            return doc.version
+
+    def patch_section(self, user_id, task_id, body: str, section_id=None, title=None, base_version=None, formatted=False) -> tuple:
+        """
+        替换单个章节的正文 (按 id 或标题定位)，返回 (章节副本, 版本号)
+        formatted=False 时先按前端规则排版 (AI 改写结果)
+        """
+        with self._lock:
+            doc = self.get(user_id, task_id)
+            section = doc.find(section_id, title)
+            doc.patch(section, body if formatted else format_section_body(body), base_version)
+            self._save(user_id, task_id, doc)
+            return dict(section), doc.version
+
+    def section(self, user_id, task_id, section_id=None, title=None) -> dict:
+        with self._lock:
+            return dict(self.get(user_id, task_id).find(section_id, title))
+
+# 全局唯一的文档库实例
+doc_store = DocumentStore()
@@ -0,0 +1,275 @@
+# utils/docxformat.py
+import io
+import zipfile
+from lxml import etree
+
+# Pandoc 输出的统一排版：直接在 document.xml / styles.xml 上单次遍历完成，
+# 不构造 python-docx 的 Paragraph / Run / Cell 代理对象 (大文档上这些对象有数万个)
+# 规则与改写前的 python-docx 实现一致，新增子元素按 OOXML 规定的顺序插入，输出 XML 与原实现逐字节相同
+
+W_NS = 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
+
+def _w(tag: str) -> str:
+    return f'{{{W_NS}}}{tag}'
+
+# ===================== 排版规则 (只在此处定义一次) =====================
+FONT_LATIN = 'Times New Roman'
+FONT_BODY_CN = '宋体'
+FONT_HEADING_CN = '黑体'
+
+STYLE_NORMAL = {'size': 12, 'line': 360}                           # Normal 样式：小四、1.5 倍行距
+HEADING = {'size': 16, 'bold': True, 'line': 360, 'space': 240}    # 标题：三号黑体加粗，段前段后 12 磅
+BODY = {'size': 12, 'line': 360, 'indent': 480}                    # 正文：首行缩进 2 字符 (24 磅)、两端对齐
+TABLE = {'size': 10.5, 'line': 288}                                # 表格：五号、1.2 倍行距、居中，首行加粗
+TABLE_BORDERS = (                                                  # 三线表：顶底粗线，中间细线，无竖线
+    ('top', 'single', 24), ('bottom', 'single', 24), ('insideH', 'single', 6),
+    ('left', 'nil', 0), ('right', 'nil', 0), ('insideV', 'nil', 0),
+)
+
+# ===================== 子元素顺序 (OOXML schema) =====================
+_PPR_SEQ = ('pStyle', 'keepNext', 'keepLines', 'pageBreakBefore', 'framePr', 'widowControl', 'numPr',
+            'suppressLineNumbers', 'pBdr', 'shd', 'tabs', 'suppressAutoHyphens', 'kinsoku', 'wordWrap',
+            'overflowPunct', 'topLinePunct', 'autoSpaceDE', 'autoSpaceDN', 'bidi', 'adjustRightInd',
+            'snapToGrid', 'spacing', 'ind', 'contextualSpacing', 'mirrorIndents', 'suppressOverlap', 'jc',
+            'textDirection', 'textAlignment', 'textboxTightWrap', 'outlineLvl', 'divId', 'cnfStyle', 'rPr',
+            'sectPr', 'pPrChange')
+_RPR_SEQ = ('rStyle', 'rFonts', 'b', 'bCs', 'i', 'iCs', 'caps', 'smallCaps', 'strike', 'dstrike', 'outline',
+            'shadow', 'emboss', 'imprint', 'noProof', 'snapToGrid', 'vanish', 'webHidden', 'color', 'spacing',
+            'w', 'kern', 'position', 'sz', 'szCs', 'highlight', 'u', 'effect', 'bdr', 'shd', 'fitText',
+            'vertAlign', 'rtl', 'cs', 'em', 'lang', 'eastAsianLayout', 'specVanish', 'oMath')
+_TBLPR_SEQ = ('tblStyle', 'tblpPr', 'tblOverlap', 'bidiVisual', 'tblStyleRowBandSize', 'tblStyleColBandSize',
+              'tblW', 'jc', 'tblCellSpacing', 'tblInd', 'tblBorders', 'shd', 'tblLayout', 'tblCellMar',
+              'tblLook', 'tblCaption', 'tblDescription', 'tblPrChange')
+_TCPR_SEQ = ('cnfStyle', 'tcW', 'gridSpan', 'hMerge', 'vMerge', 'tcBorders', 'shd', 'noWrap', 'tcMar',
+             'textDirection', 'tcFitText', 'vAlign', 'hideMark', 'headers', 'cellIns', 'cellDel',
+             'cellMerge', 'tcPrChange')
+_STYLE_SEQ = ('name', 'aliases', 'basedOn', 'next', 'link', 'autoRedefine', 'hidden', 'uiPriority',
+              'semiHidden', 'unhideWhenUsed', 'qFormat', 'locked', 'personal', 'personalCompose',
+              'personalReply', 'rsid', 'pPr', 'rPr', 'tblPr', 'trPr', 'tcPr', 'tblStylePr')
+
+def _successors(seq):
+    return {tag: frozenset(_w(t) for t in seq[i + 1:]) for i, tag in enumerate(seq)}
+
+_ORDER = {'pPr': _successors(_PPR_SEQ), 'rPr': _successors(_RPR_SEQ), 'tblPr': _successors(_TBLPR_SEQ),
+          'tcPr': _successors(_TCPR_SEQ), 'style': _successors(_STYLE_SEQ)}
+
+def _child(parent, kind: str, tag: str):
+    """取得子元素，不存在时创建并插在第一个后继元素之前 (无后继则追加到末尾)"""
+    qtag = _w(tag)
+    el = parent.find(qtag)
+    if el is not None: return el
+    # SubElement 在同一文档内创建，避免独立元素并入时的命名空间整理开销
+    el = etree.SubElement(parent, qtag)
+    successors = _ORDER[kind][tag]
+    for existing in parent:
+        if existing.tag in successors:
+            existing.addprevious(el)
+            break
+    return el
+
+def _first_child(parent, tag: str):
+    """pPr / rPr / tcPr 总是第一个子元素"""
+    qtag = _w(tag)
+    el = parent.find(qtag)
+    if el is None:
+        el = etree.SubElement(parent, qtag)
+        if len(parent) > 1: parent[0].addprevious(el)
+    return el
+
+def _remove(parent, tag: str):
+    for el in parent.findall(_w(tag)):
+        parent.remove(el)
+
+def _replace(parent, kind: str, tag: str):
+    _remove(parent, tag)
+    return _child(parent, kind, tag)
+
+_VAL = _w('val')
+_FIRST_LINE = _w('firstLine')
+_HANGING = _w('hanging')
+_LINE = _w('line')
+_LINE_RULE = _w('lineRule')
+
+# ===================== 段落 / 文本块 =====================
+
+def _set_first_line(pPr, twips: int):
+    ind = _child(pPr, 'pPr', 'ind')
+    ind.attrib.pop(_FIRST_LINE, None)
+    ind.attrib.pop(_HANGING, None)
+    ind.set(_FIRST_LINE, str(twips))
+
+def _set_line_spacing(pPr, line: int):
+    spacing = _child(pPr, 'pPr', 'spacing')
+    spacing.set(_LINE, str(line))
+    spacing.set(_LINE_RULE, 'auto')
+
+def _set_jc(pPr, value: str):
+    _child(pPr, 'pPr', 'jc').set(_VAL, value)
+
+def _set_run_font(r, size, bold: bool, heading: bool):
+    """字号、加粗、取消斜体、黑色；西文 Times New Roman，中文正文宋体 / 标题黑体"""
+    rPr = _first_child(r, 'rPr')
+    _child(rPr, 'rPr', 'sz').set(_VAL, str(int(size * 2)))
+    b = _child(rPr, 'rPr', 'b')
+    if bold: b.attrib.pop(_VAL, None)
+    else: b.set(_VAL, '0')
+    _child(rPr, 'rPr', 'i').set(_VAL, '0')
+    fonts = _child(rPr, 'rPr', 'rFonts')
+    fonts.set(_w('ascii'), FONT_LATIN)
+    fonts.set(_w('hAnsi'), FONT_LATIN)
+    _replace(rPr, 'rPr', 'color').set(_VAL, '000000')
+    fonts.set(_w('eastAsia'), FONT_HEADING_CN if heading else FONT_BODY_CN)
+
+_T, _TAB, _PTAB, _BR, _CR, _NBH = _w('t'), _w('tab'), _w('ptab'), _w('br'), _w('cr'), _w('noBreakHyphen')
+
+def _run_text(r) -> str:
+    """文本块的可见文本 (与 python-docx Run.text 相同：制表符、换行、不间断连字符也计入)"""
+    parts = []
+    for el in r:
+        tag = el.tag
+        if tag == _T: parts.append(el.text or '')
+        elif tag in (_TAB, _PTAB): parts.append('\t')
+        elif tag == _CR: parts.append('\n')
+        elif tag == _BR:
+            if el.get(_w('type'), 'textWrapping') == 'textWrapping': parts.append('\n')
+        elif tag == _NBH: parts.append('-')
+    return ''.join(parts)
+
+_R, _HYPERLINK = _w('r'), _w('hyperlink')
+
+def _paragraph_text(p) -> str:
+    parts = []
+    for el in p:
+        if el.tag == _R: parts.append(_run_text(el))
+        elif el.tag == _HYPERLINK: parts.extend(_run_text(r) for r in el.iterchildren(_R))
+    return ''.join(parts)
+
+def _format_paragraph(p, heading_styles: set, default_style):
+    pPr = p.find(_w('pPr'))
+    pStyle = pPr.find(_w('pStyle')) if pPr is not None else None
+    style_id = pStyle.get(_VAL) if pStyle is not None else default_style
+    runs = p.findall(_R)
+
+    if style_id in heading_styles:
+        pPr = _first_child(p, 'pPr')
+        _set_first_line(pPr, 0)
+        _set_line_spacing(pPr, HEADING['line'])
+        spacing = _child(pPr, 'pPr', 'spacing')
+        spacing.set(_w('before'), str(HEADING['space']))
+        spacing.set(_w('after'), str(HEADING['space']))
+        for r in runs:
+            _set_run_font(r, HEADING['size'], HEADING['bold'], True)
+        return
+
+    blank = not _paragraph_text(p).strip()
+    if runs and len(runs) == 1 and blank:
+        # 只有一个空文本块 (图片段落)：居中
+        pPr = _first_child(p, 'pPr')
+        _set_jc(pPr, 'center')
+        _set_first_line(pPr, 0)
+        return
+    if blank: return
+
+    pPr = _first_child(p, 'pPr')
+    _set_line_spacing(pPr, BODY['line'])
+    if pPr.find(_w('numPr')) is not None:
+        _set_first_line(pPr, 0)  # 列表项不缩进
+    else:
+        _set_first_line(pPr, BODY['indent'])
+        _set_jc(pPr, 'both')
+    for r in runs:
+        if not _run_text(r): continue
+        _set_run_font(r, BODY['size'], False, False)
+
+def _format_table(tbl):
+    tblPr = tbl.find(_w('tblPr'))
+    for tag in ('tblStyle', 'tblBorders', 'tblLook'):
+        el = tblPr.find(_w(tag))
+        if el is not None: tblPr.remove(el)
+    borders = etree.SubElement(tblPr, _w('tblBorders'))
+    for side, val, sz in TABLE_BORDERS:
+        el = etree.SubElement(borders, _w(side))
+        el.set(_VAL, val)
+        el.set(_w('sz'), str(sz))
+        el.set(_w('space'), '0')
+        el.set(_w('color'), 'auto')
+    _child(tblPr, 'tblPr', 'tblLayout').set(_w('type'), 'autofit')
+    _replace(tblPr, 'tblPr', 'jc').set(_VAL, 'center')
+
+    for row_idx, tr in enumerate(tbl.iterchildren(_w('tr'))):
+        for tc in tr.iterchildren(_w('tc')):
+            _child(_first_child(tc, 'tcPr'), 'tcPr', 'vAlign').set(_VAL, 'center')
+            for p in tc.iterchildren(_w('p')):
+                pPr = _first_child(p, 'pPr')
+                _set_jc(pPr, 'center')
+                _set_first_line(pPr, 0)
+                _set_line_spacing(pPr, TABLE['line'])
+                for r in p.iterchildren(_R):
+                    _set_run_font(r, TABLE['size'], row_idx == 0, False)
+
+# ===================== 样式表 =====================
+
+def _heading_style_ids(styles_root) -> tuple:
+    """返回 (标题段落样式 id 集合, 默认段落样式 id)；标题即样式名为 Heading* 或内置的 heading 1-9"""
+    heading, default = set(), None
+    for style in styles_root.iterchildren(_w('style')):
+        if style.get(_w('type'), 'paragraph') != 'paragraph': continue
+        style_id = style.get(_w('styleId'))
+        if style.get(_w('default')) in ('1', 'true', 'on'): default = style_id
+        name_el = style.find(_w('name'))
+        name = name_el.get(_VAL, '') if name_el is not None else ''
+        if name.startswith('Heading') or (name.startswith('heading ') and name[8:] in '123456789' and len(name) == 9):
+            heading.add(style_id)
+    return heading, default
+
+def _format_normal_style(styles_root):
+    for style in styles_root.iterchildren(_w('style')):
+        name_el = style.find(_w('name'))
+        if name_el is not None and name_el.get(_VAL) == 'Normal':
+            break
+    else:
+        return
+    rPr = _child(style, 'style', 'rPr')
+    fonts = _child(rPr, 'rPr', 'rFonts')
+    fonts.set(_w('ascii'), FONT_LATIN)
+    fonts.set(_w('hAnsi'), FONT_LATIN)
+    _child(rPr, 'rPr', 'sz').set(_VAL, str(int(STYLE_NORMAL['size'] * 2)))
+    fonts.set(_w('eastAsia'), FONT_BODY_CN)
+    _set_line_spacing(_child(style, 'style', 'pPr'), STYLE_NORMAL['line'])
+
+# ===================== 入口 =====================
+
+def _serialize(root) -> bytes:
+    return etree.tostring(root, encoding='UTF-8', standalone=True)
+
+def format_document(document_xml: bytes, styles_xml: bytes) -> tuple:
+    """对 document.xml / styles.xml 应用排版规则，返回新的 (document_xml, styles_xml)"""
+    parser = etree.XMLParser(remove_blank_text=True, resolve_entities=False)
+    styles_root = etree.fromstring(styles_xml, parser)
+    heading_styles, default_style = _heading_style_ids(styles_root)
+    _format_normal_style(styles_root)
+
+    doc_root = etree.fromstring(document_xml, parser)
+    body = doc_root.find(_w('body'))
+    for el in body:
+        if el.tag == _w('p'):
+            _format_paragraph(el, heading_styles, default_style)
+    for el in body.iterchildren(_w('tbl')):
+        try:
+            _format_table(el)
+        except Exception as e:
+            print(f"Table formatting error: {e}")
+    return _serialize(doc_root), _serialize(styles_root)
+
+def format_docx(data: bytes) -> bytes:
+    """对整个 docx 排版：只改写 word/document.xml 与 word/styles.xml，其余部件原样复制"""
+    src = zipfile.ZipFile(io.BytesIO(data))
+    names = src.namelist()
+    document_xml, styles_xml = format_document(src.read('word/document.xml'), src.read('word/styles.xml'))
+    out = io.BytesIO()
+    with zipfile.ZipFile(out, 'w', zipfile.ZIP_DEFLATED) as dst:
+        for name in names:
+            if name == 'word/document.xml': dst.writestr(name, document_xml)
+            elif name == 'word/styles.xml': dst.writestr(name, styles_xml)
+            else: dst.writestr(src.getinfo(name), src.read(name))
+    return out.getvalue()
@@ -0,0 +1,123 @@
+# utils/docxstream.py
+import zipfile
+from lxml import etree
+
+# 直接流式解析 word/document.xml，不构建 python-docx 对象树：
+# - 段落与表格按文档顺序产出
+# - 每个顶层段落 / 表格行处理完即释放对应 XML 节点，内存占用与文档长度无关
+# - 合并单元格 (gridSpan / vMerge) 的展开方式与 python-docx 的 row.cells 一致
+
+_W = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+_P, _T, _TAB, _BR, _CR = _W + 'p', _W + 't', _W + 'tab', _W + 'br', _W + 'cr'
+_TBL, _TR, _TC = _W + 'tbl', _W + 'tr', _W + 'tc'
+_GRID_SPAN, _VMERGE, _VAL = _W + 'gridSpan', _W + 'vMerge', _W + 'val'
+_TCPR = _W + 'tcPr'
+
+def _free(elem):
+    """释放已处理完的节点及其之前的兄弟节点"""
+    elem.clear()
+    parent = elem.getparent()
+    if parent is not None:
+        while elem.getprevious() is not None:
+            del parent[0]
+
+class _Table:
+    __slots__ = ('index', 'row', 'row_cols', 'above', 'cell', 'span', 'vmerge_continue')
+
+    def __init__(self, index):
+        self.index = index
+        self.row = None          # 当前行的单元格文本 (已按 gridSpan 展开)
+        self.row_cols = 0
+        self.above = {}          # 网格列号 -> 上一行该列文本 (用于 vMerge 续接)
+        self.cell = None         # 当前单元格内的段落文本
+        self.span = 1
+        self.vmerge_continue = False
+
+def iter_docx(stream):
+    """
+    按文档顺序产出：
+      ('paragraph', 段落文本, None)
+      ('row', [单元格文本, ...], 表格序号)   表格序号从 1 开始
+    嵌套表格的文字并入外层单元格
+    """
+    with zipfile.ZipFile(stream) as zf:
+        with zf.open('word/document.xml') as xml:
+            yield from _iter_document(xml)
+
+def _iter_document(xml):
+    tables = []       # 表格栈 (处理嵌套)
+    table_count = 0
+    runs = None       # 当前段落的文本片段
+    p_depth = 0
+
+    for event, elem in etree.iterparse(xml, events=('start', 'end')):
+        tag = elem.tag
+        if event == 'start':
+            if tag == _P:
+                p_depth += 1
+                if p_depth == 1: runs = []
+            elif tag == _TBL:
+                if not tables:
+                    table_count += 1
+                tables.append(_Table(table_count))
+            elif tables and len(tables) == 1:
+                if tag == _TR:
+                    tables[0].row, tables[0].row_cols = [], 0
+                elif tag == _TC:
+                    t = tables[0]
+                    t.cell, t.span, t.vmerge_continue = [], 1, False
+            continue
+
+        # ---------- end 事件 ----------
+        if tag == _T:
+            if runs is not None and elem.text: runs.append(elem.text)
+        elif tag == _TAB:
+            # w:tab 也出现在 w:tabs (制表位定义) 中，只有段落内的才是文本
+            if runs is not None and elem.getparent().tag != _W + 'tabs': runs.append('\t')
+        elif tag == _BR or tag == _CR:
+            if runs is not None: runs.append('\n')
+        elif tag == _P:
+            p_depth -= 1
+            if p_depth: continue
+            text = "".join(runs)
+            runs = None
+            if tables:
+                cell = tables[0].cell
+                if cell is not None: cell.append(text)
+            else:
+                yield ('paragraph', text, None)
+                _free(elem)
+        elif tables and len(tables) == 1 and elem.getparent() is not None and elem.getparent().tag == _TCPR:
+            t = tables[0]
+            if tag == _GRID_SPAN:
+                t.span = int(elem.get(_VAL, 1))
+            elif tag == _VMERGE:
+                t.vmerge_continue = elem.get(_VAL, 'continue') == 'continue'
+        elif tag == _TC and len(tables) == 1:
+            t = tables[0]
+            col = t.row_cols
+            if t.vmerge_continue and col in t.above:
+                text = t.above[col]
+            else:
+                text = "\n".join(t.cell)
+            for _ in range(t.span):
+                t.row.append(text)
+            t.cell = None
+            t.row_cols += t.span
+        elif tag == _TR and len(tables) == 1:
+            t = tables[0]
+            t.above = dict(enumerate(t.row))
+            yield ('row', t.row, t.index)
+            t.row = None
+            _free(elem)
+        elif tag == _TBL:
+            tables.pop()
+            if not tables: _free(elem)
+
+def read_docx_tables(stream) -> list:
+    """读取全部表格为二维列表 [[[单元格, ...], ...], ...]"""
+    tables = {}
+    for kind, cells, index in iter_docx(stream):
+        if kind == 'row':
+            tables.setdefault(index, []).append([c.strip() for c in cells])
+    return [tables[i] for i in sorted(tables)]
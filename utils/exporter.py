@@ -0,0 +1,446 @@
+# utils/exporter.py
+import os
+import re
+import json
+import time
+import base64
+import shutil
+import secrets
+import tempfile
+import subprocess
+import threading
+import collections
+import concurrent.futures
+import config
+from utils.cache import ContentCache, content_key
+from utils.state import task_manager
+from utils.word import MarkdownToDocx, TextCleaner
+from utils.docxformat import format_docx
+from utils.plotpool import print_image, print_image_by_hash
+
+# Word 导出服务：Pandoc 转换在有限的槽位中执行 (其余任务排队，队列满时拒绝或走备用路径)，
+# 每次转换有超时；Pandoc 不可用 / 繁忙 / 失败时回退到纯 Python 的 MarkdownToDocx.convert
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REFERENCE_DOCX = os.path.join(PROJECT_ROOT, 'reference.docx')
+DOCX_MIME = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+
+_lock = threading.Lock()
+_service = None
+_pandoc = {'path': None, 'checked': 0.0}
+_temp = {'root': None, 'last_sweep': 0.0, 'swept': 0}
+
+class ExportBusy(Exception):
+    """排队已满且未启用备用路径"""
+    def __init__(self, queued):
+        self.queued = queued
+        super().__init__(f"导出服务繁忙 (当前排队 {queued} 个)，请稍后重试")
+
+class ExportTimeout(Exception):
+    """排队超过 EXPORT_JOB_TIMEOUT 仍未开始转换"""
+    def __init__(self, timeout):
+        self.timeout = timeout
+        super().__init__(f"导出超时 (>{timeout}s)，请稍后重试")
+
+def preprocess_images_for_pandoc(text, temp_dir):
+    """
+    把正文中的图片 (<img> 与 Markdown 图片；base64 内联或 /img/<hash> 引用) 写成临时文件供 Pandoc 引用
+    预览档位的统计图在此按打印档位重新渲染，WebP 等 Word 不支持的格式转为 PNG
+    """
+    img_pattern = re.compile(
+        r'(?:<div[^>]*class=["\']plot-container["\'][^>]*>\s*)?' 
+        r'<img[^>]*src=["\'](?:data:image/(?P<ext>png|jpg|jpeg|gif|webp);base64,(?P<data>[^"\']+)'
+        r'|[^"\']*?/img/(?P<ref>[0-9a-f]{64})(?:\.\w+)?)["\'][^>]*>'
+        r'(?:\s*</div>)?'
+        r'|!\[(?P<alt>[^\]]*)\]\((?:data:image/(?P<md_ext>png|jpg|jpeg|gif|webp);base64,(?P<md_data>[^)]+)'
+        r'|[^)\s]*?/img/(?P<md_ref>[0-9a-f]{64})(?:\.\w+)?)\)', 
+        re.IGNORECASE
+    )
+    def replace_func(match):
+        b64_data = match.group('data') or match.group('md_data')
+        ref = match.group('ref') or match.group('md_ref')
+        try:
+            if ref:
+                printable = print_image_by_hash(ref.lower())
+                if printable is None:
+                    print(f"Image ref expired: {ref}")
+                    return "\n\n[图片已过期，请重新生成]\n\n"
+                img_bytes, ext = printable
+            else:
+                img_bytes, ext = print_image(base64.b64decode(b64_data))
+            filename = f"img_{secrets.token_hex(8)}.{ext}"
+            file_path = os.path.join(temp_dir, filename)
+            with open(file_path, 'wb') as f: f.write(img_bytes)
+            return f'\n\n![{match.group("alt") or ""}]({file_path})\n\n'
+        except Exception as e:
+            print(f"Image extract error: {e}")
+            return match.group(0)
+    return img_pattern.sub(replace_func, text)
+
+def pandoc_path():
+    """Pandoc 可执行文件路径 (找到后缓存；未安装时每分钟最多重新查找一次)，不可用返回 None"""
+    with _lock:
+        if _pandoc['path'] or time.time() - _pandoc['checked'] < 60:
+            return _pandoc['path']
+        _pandoc['checked'] = time.time()
+    try:
+        import pypandoc
+        path = pypandoc.get_pandoc_path()
+    except (OSError, ImportError):
+        path = None
+    with _lock:
+        _pandoc['path'] = path
+    return path
+
+def export_temp_root() -> str:
+    """导出专用临时目录：每次转换在其中建 export_* 子目录，转换结束即删除"""
+    if _temp['root'] is None:
+        root = config.EXPORT_TEMP_DIR or os.path.join(tempfile.gettempdir(), 'articalcreator_export')
+        os.makedirs(root, exist_ok=True)
+        _temp['root'] = root
+    return _temp['root']
+
+def sweep_export_temp(max_age: int = None) -> int:
+    """
+    清理超过 max_age 秒的 export_* 子目录 (进程被杀或崩溃时遗留的孤儿目录)，返回清理数量
+    正常转换的目录在 with 块结束时即删除，不会被误删 (单次转换时长远小于 max_age)
+    """
+    max_age = config.EXPORT_TEMP_MAX_AGE if max_age is None else max_age
+    root, removed = export_temp_root(), 0
+    now = time.time()
+    _temp['last_sweep'] = now
+    for entry in os.scandir(root):
+        try:
+            if entry.name.startswith('export_') and now - entry.stat().st_mtime > max_age:
+                shutil.rmtree(entry.path, ignore_errors=True)
+                removed += 1
+        except OSError:
+            continue
+    if removed:
+        _temp['swept'] += removed
+        print(f"[Export] 清理遗留临时目录 {removed} 个")
+    return removed
+
+def _maybe_sweep():
+    if time.time() - _temp['last_sweep'] > config.EXPORT_TEMP_MAX_AGE / 4:
+        sweep_export_temp()
+
+def convert_with_pandoc(content: str, timeout: int = None) -> bytes:
+    """
+    Markdown -> docx：图片写入导出临时目录，Pandoc 子进程输出到 stdout (不落盘)，超时强制结束
+    临时目录在转换结束 (含失败、超时) 时删除；Pandoc 自身的临时文件也限定在该目录 (TMPDIR)
+    """
+    _maybe_sweep()
+    with tempfile.TemporaryDirectory(prefix='export_', dir=export_temp_root()) as temp_img_dir:
+        processed_content = preprocess_images_for_pandoc(content, temp_img_dir)
+        processed_content = TextCleaner.fix_table_newlines(processed_content)
+        cleaned_content = re.sub(r'(?m)^[ \t\u3000]+', '', processed_content)
+        cleaned_content = re.sub(r'(\$\$)', r'\n\1\n', cleaned_content)
+
+        args = [pandoc_path(), '--from=markdown', '--to=docx', '--output=-']
+        if os.path.exists(REFERENCE_DOCX): args.append(f'--reference-doc={REFERENCE_DOCX}')
+        env = {**os.environ, 'TMPDIR': temp_img_dir, 'TEMP': temp_img_dir, 'TMP': temp_img_dir}
+        proc = subprocess.run(args, input=cleaned_content.encode('utf-8'), capture_output=True,
+                              cwd=temp_img_dir, env=env, timeout=timeout or config.EXPORT_PANDOC_TIMEOUT)
+        if proc.returncode != 0:
+            raise RuntimeError(f"Pandoc 转换失败: {proc.stderr.decode('utf-8', 'replace')[:300]}")
+    return format_docx(proc.stdout)
+
+def convert_with_python(content: str) -> bytes:
+    """备用路径：python-docx 直接生成 (不依赖 Pandoc，公式等复杂语法支持较弱)"""
+    return MarkdownToDocx.convert(content).getvalue()
+
+class ExportTicket:
+    """
+    一次导出请求：future 结果为 docx 字节；engine 为实际使用的路径 (pandoc / python)
+    listener (可选) 为进度回调 listener(state, position)：排队位置变化时为 ('queued', 位置)，开始转换时为 ('converting', 0)
+    """
+    def __init__(self, service, ticket_id, engine, position, listener=None):
+        self._service = service
+        self.id = ticket_id
+        self.engine = engine
+        self.initial_position = position
+        self.submitted = time.time()
+        self.deadline = self.submitted + service.job_timeout
+        self.listener = listener
+        self.last_position = None
+        self.future = None
+
+    def position(self) -> int:
+        """当前排队位置 (1 开始)，已开始转换返回 0"""
+        return self._service.queue_position(self.id)
+
+    def result(self) -> bytes:
+        """等待并返回 docx 字节；排队超时抛出 ExportTimeout，转换失败抛出原异常"""
+        try:
+            return self.future.result()
+        except concurrent.futures.CancelledError:
+            raise ExportTimeout(self._service.job_timeout)
+
+class ExportService:
+    """
+    有界的 Pandoc 转换服务：
+    - workers 个转换槽位 (同时运行的 Pandoc 进程数)，其余任务按提交顺序排队
+    - 排队数达到 queue_max 时：启用备用路径则改用 python-docx 生成，否则抛出 ExportBusy
+    - 排队超过 job_timeout 秒仍未开始的任务被取消 (ticket.result() 抛出 ExportTimeout)；
+      每当队列变化 (任务开始 / 结束) 时检查，转换本身受 timeout 限制，因此检查间隔不超过一次转换的时长
+    - 队列变化时由服务调用各 ticket 的进度回调 (在服务锁内调用，回调须快速返回)，不需要逐个任务轮询
+    - 记录各路径的次数、排队等待与转换耗时 (最近 200 次的 p50 / p95)
+    """
+    def __init__(self, workers, queue_max, timeout, fallback_on_busy=True, job_timeout=300):
+        self.workers = workers
+        self.queue_max = queue_max
+        self.timeout = timeout
+        self.job_timeout = job_timeout
+        self.fallback_on_busy = fallback_on_busy
+        self._lock = threading.Lock()
+        self._queue = collections.OrderedDict()  # 排队中的 ticket id -> ticket
+        self._running = 0
+        self._seq = 0
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix='export-pandoc')
+        self._fallback_executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix='export-python')
+        self._latency = collections.deque(maxlen=200)
+        self._wait = collections.deque(maxlen=200)
+        self._stats = {'submitted': 0, 'pandoc': 0, 'python': 0, 'failed': 0, 'rejected': 0, 'expired': 0,
+                       'fallback_unavailable': 0, 'fallback_busy': 0, 'fallback_error': 0, 'timeouts': 0}
+
+    def submit(self, content: str, listener=None) -> ExportTicket:
+        """提交导出任务，立即返回 ticket (ticket.result() 取得 docx 字节)"""
+        has_pandoc = pandoc_path() is not None
+        with self._lock:
+            self._stats['submitted'] += 1
+            self._seq += 1
+            engine, position = 'pandoc', 0
+            if not has_pandoc:
+                engine = 'python'
+                self._stats['fallback_unavailable'] += 1
+            elif self._running + len(self._queue) >= self.workers:
+                if len(self._queue) >= self.queue_max:
+                    if not self.fallback_on_busy:
+                        self._stats['rejected'] += 1
+                        raise ExportBusy(len(self._queue))
+                    engine = 'python'
+                    self._stats['fallback_busy'] += 1
+                else:
+                    position = len(self._queue) + 1
+            ticket = ExportTicket(self, self._seq, engine, position, listener)
+            if engine == 'pandoc':
+                self._queue[ticket.id] = ticket
+                if position: self._notify(ticket, 'queued', position)
+        executor = self._executor if engine == 'pandoc' else self._fallback_executor
+        ticket.future = executor.submit(self._run, ticket, content)
+        return ticket
+
+    def queue_position(self, ticket_id) -> int:
+        with self._lock:
+            for i, queued_id in enumerate(self._queue):
+                if queued_id == ticket_id: return i + 1
+        return 0
+
+    @staticmethod
+    def _notify(ticket, state, position):
+        if ticket.listener is None or ticket.last_position == position: return
+        ticket.last_position = position
+        try:
+            ticket.listener(state, position)
+        except Exception as e:
+            print(f"[Export] 进度回调失败: {e}")
+
+    def _on_queue_change(self) -> list:
+        """(持有锁时调用) 取出排队超时的任务并推送其余任务的新位置，返回需要取消的 ticket"""
+        now, expired = time.time(), []
+        while self._queue:
+            ticket = next(iter(self._queue.values()))
+            if ticket.deadline > now: break
+            expired.append(self._queue.pop(ticket.id))
+        self._stats['expired'] += len(expired)
+        for i, ticket in enumerate(self._queue.values()):
+            self._notify(ticket, 'queued', i + 1)
+        return expired
+
+    @staticmethod
+    def _cancel(expired):
+        # 取消仍在线程池队列中的任务 (会同步触发其 done 回调)；已被线程取走的由 _run 开头的检查处理
+        for ticket in expired:
+            ticket.future.cancel()
+
+    def _run(self, ticket, content):
+        start = time.time()
+        with self._lock:
+            self._queue.pop(ticket.id, None)
+            expired = self._on_queue_change()
+            if start > ticket.deadline:
+                self._stats['expired'] += 1
+            else:
+                self._wait.append(start - ticket.submitted)
+                self._notify(ticket, 'converting', 0)
+        self._cancel(expired)
+        if start > ticket.deadline:
+            raise ExportTimeout(self.job_timeout)
+        try:
+            data = self._convert(ticket, content)
+        except Exception:
+            with self._lock: self._stats['failed'] += 1
+            raise
+        finally:
+            with self._lock: expired = self._on_queue_change()
+            self._cancel(expired)
+        with self._lock:
+            self._stats[ticket.engine] += 1
+            self._latency.append(time.time() - start)
+        return data
+
+    def _convert(self, ticket, content):
+        if ticket.engine == 'pandoc':
+            with self._lock: self._running += 1
+            try:
+                return convert_with_pandoc(content, self.timeout)
+            except Exception as e:
+                with self._lock:
+                    self._stats['fallback_error'] += 1
+                    if isinstance(e, subprocess.TimeoutExpired): self._stats['timeouts'] += 1
+                print(f"[Export] Pandoc 转换失败，改用 python-docx: {e}")
+                ticket.engine = 'python'
+            finally:
+                with self._lock: self._running -= 1
+        return convert_with_python(content)
+
+    @staticmethod
+    def _percentile(values, q):
+        if not values: return 0.0
+        ordered = sorted(values)
+        return round(ordered[min(len(ordered) - 1, int(len(ordered) * q))], 3)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                **self._stats,
+                'workers': self.workers, 'running': self._running, 'queued': len(self._queue),
+                'pandoc_available': _pandoc['path'] is not None, 'temp_swept': _temp['swept'],
+                'latency_p50': self._percentile(self._latency, 0.5), 'latency_p95': self._percentile(self._latency, 0.95),
+                'wait_p50': self._percentile(self._wait, 0.5), 'wait_p95': self._percentile(self._wait, 0.95),
+            }
+
+def get_export_service() -> ExportService:
+    global _service
+    with _lock:
+        if _service is None:
+            _service = ExportService(
+                config.EXPORT_PANDOC_WORKERS, config.EXPORT_QUEUE_MAX,
+                config.EXPORT_PANDOC_TIMEOUT, config.EXPORT_FALLBACK_ON_BUSY, config.EXPORT_JOB_TIMEOUT
+            )
+        return _service
+
+# ===================== 异步导出任务 =====================
+# 提交后立即返回 job_id，进度 (排队位置 / 转换中 / 完成) 写入任务事件流 (/stream_progress?task_id=<job_id>)，
+# 完成后凭 job_id 下载；结果按 内容哈希 + 排版选项 缓存，未修改的论文再次导出直接命中
+
+# 排版规则或导出流程变更时递增，使旧导出缓存失效
+EXPORT_VERSION = "1"
+
+export_cache = ContentCache(
+    'exports',
+    max_items=64,
+    max_memory_bytes=64 * 1024 * 1024,
+    max_disk_bytes=config.EXPORT_CACHE_DISK_MB * 1024 * 1024,
+    ttl_seconds=config.EXPORT_CACHE_TTL_HOURS * 3600
+)
+
+_jobs = collections.OrderedDict()  # job_id -> {'user', 'key', 'result_key', 'preferred', 'engine', 'state', 'cached', 'error', 'created'}
+_MAX_JOBS = 256
+
+def export_key(content: str) -> tuple:
+    """返回 (缓存键, 首选路径)；排版选项 = 导出版本 + 首选路径 + 参考模板 (reference.docx 的修改时间与大小)"""
+    engine = 'pandoc' if pandoc_path() else 'python'
+    try:
+        st = os.stat(REFERENCE_DOCX)
+        reference = f"{st.st_mtime_ns}:{st.st_size}"
+    except OSError:
+        reference = ''
+    return content_key(content.encode('utf-8'), EXPORT_VERSION, engine, reference), engine
+
+def store_export(key: str, preferred: str, ticket: ExportTicket, data: bytes) -> str:
+    """
+    写入导出缓存，返回结果所在的键：首选路径的结果存在 key 下 (再次导出直接命中)；
+    繁忙 / 失败时的备用输出存在带引擎名的键下，只供本次下载 (下次导出仍走 Pandoc)
+    """
+    if ticket.engine != preferred:
+        key = content_key(key.encode('utf-8'), ticket.engine)
+    export_cache.set(key, data)
+    return key
+
+def _emit(user_id, job_id, payload: dict):
+    task_manager.append_event(user_id, job_id, f"data: {json.dumps(payload, ensure_ascii=False)}\n\n")
+
+def _finish(job_id, job, state, payload):
+    job['state'] = state
+    _emit(job['user'], job_id, payload)
+    task_manager.set_status(job['user'], job_id, 'completed' if state == 'done' else 'stopped')
+
+def _register_job(user_id, job_id, job):
+    evicted = []
+    with _lock:
+        _jobs[job_id] = job
+        while len(_jobs) > _MAX_JOBS: evicted.append(_jobs.popitem(last=False))
+    # 被挤出的任务无法再下载，其事件流也一并删除 (否则 TaskManager 中的导出任务只增不减)
+    for old_id, old_job in evicted:
+        task_manager.remove_task(old_job['user'], old_id)
+    task_manager.start_task(user_id, job_id)
+
+def submit_export_job(user_id, content: str) -> tuple:
+    """
+    提交异步导出，返回 (job_id, job)；命中缓存时任务直接完成
+    排队已满且未启用备用路径时抛出 ExportBusy (此时不创建任务)
+    进度由导出服务在队列变化时回调推送，完成由 future 的 done 回调处理 (不为每个任务单独开线程)
+    """
+    key, preferred = export_key(content)
+    job_id = f"export-{secrets.token_hex(8)}"
+    job = {'user': user_id, 'key': key, 'result_key': key, 'preferred': preferred, 'engine': preferred, 'state': 'queued',
+           'cached': False, 'error': None, 'created': time.time()}
+    _register_job(user_id, job_id, job)
+
+    if export_cache.get(key) is not None:
+        job['cached'] = True
+        _finish(job_id, job, 'done', {'type': 'export_done', 'job_id': job_id, 'engine': preferred, 'cached': True})
+        return job_id, job
+
+    def on_progress(state, position):
+        job['state'] = state
+        msg = f"排队中，第 {position} 位" if position else "正在转换..."
+        _emit(user_id, job_id, {'type': 'export_progress', 'state': state, 'position': position, 'msg': msg})
+
+    try:
+        ticket = get_export_service().submit(content, listener=on_progress)
+    except ExportBusy:
+        with _lock: _jobs.pop(job_id, None)
+        task_manager.remove_task(user_id, job_id)
+        raise
+    ticket.future.add_done_callback(lambda _: _complete_job(job_id, job, ticket))
+    return job_id, job
+
+def _complete_job(job_id, job, ticket):
+    """转换结束 (成功 / 失败 / 排队超时) 时在线程池线程中调用：写入缓存并通知下载"""
+    try:
+        data = ticket.result()
+    except ExportTimeout as e:
+        job['error'] = str(e)
+        _finish(job_id, job, 'failed', {'type': 'export_error', 'job_id': job_id, 'msg': job['error']})
+        return
+    except Exception as e:
+        print(f"Export Error: {e}")
+        job['error'] = f"导出处理失败: {e}"
+        _finish(job_id, job, 'failed', {'type': 'export_error', 'job_id': job_id, 'msg': job['error']})
+        return
+
+    job['engine'] = ticket.engine
+    job['result_key'] = store_export(job['key'], job['preferred'], ticket, data)
+    _finish(job_id, job, 'done', {'type': 'export_done', 'job_id': job_id, 'engine': ticket.engine, 'cached': False})
+
+def get_export_job(user_id, job_id):
+    """返回任务信息 (不存在或不属于该用户返回 None)"""
+    with _lock:
+        job = _jobs.get(job_id)
+    return job if job is not None and job['user'] == user_id else None
+
+def get_export_result(job) -> bytes:
+    """已完成任务的 docx 字节；缓存已被淘汰 / 过期时返回 None"""
+    return export_cache.get(job['result_key'])
@@ -0,0 +1,296 @@
+# utils/extraction.py
+import os
+import time
+import threading
+import concurrent.futures
+import config
+from utils import procpool
+from utils.procpool import WorkerPool, WorkerTimeout, WorkerCrashed
+from utils.uploads import mapped_stream
+from utils.docxstream import iter_docx
+
+# 扩展名 -> 解析插件。插件签名: plugin(stream, filename, budget) -> Generator[Block]
+_EXTRACTORS = {}
+
+# 文档解析进程池 (懒加载，全局共享)：PDF 分页任务与整文件解析任务共用
+_pool_lock = threading.Lock()
+_parse_pool = None
+_pdf_fanout = None
+
+def register_extractor(*exts):
+    """注册格式插件，例如 @register_extractor('.txt', '.md')"""
+    def decorator(func):
+        for ext in exts:
+            _EXTRACTORS[ext] = func
+        return func
+    return decorator
+
+def supported_extensions() -> tuple:
+    return tuple(_EXTRACTORS)
+
+def is_supported(filename: str) -> bool:
+    return os.path.splitext(filename.lower())[1] in _EXTRACTORS
+
+class Block:
+    """一段提取出的文本及其来源信息 (kind: text / page / table，page 页码，sheet 工作表名等)"""
+    __slots__ = ('text', 'meta')
+
+    def __init__(self, text: str, **meta):
+        self.text = text
+        self.meta = meta
+
+class ExtractionBudget:
+    """
+    字符 / 页数 / 耗时共享预算，所有插件在产出每个块前检查
+    耗尽后 exhausted 为 True，reason 记录原因
+    """
+    def __init__(self, max_chars=None, max_pages=None, max_seconds=None):
+        self.max_chars = max_chars if max_chars is not None else config.EXTRACT_MAX_CHARS
+        self.max_pages = max_pages if max_pages is not None else config.EXTRACT_MAX_PAGES
+        self.max_seconds = max_seconds if max_seconds is not None else config.EXTRACT_MAX_SECONDS
+        self.chars = 0
+        self.pages = 0
+        self.started = time.time()
+        self.reason = ""
+        # 因超时/进程崩溃而缺失部分内容 (区别于主动截断)，这类结果不应写入缓存
+        self.incomplete = False
+
+    @property
+    def exhausted(self) -> bool:
+        if self.reason: return True
+        if self.max_seconds and time.time() - self.started > self.max_seconds:
+            self.reason = f"超过 {self.max_seconds}s 解析时限"
+        return bool(self.reason)
+
+    def remaining_seconds(self):
+        return max(self.max_seconds - (time.time() - self.started), 0) if self.max_seconds else None
+
+    def remaining_chars(self) -> int:
+        return max(self.max_chars - self.chars, 0) if self.max_chars else -1
+
+    def take_page(self) -> bool:
+        """开始处理新的一页，页数超限返回 False"""
+        if self.exhausted: return False
+        if self.max_pages and self.pages >= self.max_pages:
+            self.reason = f"仅提取前 {self.max_pages} 页"
+            return False
+        self.pages += 1
+        return True
+
+    def consume(self, text: str) -> str:
+        """记入字符数，超出部分截掉并标记耗尽"""
+        if self.max_chars and self.chars + len(text) > self.max_chars:
+            text = text[:self.remaining_chars()]
+            self.reason = f"仅保留前 {self.max_chars} 字"
+        self.chars += len(text)
+        return text
+
+def iter_blocks(stream, filename, budget=None):
+    """按格式分发到插件，逐块产出并统一执行预算"""
+    budget = budget or ExtractionBudget()
+    plugin = _EXTRACTORS.get(os.path.splitext(filename.lower())[1])
+    if plugin is None: return
+    if hasattr(stream, 'seek'): stream.seek(0)
+    for block in plugin(stream, filename, budget):
+        if budget.exhausted: break
+        text = budget.consume(block.text)
+        if text:
+            block.text = text
+            yield block
+
+def extract_text(stream, filename, budget=None) -> tuple:
+    """
+    提取为单个字符串，返回 (text, info)
+    info = {'blocks', 'chars', 'pages', 'sheets', 'truncated', 'incomplete', 'reason'}
+    """
+    budget = budget or ExtractionBudget()
+    parts = []
+    sheets = []
+    for block in iter_blocks(stream, filename, budget):
+        parts.append(block.text)
+        sheet = block.meta.get('sheet')
+        if sheet and sheet not in sheets: sheets.append(sheet)
+    if budget.reason:
+        label = "内容不完整" if budget.incomplete else "内容过长，已截断"
+        parts.append(f"[{label}：{budget.reason}]")
+    text = "\n".join(parts)
+    info = {'blocks': len(parts) - bool(budget.reason), 'chars': budget.chars, 'pages': budget.pages,
+            'sheets': sheets, 'truncated': bool(budget.reason), 'incomplete': budget.incomplete,
+            'reason': budget.reason}
+    return text, info
+
+def _warm_parser_modules():
+    """工作进程启动时预加载解析库，避免首个任务承担导入耗时"""
+    import pypdf  # noqa: F401
+    from utils import tabular  # noqa: F401 (含 pandas / numpy)
+
+def get_parse_pool() -> WorkerPool:
+    """
+    文档解析进程池：预启动、可强制结束 (超时 kill 后自动补充进程)，并限制每个进程的内存余量
+    解析器卡死或内存暴涨只会影响单个工作进程，不会拖住请求/生成线程
+    """
+    global _parse_pool
+    with _pool_lock:
+        if _parse_pool is None:
+            _parse_pool = WorkerPool(
+                'parse', config.FILE_PARSE_PROCESSES,
+                initializer=_warm_parser_modules,
+                memory_limit_mb=config.FILE_PARSE_MEMORY_MB
+            )
+        return _parse_pool
+
+def _get_pdf_fanout():
+    global _pdf_fanout
+    with _pool_lock:
+        if _pdf_fanout is None:
+            # 仅负责把分页任务派发给进程池并等待结果，线程数与进程数一致即可
+            _pdf_fanout = concurrent.futures.ThreadPoolExecutor(
+                max_workers=config.FILE_PARSE_PROCESSES, thread_name_prefix='pdf-fanout'
+            )
+        return _pdf_fanout
+
+def _open_pdf(source):
+    import io
+    import pypdf
+    if isinstance(source, str):
+        return pypdf.PdfReader(source)
+    return pypdf.PdfReader(io.BytesIO(source))
+
+def _pdf_page_count(source) -> int:
+    """进程池入口：source 为临时文件路径或 PDF 字节"""
+    return len(_open_pdf(source).pages)
+
+def _pdf_extract_range(source, start: int, end: int) -> list:
+    """进程池入口：提取 [start, end) 页，返回 [(页码, 文本), ...]"""
+    reader = _open_pdf(source)
+    return [(i + 1, reader.pages[i].extract_text() or "") for i in range(start, end)]
+
+def _format_page_ranges(pages: list) -> str:
+    """[1,2,3,7,8] -> '1–3、7–8'"""
+    ranges = []
+    for p in sorted(pages):
+        if ranges and p == ranges[-1][1] + 1:
+            ranges[-1][1] = p
+        else:
+            ranges.append([p, p])
+    return "、".join(f"{a}–{b}" if a != b else str(a) for a, b in ranges)
+
+def extract_pdf_pages(source, max_pages=None, timeout=None) -> dict:
+    """
+    在进程池中按页分段并行解析 PDF，整份文档共用一个截止时间
+    返回 {'pages': [(页码, 文本), ...], 'total', 'failed': [缺失页码], 'error'}
+    超时或进程崩溃的分段只影响对应页，其余页照常返回
+    """
+    pool = get_parse_pool()
+    deadline = time.time() + (timeout or config.FILE_PARSE_TIMEOUT)
+    result = {'pages': [], 'total': 0, 'failed': [], 'error': ""}
+    try:
+        total = pool.run(_pdf_page_count, source, deadline=deadline)
+    except (WorkerTimeout, WorkerCrashed) as e:
+        result['error'] = str(e)
+        return result
+    result['total'] = total
+
+    wanted = min(total, max_pages) if max_pages else total
+    step = max(1, config.PDF_PAGES_PER_JOB)
+    ranges = [(s, min(s + step, wanted)) for s in range(0, wanted, step)]
+    fanout = _get_pdf_fanout()
+    futures = {fanout.submit(pool.run, _pdf_extract_range, source, s, e, deadline=deadline): (s, e) for s, e in ranges}
+    for future, (s, e) in futures.items():
+        try:
+            result['pages'].extend(future.result())
+        except (WorkerTimeout, WorkerCrashed) as err:
+            result['failed'].extend(range(s + 1, e + 1))
+            result['error'] = str(err)
+    result['pages'].sort()
+    return result
+
+# ===================== 格式插件 =====================
+
+@register_extractor('.txt', '.md')
+def _extract_plain_text(stream, filename, budget):
+    # 最多读取预算字符数对应的字节 (UTF-8 中文最多 3~4 字节/字)
+    limit = budget.remaining_chars() * 4 if budget.max_chars else -1
+    data = stream.read(limit)
+    try:
+        text = data.decode('utf-8')
+    except UnicodeDecodeError:
+        # 可能只是截断在多字节字符中间，先去掉末尾残缺字节再试
+        try:
+            text = data[:-3].decode('utf-8') + data[-3:].decode('utf-8', errors='ignore')
+        except UnicodeDecodeError:
+            text = data.decode('gbk', errors='ignore')
+    # 按行聚合成约 2000 字的块，保留原有换行
+    lines = []
+    size = 0
+    for line in text.split('\n'):
+        lines.append(line)
+        size += len(line) + 1
+        if size >= 2000:
+            yield Block("\n".join(lines), kind='text')
+            lines, size = [], 0
+    if lines:
+        yield Block("\n".join(lines), kind='text')
+
+@register_extractor('.pdf')
+def _extract_pdf(stream, filename, budget):
+    # 已在工作进程内 (整文件任务) 时直接解析，避免嵌套派发
+    if procpool.IN_WORKER:
+        yield from _extract_pdf_local(stream, budget)
+        return
+
+    path = getattr(stream, 'name', None)
+    source = path if isinstance(path, str) and os.path.isfile(path) else stream.read()
+    result = extract_pdf_pages(source, budget.max_pages, budget.remaining_seconds())
+    if result['total'] == 0 and result['error']:
+        raise RuntimeError(f"PDF 解析失败: {result['error']}")
+
+    for page_no, page_text in result['pages']:
+        if not budget.take_page(): break
+        if page_text:
+            yield Block(f"[Page {page_no}] {page_text}", kind='page', page=page_no)
+
+    if result['failed']:
+        budget.incomplete = True
+        ok = [p for p, _ in result['pages']]
+        done = f"第 {_format_page_ranges(ok)} 页已提取，" if ok else ""
+        budget.reason = budget.reason or f"{done}第 {_format_page_ranges(result['failed'])} 页解析超时或失败"
+    elif not budget.reason and budget.max_pages and result['total'] > budget.max_pages:
+        budget.reason = f"仅提取前 {budget.max_pages} 页"
+
+def _extract_pdf_local(stream, budget):
+    import pypdf
+    with mapped_stream(stream) as pdf_stream:
+        reader = pypdf.PdfReader(pdf_stream)
+        for i, page in enumerate(reader.pages):
+            if not budget.take_page(): break
+            page_text = page.extract_text()
+            if page_text:
+                yield Block(f"[Page {i+1}] {page_text}", kind='page', page=i + 1)
+
+@register_extractor('.docx')
+def _extract_docx(stream, filename, budget):
+    # 流式解析 document.xml，段落与表格按文档顺序输出
+    current_table = 0
+    for kind, content, table_idx in iter_docx(stream):
+        if budget.exhausted: break
+        if kind == 'paragraph':
+            if content.strip():
+                yield Block(content, kind='text')
+            continue
+        if table_idx != current_table:
+            current_table = table_idx
+            yield Block(f"[表格 {table_idx}]", kind='table', table=table_idx)
+        yield Block(" | ".join(cell.strip() for cell in content), kind='table', table=table_idx)
+
+@register_extractor('.csv')
+def _extract_csv(stream, filename, budget):
+    from utils.tabular import summarize_csv
+    yield Block(summarize_csv(stream), kind='table')
+
+@register_extractor('.xls', '.xlsx')
+def _extract_excel(stream, filename, budget):
+    from utils.tabular import iter_excel_summaries
+    for sheet, text in iter_excel_summaries(stream, filename.lower()):
+        if budget.exhausted: break
+        yield Block(f"[工作表: {sheet}]\n{text}", kind='table', sheet=sheet)
@@ -1,117 +1,334 @@
-import pandas as pd
-import pypdf
-import docx
-import base64
 import io
+import time
+import threading
+import os
+import concurrent.futures
+import config
+from utils.cache import extraction_cache, content_key
+from utils.extraction import extract_text, is_supported, get_parse_pool, ExtractionBudget
+from utils.procpool import WorkerTimeout, WorkerCrashed
+from utils.summarize import summarize_document
+from utils.images import preprocess_image, preprocess_options, describe_image, describe_images_batch, plan_batches
+
+IMAGE_EXTS = ('.png', '.jpg', '.jpeg', '.bmp', '.webp')
+# 解析逻辑变更时递增，使旧缓存自动失效
+EXTRACTOR_VERSION = "5"
+
+# 全局共享的线程池 (懒加载)：所有任务共用；文档解析进程池见 utils.extraction.get_parse_pool
+_pool_lock = threading.Lock()
+_doc_pool = None
+_vision_pool = None
+
+def extraction_cache_key(file_stream, filename, *options) -> str:
+    """缓存键 = SHA-256(文件字节) + 解析器版本 + 扩展名 + 其他选项"""
+    ext = os.path.splitext(filename.lower())[1]
+    return content_key(file_stream, EXTRACTOR_VERSION, ext, *options)
+
+def _wrap_datasource(filename, raw_text) -> str:
+    # 返回 XML 包裹的结构化数据
+    return f"""
+<datasource name="{filename}">
+{raw_text}
+</datasource>
+"""
 
 def extract_file_content(file_stream, filename, llm_client=None) -> str:
     """
     根据文件后缀名，提取文件内容为纯文本字符串。
     [新增] 支持图片解析 (需要传入 llm_client)
+    [新增] 解析结果按文件内容哈希缓存，重复上传直接命中
     """
     filename = filename.lower()
+    is_image = filename.endswith(IMAGE_EXTS)
+    if is_image and not llm_client:
+        return "【系统提示】解析图片需要 LLM 客户端支持，当前未提供。"
+
+    if not is_image:
+        try:
+            raw_text, _ = load_document_text(file_stream, filename, llm_client)
+        except (WorkerTimeout, WorkerCrashed) as e:
+            print(f"解析文件 {filename} 失败: {e}")
+            return ""
+        return _wrap_datasource(filename, raw_text) if raw_text is not None else ""
+
+    key = _image_cache_key(file_stream, filename)
+    raw_text = extraction_cache.get_text(key)
+    if raw_text is None:
+        raw_text, cacheable = _extract_raw_text(file_stream, filename, llm_client)
+        if raw_text is None: return ""
+        if cacheable: extraction_cache.set_text(key, raw_text)
+    return _wrap_datasource(filename, raw_text)
+
+def _source_budget(full):
+    """full=True 时放宽预算读取全文 (供分段摘要使用)，否则使用默认提取预算"""
+    if not full: return None
+    return ExtractionBudget(max_chars=config.SUMMARY_SOURCE_MAX_CHARS, max_pages=config.SUMMARY_SOURCE_MAX_PAGES)
+
+def load_document_text(file_stream, filename, llm_client=None, path=None, timeout=None) -> tuple:
+    """
+    文档类文件的完整处理流程：缓存 -> 解析 (进程池) -> 超长时分段摘要
+    - 未提供 llm_client：按默认预算截断
+    - 提供 llm_client：读取全文，超过 EXTRACT_MAX_CHARS 时做 map-reduce 摘要，而不是直接截断
+    返回 (raw_text, summary_stats)；raw_text 为 None 表示不支持或解析失败
+    """
+    full = llm_client is not None
+    key = extraction_cache_key(file_stream, filename, "full" if full else "")
+    raw_text = extraction_cache.get_text(key)
+    if raw_text is None:
+        if path:
+            func, arg = _extract_document_path, path
+        else:
+            func, arg = _extract_document_bytes, _read_all(file_stream)
+        if filename.lower().endswith('.pdf'):
+            # PDF 自带整份文档截止时间与分页容错，在当前线程调度即可
+            raw_text, cacheable = func(arg, filename, full)
+        else:
+            raw_text, cacheable = get_parse_pool().run(func, arg, filename, full, timeout=timeout or config.FILE_PARSE_TIMEOUT)
+        if raw_text is None: return None, None
+        if cacheable: extraction_cache.set_text(key, raw_text)
+
+    if not full or len(raw_text) <= config.EXTRACT_MAX_CHARS:
+        return raw_text, None
+    digest, stats = summarize_document(llm_client, raw_text, filename)
+    stats['source_chars'] = len(raw_text)
+    header = f"[超长文档分段摘要：原文约 {len(raw_text)} 字，分 {stats['chunks']} 段摘要后合并]"
+    return f"{header}\n{digest}", stats
+
+def _extract_raw_text(file_stream, filename, llm_client=None, full=False) -> tuple:
+    """
+    实际解析逻辑 (不走缓存)
+    返回 (raw_text, cacheable)；raw_text 为 None 表示不支持或解析失败
+    """
     raw_text = "" 
+    cacheable = True
     
     try:
         # 重置指针
         if hasattr(file_stream, 'seek'):
             file_stream.seek(0)
 
-        if filename.endswith(('.png', '.jpg', '.jpeg', '.bmp', '.webp')):
-            if not llm_client:
-                return "【系统提示】解析图片需要 LLM 客户端支持，当前未提供。"
-            
+        if filename.endswith(IMAGE_EXTS):
             try:
-                # 1. 读取图片并转 Base64
-                img_bytes = file_stream.read()
-                b64_str = base64.b64encode(img_bytes).decode('utf-8')
-                mime_type = "image/png" if filename.endswith('.png') else "image/jpeg"
+                # 1. 预处理：缩放 + 重编码，显著减小上传体积
+                prepared = preprocess_image(file_stream.read(), filename)
                 
                 # 2. 调用 Vision 模型进行“读图”
                 # Prompt 设计：要求模型详细描述图片中的数据、趋势和文字
-                response = llm_client.chat.completions.create(
-                    model="gemini-2.5-pro", # 确保使用支持 Vision 的模型
-                    messages=[
-                        {
-                            "role": "system", 
-                            "content": "你是一个数据分析师。请仔细观察这张图片，提取其中所有的关键信息、数据趋势、文字内容，并整理成结构化的文本描述，以便后续用于论文写作。"
-                        },
-                        {
-                            "role": "user",
-                            "content": [
-                                {"type": "text", "text": f"请详细描述这张名为 '{filename}' 的图片内容："},
-                                {
-                                    "type": "image_url",
-                                    "image_url": {
-                                        "url": f"data:{mime_type};base64,{b64_str}"
-                                    }
-                                }
-                            ]
-                        }
-                    ],
-                    max_tokens=2000
-                )
-                raw_text = f"[图片视觉解析结果]:\n{response.choices[0].message.content}"
+                raw_text = f"[图片视觉解析结果]:\n{describe_image(llm_client, filename, prepared)}"
             
             except Exception as e:
                 print(f"图片解析失败: {e}")
                 raw_text = f"图片解析失败: {str(e)}"
+                cacheable = False
 
         # ==========================================
-        # 2. 常规文本文件处理 (保持不变)
+        # 2. 文档/表格：统一交给提取引擎 (按格式插件分发，受字符/页数/时间预算约束)
         # ==========================================
-        # 1. Excel/CSV
-        elif filename.endswith('.csv'):
-            try:
-                df = pd.read_csv(file_stream)
-            except UnicodeDecodeError:
-                file_stream.seek(0)
-                df = pd.read_csv(file_stream, encoding='gbk')
-            raw_text = df.head(60).to_markdown(index=False)
-        
-        elif filename.endswith(('.xls', '.xlsx')):
-            df = pd.read_excel(file_stream)
-            raw_text = df.head(60).to_markdown(index=False)
-            
-        # 2. TXT
-        elif filename.endswith('.txt'):
-            try:
-                raw_text = file_stream.read().decode('utf-8')
-            except:
-                file_stream.seek(0)
-                raw_text = file_stream.read().decode('gbk', errors='ignore')
-            raw_text = raw_text[:8000] 
-            
-        # 3. PDF
-        elif filename.endswith('.pdf'):
-            reader = pypdf.PdfReader(file_stream)
-            for i, page in enumerate(reader.pages[:15]): 
-                page_text = page.extract_text()
-                if page_text: 
-                    raw_text += f"[Page {i+1}] {page_text}\n"
-
-        # 4. DOCX
-        elif filename.endswith('.docx'):
-            doc = docx.Document(file_stream)
-            for para in doc.paragraphs:
-                if para.text.strip():
-                    raw_text += para.text + "\n"
-            for table in doc.tables:
-                for row in table.rows:
-                    row_text = [cell.text.strip() for cell in row.cells]
-                    raw_text += " | ".join(row_text) + "\n"
-            raw_text = raw_text[:8000]
+        elif is_supported(filename):
+            raw_text, info = extract_text(file_stream, filename, _source_budget(full))
+            # 超时/崩溃导致的残缺结果不缓存，下次上传重新解析
+            cacheable = not info['incomplete']
 
         else:
-            return "" 
+            return None, False
             
     except Exception as e:
         print(f"解析文件 {filename} 失败: {e}")
-        return "" 
+        return None, False
 
-    # 返回 XML 包裹的结构化数据
-    return f"""
-<datasource name="{filename}">
-{raw_text}
-</datasource>
-"""
\ No newline at end of file
+    return raw_text, cacheable
+
+
+def _get_doc_pool():
+    """文档调度线程：只负责串联 解析 (进程池) -> 摘要 (LLM 线程池)，本身不做重计算"""
+    global _doc_pool
+    with _pool_lock:
+        if _doc_pool is None:
+            _doc_pool = concurrent.futures.ThreadPoolExecutor(
+                max_workers=config.FILE_PARSE_PROCESSES * 2,
+                thread_name_prefix='doc'
+            )
+        return _doc_pool
+
+def _get_vision_pool():
+    """图片识别是网络 IO，使用有界线程池，限制同时发往 Vision 模型的请求数"""
+    global _vision_pool
+    with _pool_lock:
+        if _vision_pool is None:
+            _vision_pool = concurrent.futures.ThreadPoolExecutor(
+                max_workers=config.VISION_MAX_WORKERS,
+                thread_name_prefix='vision'
+            )
+        return _vision_pool
+
+def _extract_document_bytes(data: bytes, filename: str, full: bool = False) -> tuple:
+    """进程池入口：只传 bytes 与文件名，保证可 pickle；缓存由父进程统一读写 (PDF 则在调度线程中执行)"""
+    return _extract_raw_text(io.BytesIO(data), filename.lower(), full=full)
+
+def _extract_document_path(path: str, filename: str, full: bool = False) -> tuple:
+    """进程池入口：已转存到磁盘的大文件只传路径，由子进程直接读取，避免跨进程复制内容"""
+    with open(path, 'rb') as f:
+        return _extract_raw_text(f, filename.lower(), full=full)
+
+def _process_document(file_info, llm_client, timeout) -> tuple:
+    """文档调度线程入口，返回 (datasource 文本, summary_stats)"""
+    name = file_info['name']
+    raw_text, stats = load_document_text(file_info['content'], name, llm_client, path=file_info.get('path'), timeout=timeout)
+    if raw_text is None: return "", None
+    return _wrap_datasource(name.lower(), raw_text), stats
+
+def _read_all(stream) -> bytes:
+    if hasattr(stream, 'getvalue'):
+        return stream.getvalue()
+    stream.seek(0)
+    return stream.read()
+
+def _image_cache_key(data, filename) -> str:
+    return extraction_cache_key(data, filename, config.VISION_MODEL, *preprocess_options())
+
+def _describe_image_batch(llm_client, batch) -> list:
+    """Vision 线程池入口：batch = [(key, filename, prepared), ...]，返回每张图的 (raw_text, vision_elapsed)"""
+    start = time.time()
+    texts = describe_images_batch(llm_client, [(name, prepared) for _, name, prepared in batch])
+    elapsed = time.time() - start
+    results = []
+    for (key, _, _), text in zip(batch, texts):
+        raw_text = f"[图片视觉解析结果]:\n{text}"
+        extraction_cache.set_text(key, raw_text)
+        results.append((raw_text, elapsed))
+    return results
+
+def extract_files_parallel(raw_files_data, llm_client=None, on_progress=None, timeout=None) -> str:
+    """
+    并发解析上传的文件列表，返回按上传顺序拼接的结构化文本。
+    - 文档类提交到进程池 (超时强制结束子进程)；PDF 拆页后并行解析，超时只丢失未完成的页
+    - 提供 llm_client 时，超长文档改为分段并行摘要后合并 (分段结果按内容哈希缓存)
+    - 图片先压缩预处理，小图合批后提交到 Vision 线程池
+    - 每个文件完成时回调 on_progress(file_info, text, elapsed, stats)
+      图片的 stats 含压缩前后字节数与耗时；做过摘要的文档 stats = {'summary': 摘要统计}
+    - 单个文件超过 timeout 秒未完成则放弃该文件，不影响其他文件
+    """
+    if not raw_files_data:
+        return ""
+    timeout = timeout or config.FILE_PARSE_TIMEOUT
+
+    futures = {}   # future -> ([idx, ...], 提交时间)
+    doc_futures = set()
+    limits = {}    # future -> 兜底超时 (文档含摘要阶段，时限更长)
+    results = [""] * len(raw_files_data)
+    file_stats = {}
+    pending_images = []
+
+    def done_now(idx, text):
+        future = concurrent.futures.Future()
+        future.set_result(text)
+        futures[future] = ([idx], time.time())
+
+    for idx, file_info in enumerate(raw_files_data):
+        name = file_info['name']
+        try:
+            if name.lower().endswith(IMAGE_EXTS):
+                data = _read_all(file_info['content'])
+                if not llm_client:
+                    done_now(idx, "【系统提示】解析图片需要 LLM 客户端支持，当前未提供。")
+                    continue
+                key = _image_cache_key(data, name)
+                cached = extraction_cache.get_text(key)
+                if cached is not None:
+                    done_now(idx, _wrap_datasource(name.lower(), cached))
+                else:
+                    pending_images.append((idx, key, data))
+            else:
+                # 调度线程内依次完成：查缓存 -> 进程池解析 (超时 kill) -> 超长文档分段摘要
+                future = _get_doc_pool().submit(_process_document, file_info, llm_client, timeout)
+                doc_futures.add(future)
+                futures[future] = ([idx], time.time())
+                if llm_client:
+                    limits[future] = timeout + config.SUMMARY_TIMEOUT
+        except Exception as e:
+            # 进程池不可用时退回当前线程解析
+            print(f"[Files] 进程池提交失败，改为同步解析 {name}: {e}")
+            done_now(idx, extract_file_content(file_info['content'], name, llm_client))
+
+    if pending_images:
+        # 图片预处理 (解码/缩放/重编码) 并行执行，然后按体积合批
+        vision_pool = _get_vision_pool()
+        prepared_list = list(vision_pool.map(
+            lambda item: preprocess_image(item[2], raw_files_data[item[0]]['name']), pending_images
+        ))
+        by_key = {}
+        items = []
+        for (idx, key, _), prepared in zip(pending_images, prepared_list):
+            file_stats[idx] = {
+                'original_bytes': prepared['original_bytes'], 'bytes': prepared['bytes'],
+                'preprocess_elapsed': prepared['elapsed']
+            }
+            by_key.setdefault(key, []).append(idx)
+            if len(by_key[key]) == 1:  # 同一次上传中的重复图片只识别一次
+                items.append((key, raw_files_data[idx]['name'], prepared))
+        for batch in plan_batches(items):
+            future = vision_pool.submit(_describe_image_batch, llm_client, batch)
+            futures[future] = ([by_key[key] for key, _, _ in batch], time.time())
+
+    # 超时从文件真正开始解析时计时，排队等待的时间不计入
+    started_at = {}
+
+    def finish(idx, text, elapsed):
+        results[idx] = text
+        if on_progress:
+            on_progress(raw_files_data[idx], text, elapsed, file_stats.get(idx))
+
+    pending = set(futures)
+    while pending:
+        done, pending = concurrent.futures.wait(
+            pending, timeout=1, return_when=concurrent.futures.FIRST_COMPLETED
+        )
+        now = time.time()
+        for future in done:
+            idxs, submitted = futures[future]
+            started = started_at.get(future, submitted)
+            if future in doc_futures:
+                idx = idxs[0]
+                name = raw_files_data[idx]['name']
+                try:
+                    text, summary_stats = future.result()
+                    if summary_stats:
+                        file_stats[idx] = {'summary': summary_stats}
+                except WorkerTimeout:
+                    text = f"\n文件 {name} 解析超时 (>{timeout}s)，已跳过\n"
+                except WorkerCrashed as e:
+                    text = f"\n文件 {name} 解析失败 (解析进程异常退出，可能超出内存上限): {e}\n"
+                except Exception as e:
+                    text = f"\n文件 {name} 解析失败: {e}\n"
+                finish(idx, text, now - started)
+            elif isinstance(idxs[0], list):
+                # 图片批次：一个 future 对应多张图片
+                try:
+                    batch_results = future.result()
+                except Exception as e:
+                    print(f"图片解析失败: {e}")
+                    batch_results = [(f"图片解析失败: {str(e)}", now - started)] * len(idxs)
+                for same_idxs, (raw_text, vision_elapsed) in zip(idxs, batch_results):
+                    for idx in same_idxs:
+                        file_stats[idx]['vision_elapsed'] = vision_elapsed
+                        finish(idx, _wrap_datasource(raw_files_data[idx]['name'].lower(), raw_text), now - started)
+            else:
+                finish(idxs[0], future.result(), now - started)
+
+        # 超时检查：超时的文件直接放弃 (进程池任务会被 WorkerPool 自行 kill；Vision 线程无法中断，只能不再等待)
+        for future in list(pending):
+            if future not in started_at:
+                if future.running():
+                    started_at[future] = now
+                continue
+            limit = limits.get(future, timeout)
+            if now - started_at[future] > limit:
+                future.cancel()
+                pending.discard(future)
+                idxs, _ = futures[future]
+                flat = [i for group in idxs for i in group] if isinstance(idxs[0], list) else idxs
+                for idx in flat:
+                    text = f"\n文件 {raw_files_data[idx]['name']} 解析超时 (>{limit}s)，已跳过\n"
+                    finish(idx, text, now - started_at[future])
+
+    return "".join(text + "\n\n" for text in results)
@@ -0,0 +1,61 @@
+# utils/fonts.py
+import os
+import threading
+
+# 中文字体在首次绘图 (或启动预热) 时才注册：扫描字体需要导入 matplotlib，不应拖慢服务启动
+_lock = threading.Lock()
+_font_name = None
+
+def register_custom_font():
+    """
+    自动查找并加载中文字体
+    查找顺序：本地文件 -> Linux常见字体 -> Windows常见字体
+    """
+    import matplotlib.pyplot as plt
+    from matplotlib import font_manager
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    project_root = os.path.dirname(current_dir)
+    
+    possible_font_paths = [
+        'SimHei.ttf',
+        os.path.join(current_dir, 'SimHei.ttf'),
+        os.path.join(project_root, 'SimHei.ttf'),
+        '/usr/share/fonts/truetype/wqy/wqy-microhei.ttc',
+        '/usr/share/fonts/truetype/arphic/ukai.ttc'
+    ]
+
+    for font_path in possible_font_paths:
+        if os.path.exists(font_path):
+            try:
+                prop = font_manager.FontProperties(fname=font_path)
+                font_manager.fontManager.addfont(font_path)
+                # print(f"[Font] 成功加载字体文件: {font_path}")
+                plt.rcParams['font.sans-serif'] = [prop.get_name()]
+                plt.rcParams['axes.unicode_minus'] = False
+                return prop.get_name()
+            except Exception as e:
+                print(f"[Font] 尝试加载 {font_path} 失败: {e}")
+
+    fonts_to_try = [
+        'WenQuanYi Micro Hei', 'WenQuanYi Zen Hei', 'Noto Sans CJK SC',
+        'Droid Sans Fallback', 'SimHei', 'Microsoft YaHei', 'SimSun'
+    ]
+    
+    system_fonts = {f.name for f in font_manager.fontManager.ttflist}
+    
+    for f in fonts_to_try:
+        if f in system_fonts:
+            plt.rcParams['font.sans-serif'] = [f]
+            plt.rcParams['axes.unicode_minus'] = False
+            return f
+
+    print("[Font] ❌ 警告: 未找到任何中文字体，中文将无法显示！请上传 SimHei.ttf 到项目目录。")
+    return 'sans-serif'
+
+def get_font_name() -> str:
+    """返回已注册的中文字体名 (首次调用时注册，进程内只执行一次)"""
+    global _font_name
+    with _lock:
+        if _font_name is None:
+            _font_name = register_custom_font()
+        return _font_name
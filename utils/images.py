@@ -0,0 +1,156 @@
+# utils/images.py
+import io
+import re
+import time
+import base64
+import config
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
+VISION_SYSTEM_PROMPT = "你是一个数据分析师。请仔细观察这张图片，提取其中所有的关键信息、数据趋势、文字内容，并整理成结构化的文本描述，以便后续用于论文写作。"
+
+_MIME_BY_EXT = {
+    '.png': 'image/png', '.webp': 'image/webp', '.gif': 'image/gif', '.bmp': 'image/bmp'
+}
+
+def guess_mime(filename: str) -> str:
+    filename = filename.lower()
+    for ext, mime in _MIME_BY_EXT.items():
+        if filename.endswith(ext): return mime
+    return "image/jpeg"
+
+def preprocess_options() -> tuple:
+    """预处理参数，参与缓存键计算 (参数变化后识别结果需重新生成)"""
+    return (config.VISION_MAX_EDGE, config.VISION_IMAGE_FORMAT, config.VISION_IMAGE_QUALITY)
+
+def preprocess_image(data: bytes, filename: str) -> dict:
+    """
+    发送给 Vision 模型前的图片预处理：
+    解码 -> 按 EXIF 方向摆正 -> 缩放到最长边 VISION_MAX_EDGE -> 重新编码为 JPEG/WebP (不携带元数据)
+    返回 {'data', 'mime', 'original_bytes', 'bytes', 'size', 'elapsed'}
+    """
+    start = time.time()
+    result = {
+        'data': data, 'mime': guess_mime(filename),
+        'original_bytes': len(data), 'bytes': len(data), 'size': None, 'elapsed': 0.0
+    }
+    if Image is None:
+        return result
+
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            img = ImageOps.exif_transpose(img)
+            max_edge = config.VISION_MAX_EDGE
+            if max(img.size) > max_edge:
+                img.thumbnail((max_edge, max_edge), Image.LANCZOS)
+
+            fmt = config.VISION_IMAGE_FORMAT.upper()
+            if fmt == 'JPEG' and img.mode not in ('RGB', 'L'):
+                # JPEG 不支持透明通道，铺白底
+                rgba = img.convert('RGBA')
+                background = Image.new('RGB', rgba.size, (255, 255, 255))
+                background.paste(rgba, mask=rgba.split()[-1])
+                img = background
+            elif img.mode not in ('RGB', 'RGBA', 'L'):
+                img = img.convert('RGBA')
+
+            buf = io.BytesIO()
+            # 不传 exif/icc_profile，即去除元数据
+            img.save(buf, format=fmt, quality=config.VISION_IMAGE_QUALITY, optimize=True)
+            encoded = buf.getvalue()
+            result['size'] = img.size
+
+        # 小图重新编码后可能反而变大，此时保留原图
+        if len(encoded) < len(data):
+            result['data'] = encoded
+            result['mime'] = f"image/{fmt.lower()}"
+            result['bytes'] = len(encoded)
+    except Exception as e:
+        print(f"[Image] 预处理失败，使用原图 {filename}: {e}")
+
+    result['elapsed'] = time.time() - start
+    return result
+
+def to_data_url(prepared: dict) -> str:
+    b64_str = base64.b64encode(prepared['data']).decode('utf-8')
+    return f"data:{prepared['mime']};base64,{b64_str}"
+
+def describe_image(llm_client, filename: str, prepared: dict) -> str:
+    """单张图片调用 Vision 模型"""
+    response = llm_client.chat.completions.create(
+        model=config.VISION_MODEL,
+        messages=[
+            {"role": "system", "content": VISION_SYSTEM_PROMPT},
+            {
+                "role": "user",
+                "content": [
+                    {"type": "text", "text": f"请详细描述这张名为 '{filename}' 的图片内容："},
+                    {"type": "image_url", "image_url": {"url": to_data_url(prepared)}}
+                ]
+            }
+        ],
+        max_tokens=2000
+    )
+    return response.choices[0].message.content
+
+_BATCH_HEADER = re.compile(r'^\s*#{0,4}\s*【图片\s*(\d+)】.*$', re.MULTILINE)
+
+def describe_images_batch(llm_client, items: list) -> list:
+    """
+    多张小图合并为一次多图请求，items = [(filename, prepared), ...]
+    按 【图片N】 分段解析回答；分段数对不上时退回逐张识别
+    """
+    if len(items) == 1:
+        filename, prepared = items[0]
+        return [describe_image(llm_client, filename, prepared)]
+
+    names = "、".join(f"【图片{i+1}】{name}" for i, (name, _) in enumerate(items))
+    content = [{"type": "text", "text": (
+        f"下面依次给出 {len(items)} 张图片：{names}。\n"
+        f"请逐张详细描述，每张图片的描述必须以单独一行的 “【图片N】文件名” 开头，按顺序输出，不要合并。"
+    )}]
+    for _, prepared in items:
+        content.append({"type": "image_url", "image_url": {"url": to_data_url(prepared)}})
+
+    response = llm_client.chat.completions.create(
+        model=config.VISION_MODEL,
+        messages=[
+            {"role": "system", "content": VISION_SYSTEM_PROMPT},
+            {"role": "user", "content": content}
+        ],
+        max_tokens=2000 * len(items)
+    )
+    answer = response.choices[0].message.content or ""
+
+    sections = {}
+    headers = list(_BATCH_HEADER.finditer(answer))
+    for i, m in enumerate(headers):
+        end = headers[i + 1].start() if i + 1 < len(headers) else len(answer)
+        sections[int(m.group(1))] = answer[m.end():end].strip()
+
+    if all(sections.get(i + 1) for i in range(len(items))):
+        return [sections[i + 1] for i in range(len(items))]
+
+    print(f"[Image] 批量识别结果无法按图片拆分，改为逐张识别 ({len(items)} 张)")
+    return [describe_image(llm_client, name, prepared) for name, prepared in items]
+
+def plan_batches(items: list) -> list:
+    """
+    将预处理后的图片分组：体积不超过 VISION_BATCH_MAX_BYTES 的小图按 VISION_BATCH_SIZE 合批，大图单独请求
+    items = [(key, filename, prepared), ...]
+    """
+    batch_size = max(1, config.VISION_BATCH_SIZE)
+    batches, current = [], []
+    for item in items:
+        if batch_size > 1 and item[2]['bytes'] <= config.VISION_BATCH_MAX_BYTES:
+            current.append(item)
+            if len(current) >= batch_size:
+                batches.append(current)
+                current = []
+        else:
+            batches.append([item])
+    if current:
+        batches.append(current)
+    return batches
@@ -0,0 +1,39 @@
+# utils/llmpool.py
+import time
+import threading
+import concurrent.futures
+import config
+
+# 全局共享的后台 LLM 调用线程池 (懒加载)：所有任务共用，限制同时在途的请求数
+_lock = threading.Lock()
+_pool = None
+
+def get_llm_pool() -> concurrent.futures.ThreadPoolExecutor:
+    global _pool
+    with _lock:
+        if _pool is None:
+            _pool = concurrent.futures.ThreadPoolExecutor(
+                max_workers=config.LLM_POOL_WORKERS,
+                thread_name_prefix='llm'
+            )
+        return _pool
+
+def chat(llm_client, prompt: str, model: str = None, max_tokens: int = None, retries: int = 2) -> str:
+    """单轮文本调用，失败重试，返回去除首尾空白的回答"""
+    kwargs = {"max_tokens": max_tokens} if max_tokens else {}
+    for attempt in range(retries + 1):
+        try:
+            response = llm_client.chat.completions.create(
+                model=model or config.MODEL_NAME,
+                messages=[{"role": "user", "content": prompt}],
+                temperature=0.3,
+                stream=False,
+                **kwargs
+            )
+            return (response.choices[0].message.content or "").strip()
+        except Exception as e:
+            print(f"⚠️ [LLM Pool] Attempt {attempt+1}/{retries+1}: {e}")
+            if attempt < retries:
+                time.sleep(2)
+            else:
+                raise e
@@ -2,31 +2,33 @@
 import re
 import json
 import time
-import base64
 import concurrent.futures
-from openai import OpenAI
 from typing import Dict, List, Generator, Optional
 from .reference import ReferenceManager
 from .word import TextCleaner
-from .prompts import get_rewrite_prompt, get_word_distribution_prompt, get_academic_thesis_prompt
+from .prompts import get_rewrite_prompt, get_word_distribution_prompt, get_academic_thesis_prompt, get_plot_output_hint
 from .word import MarkdownToDocx
-try:
-    from docx import Document
-except ImportError:
-    Document = None
-try:
-    from pypdf import PdfReader
-except ImportError:
-    PdfReader = None
+from .files import load_document_text
+from .images import preprocess_image, to_data_url
+from .plotpool import render_preview
+from .blobstore import put_image, image_url
+from .extraction import is_supported
+from .postprocess import (count_chars, has_cjk, chapter_num, sub_code_blocks, format_chapter,
+                          remove_code_chatter, collapse_blank_lines)
 
 
+def _new_client(api_key: str, base_url: str):
+    """openai 包导入较慢，首次创建客户端时再加载 (启动预热会提前导入)"""
+    from openai import OpenAI
+    return OpenAI(api_key=api_key, base_url=base_url, timeout=120.0)
+
 class PaperAutoWriter:
     def __init__(self, api_key: str, base_url: str, model: str):
         self.api_key = api_key
         self.base_url = base_url
         self.model = model
         # 主线程客户端
-        self.main_client = OpenAI(api_key=api_key, base_url=base_url, timeout=120.0)
+        self.main_client = _new_client(api_key, base_url)
     
     def _call_llm_with_client(self, client, system_prompt: str, user_prompt: str, images: list = None) -> str:
         """
@@ -42,24 +44,19 @@ class PaperAutoWriter:
             
             for img_file in images:
                 try:
-                    # 获取文件名后缀以确定 MIME type
                     filename = img_file.get('name', 'image.jpg').lower()
-                    mime_type = "image/jpeg" # 默认
-                    if filename.endswith('.png'): mime_type = "image/png"
-                    elif filename.endswith('.webp'): mime_type = "image/webp"
-                    elif filename.endswith('.gif'): mime_type = "image/gif"
-                    elif filename.endswith('.bmp'): mime_type = "image/bmp"
 
-                    # 读取流并转为 base64
+                    # 读取流，压缩预处理后转为 base64
                     stream = img_file.get('content')
                     if stream:
                         stream.seek(0) # 重置指针
-                        b64_str = base64.b64encode(stream.read()).decode('utf-8')
+                        prepared = preprocess_image(stream.read(), filename)
+                        print(f"[Image] {filename}: {prepared['original_bytes'] // 1024}KB → {prepared['bytes'] // 1024}KB ({prepared['elapsed'] * 1000:.0f}ms)")
                         
                         user_content.append({
                             "type": "image_url",
                             "image_url": {
-                                "url": f"data:{mime_type};base64,{b64_str}"
+                                "url": to_data_url(prepared)
                             }
                         })
                 except Exception as e:
@@ -118,8 +115,7 @@ class PaperAutoWriter:
         return check_status_func() == "stopped"
 
     def _extract_chapter_num(self, title: str) -> str:
-        match = re.match(r'^(\d+)', title.strip())
-        return match.group(1) if match else ""
+        return chapter_num(title)
 
     def _determine_header_prefix(self, chapter: Dict, sec_title: str) -> str:
         level = 2
@@ -127,27 +123,11 @@ class PaperAutoWriter:
         return "#" * min(max(level, 2), 6)
 
     def _clean_and_format(self, raw_content: str, sec_title: str, ref_manager) -> str:
-        if "摘要" in sec_title or "Abstract" in sec_title:
-            raw_content = re.sub(r'^#+\s*(摘要|Abstract)\s*', '', raw_content, flags=re.IGNORECASE).strip()
-        dirty_patterns = [r'[\(（]接上文[\)）]', r'[\(（]空两格[\)）]', r'^\.\.\.', r'接上文：']
-        for p in dirty_patterns:
-            raw_content = re.sub(p, '', raw_content)
-        if ref_manager:
-            raw_content = ref_manager.process_text_deterministic(raw_content)
-        processed = TextCleaner.convert_cn_numbers(raw_content)
-        lines = []
-        for line in processed.split('\n'):
-            line = line.strip()
-            if (line and not line.startswith('　　') and not line.startswith('#') and 
-                not line.startswith('|') and not line.startswith('```') and "import" not in line):
-                line = '　　' + line 
-            lines.append(line)
-        return '\n\n'.join(lines)
+        return format_chapter(raw_content, sec_title, ref_manager)
 
     def _refine_content(self, raw_content: str, target: int, sec_title: str, sys_prompt: str, user_prompt: str) -> Generator[str, None, str]:
         # 计算纯文本长度（排除代码块）
-        content_no_code = re.sub(r'```[\s\S]*?```', '', raw_content)
-        current_len = len(re.sub(r'\s', '', content_no_code))
+        current_len = count_chars(raw_content)
         # 如果目标字数很小，或者当前字数已经达标（例如达到目标的 60%），就不处理
         if target < 300 or current_len >= target * 0.6: 
             return raw_content
@@ -157,41 +137,6 @@ class PaperAutoWriter:
         refined_content = self._call_llm(sys_prompt, expand_prompt)
         return refined_content
 
-    def _fix_markdown_table_format(self, text):
-        """
-        强力修复表格格式
-        1. 识别表格行，强制去除缩进 (防止被当做代码块)
-        2. 确保表格与上方文本之间有空行 (Markdown 标准)
-        """
-        lines = text.split('\n')
-        new_lines = []
-        in_table = False
-        
-        for line in lines:
-            # 兼容全角空格的去除
-            stripped = line.strip().replace('\u3000', '')
-            # 判定是否为表格行 (以 | 开头并结尾)
-            # 宽松匹配：只要去空后以 | 开头且包含第二个 | 即可
-            is_table_row = stripped.startswith('|') and stripped.count('|') >= 2
-            if is_table_row:
-                if not in_table:
-                    # 检查上一行是否为空，如果不是，插入空行
-                    if new_lines and new_lines[-1].strip() != '':
-                        new_lines.append('') 
-                    in_table = True
-                # 写入去缩进后的行
-                new_lines.append(stripped)
-            else:
-                if in_table:
-                    # [退出表格]
-                    # 插入空行
-                    if stripped != '':
-                        new_lines.append('')
-                    in_table = False
-                # 非表格行保持原样 (保留原有的缩进)
-                new_lines.append(line)
-        return '\n'.join(new_lines)
-
     def _prepare_data_context(self, chapter: Dict, sec_title: str, custom_data: str, local_client, title: str) -> tuple:
         """辅助方法：准备数据上下文 (含数据路由与联网搜索)"""
         facts_context = ""
@@ -263,8 +208,7 @@ class PaperAutoWriter:
         logs = []
         chapter_num = self._extract_chapter_num(sec_title)
         # 自动检测语言模式 (用于决定 User Prompt 的语言)
-        import re
-        is_chinese_mode = bool(re.search(r'[\u4e00-\u9fa5]', sec_title))
+        is_chinese_mode = has_cjk(sec_title)
         # 构建 System Prompt (内部会自动分发 CN/EN)
         sys_prompt = get_academic_thesis_prompt(
             target, 
@@ -290,8 +234,7 @@ class PaperAutoWriter:
         # 调用 LLM
         content = self._call_llm_with_client(client, sys_prompt, user_prompt)
         # 字数扩写检查 (双语适配)
-        content_no_code = re.sub(r'```[\s\S]*?```', '', content)
-        current_len = len(re.sub(r'\s', '', content_no_code))
+        current_len = count_chars(content)
         # 英文单词通常比汉字多，所以英文模式下字数阈值可以适当调整，或者按字符数估算
         # 这里简化处理，逻辑保持一致
         if "abstract" not in sec_title.lower() and "摘要" not in sec_title and target > 300 and current_len < target * 0.5:
@@ -304,41 +247,37 @@ class PaperAutoWriter:
                 
         return content, logs
 
-    def _process_code_blocks(self, content: str) -> str:
-        """辅助方法：处理 Python 代码块、自动闭合与绘图执行"""
-        
-        # 1. 自动闭合修复
-        if content.count('```') % 2 != 0:
-            content += "\n```"
-
-        # 2. 定义宽容的正则
-        code_block_pattern = re.compile(r'(```\s*(?:python|py)?\s*[\s\S]*?```)', re.IGNORECASE)
-
-        def replacer(match):
-            full_block = match.group(1)
-            # 提取纯代码
-            lines = full_block.strip().split('\n')
-            code_lines = [line for line in lines if '```' not in line]
-            
-            if not code_lines: return match.group(0)
-            
-            code = '\n'.join(code_lines).strip()
-            if not code: return match.group(0)
-
+    def _render_preview_image(self, code: str, plot_stats: dict = None):
+        """
+        按 preview 档位渲染统计图并存入图片库 (正文只保留短引用；导出 Word 时再按 print 档位重新渲染)
+        失败时存入错误提示图，返回图片 URL (/img/<hash>.<ext>) 或 None
+        """
+        try:
+            img_hash, mime, size = render_preview(code)
+        except Exception as e:
+            print(f"Python Plot Error: {e}")
+            img_buf = MarkdownToDocx.create_error_image(str(e))
+            if not img_buf: return None
+            img_data, mime = img_buf.getvalue(), "image/png"
+            img_hash, size = put_image(img_data, mime), len(img_data)
+        if plot_stats is not None:
+            plot_stats['plots'] += 1
+            plot_stats['bytes'] += size
+        return image_url(img_hash, mime)
+
+    def _process_code_blocks(self, content: str, plot_stats: dict = None) -> str:
+        """辅助方法：处理 Python 代码块、自动闭合与绘图执行 (plot_stats 累计预览图数量与字节数)"""
+        def replacer(code, block):
+            if not code: return block
             try:
                 # 执行绘图
-                img_buf = MarkdownToDocx.exec_python_plot(code)
-                if img_buf:
-                    b64_data = base64.b64encode(img_buf.getvalue()).decode('utf-8')
-                    return f"\n![统计图](data:image/png;base64,{b64_data})\n"
-                else:
-                    return match.group(0)
+                img_url = self._render_preview_image(code, plot_stats)
+                return f"\n![统计图]({img_url})\n" if img_url else block
             except Exception as e:
                 print(f"Plot Execution Error: {e}")
-                return match.group(0)
+                return block
 
-        # 执行替换
-        return code_block_pattern.sub(replacer, content)
+        return sub_code_blocks(content, replacer)
 
     def _process_single_chapter(self, task_bundle):
         """线程工作函数 (重构版)"""
@@ -372,7 +311,7 @@ class PaperAutoWriter:
                 }
 
             # 3. 初始化 Client
-            local_client = OpenAI(api_key=api_key, base_url=base_url, timeout=120.0)
+            local_client = _new_client(api_key, base_url)
             logs.append(f"🚀 [并发启动] 正在撰写: {sec_title}")
 
             # 4. 准备上下文 (数据 + 文献)
@@ -395,16 +334,19 @@ class PaperAutoWriter:
             logs.extend(gen_logs)
 
             # 6. 后处理 (代码执行、格式清洗)
-            content = self._process_code_blocks(content)
-            content = self._clean_and_format(content, sec_title, None)
-            final_content = self._fix_markdown_table_format(content)
+            plot_stats = {'plots': 0, 'bytes': 0}
+            content = self._process_code_blocks(content, plot_stats)
+            if plot_stats['plots']:
+                logs.append(f"🖼️ {sec_title}: 渲染 {plot_stats['plots']} 张统计图 (预览 {plot_stats['bytes'] // 1024}KB)")
+            final_content = self._clean_and_format(content, sec_title, None)
             
             # 7. 组装结果
             section_md = f"{header_prefix} {sec_title}\n\n{final_content}\n\n"
 
             return {
                 "index": i, "type": "content", 
-                "content": section_md, "raw_text": final_content, "logs": logs
+                "content": section_md, "raw_text": final_content, "logs": logs,
+                "plot_stats": plot_stats
             }
 
         except Exception as e:
@@ -472,9 +414,13 @@ class PaperAutoWriter:
         
         # 这里的 ref_manager 主要用于最后生成文末的参考文献列表，所以合并两者
         combined_refs = f"{ref_domestic}\n{ref_foreign}"
-        ref_manager = ReferenceManager(combined_refs)
+        # 去重只针对国内 / 国外两份列表之间的重复，只填了一份时跳过
+        ref_manager = ReferenceManager(combined_refs, dedup=bool(ref_domestic.strip() and ref_foreign.strip()))
         yield f"data: {json.dumps({'type': 'log', 'msg': '🚀 启动高并发生成引擎 (Max Threads=8)...'})}\n\n"
+        if ref_manager.duplicates:
+            yield f"data: {json.dumps({'type': 'log', 'msg': f'📚 参考文献去重：合并 {ref_manager.duplicates} 条重复文献'})}\n\n"
         full_content = f"# {title}\n\n"
+        task_plot_stats = {'plots': 0, 'bytes': 0}
         global_context = initial_context if initial_context else f"论文题目：《{title}》"
         
         # 预先生成全文大纲文本字符串
@@ -517,6 +463,7 @@ class PaperAutoWriter:
                             full_content += content_md
                             yield f"data: {json.dumps({'type': 'content', 'md': content_md})}\n\n"
                             global_context += result.get('raw_text', '')[-200:]
+                            for k, v in result.get('plot_stats', {}).items(): task_plot_stats[k] += v
                         break
                     except concurrent.futures.TimeoutError:
                         yield f": keep-alive\n\n"
@@ -525,6 +472,11 @@ class PaperAutoWriter:
                         yield f"data: {json.dumps({'type': 'log', 'msg': f'❌ 主线程异常: {str(e)}'})}\n\n"
                         break
 
+        if task_plot_stats['plots']:
+            msg = (f"🖼️ 本次共 {task_plot_stats['plots']} 张统计图，预览图合计 {task_plot_stats['bytes'] // 1024}KB "
+                   f"(导出 Word 时按打印档位重新渲染)")
+            yield f"data: {json.dumps({'type': 'log', 'msg': msg})}\n\n"
+
         if check_status_func() != "stopped":
             # 生成文末参考文献列表
             bib = ref_manager.generate_bibliography()
@@ -560,31 +512,17 @@ class PaperAutoWriter:
                 # 这里我们传递原始 dict，让底层决定怎么处理
                 image_files.append(f)
             
-            # --- B. 文档处理 ---
-            elif filename.endswith('.docx') and Document:
-                try:
-                    doc = Document(content_stream)
-                    text = "\n".join([para.text for para in doc.paragraphs])
-                    extracted_text.append(f"【参考文档：{filename}】\n{text}")
-                except Exception as e:
-                    print(f"Error parsing docx {filename}: {e}")
-            
-            elif filename.endswith('.pdf') and PdfReader:
+            # --- B. 文档处理 (按内容哈希缓存；超长文档分段摘要，而不是截断或整篇塞入上下文) ---
+            elif is_supported(filename):
                 try:
-                    reader = PdfReader(content_stream)
-                    text = ""
-                    for page in reader.pages:
-                        text += page.extract_text() + "\n"
-                    extracted_text.append(f"【参考文档：{filename}】\n{text}")
+                    text, stats = load_document_text(content_stream, filename, self.main_client, path=f.get('path'))
+                    if stats:
+                        print(f"[Rewrite] {filename} 超长，已分段摘要: {stats['chunks']} 段, 缓存命中 {stats['cached']} 次, {stats['elapsed']:.1f}s")
                 except Exception as e:
-                    print(f"Error parsing pdf {filename}: {e}")
-            
-            elif filename.endswith(('.txt', '.csv', '.md')):
-                try:
-                    text = content_stream.read().decode('utf-8', errors='ignore')
+                    print(f"Error parsing {filename}: {e}")
+                    text = None
+                if text is not None:
                     extracted_text.append(f"【参考文档：{filename}】\n{text}")
-                except Exception as e:
-                    print(f"Error reading text {filename}: {e}")
 
         return "\n\n".join(extracted_text), image_files
     
@@ -607,7 +545,7 @@ class PaperAutoWriter:
         # 1. 构建 Prompt
         sys_prompt = get_rewrite_prompt(title, section_title, user_instruction, context[-800:], custom_data, original_content, chapter_num)
         
-        user_prompt = f"论文题目：{title}\n请修改章节：{section_title}\n用户的具体修改意见：{user_instruction}\n【最高指令】直接输出正文。如果需要绘图，请输出完整的 Markdown 代码块 (```python ... ```)，不要解释代码。"
+        user_prompt = f"论文题目：{title}\n请修改章节：{section_title}\n用户的具体修改意见：{user_instruction}\n【最高指令】直接输出正文。{get_plot_output_hint()}"
         
         # 【修改点 4】调用 LLM 时传入 images
         # 注意：你需要确保 self._call_llm 方法能够接收 images 参数并传递给 GPT-4o/Claude
@@ -616,61 +554,26 @@ class PaperAutoWriter:
         else:
             content = self._call_llm(sys_prompt, user_prompt)
 
-        # 3. [Step 1] 清洗废话标题
-        garbage_patterns = [
-            r'^\s*(?:#+|\*\*|)?\s*(?:设置|定义|创建|绘制|添加|导入|准备)(?:绘图)?(?:风格|数据|变量|画布|条形图|折线图|饼图|统计图|图表|数值|标签|引用|相关库|代码).*?$',
-            r'^\s*(?:#+|\*\*|)?\s*Python\s*代码(?:如下|示例)?[:：]?\s*$',
-            r'^\s*(?:#+|\*\*|)?\s*代码如下[:：]?\s*$'
-        ]
-        for pat in garbage_patterns:
-            content = re.sub(pat, '', content, flags=re.MULTILINE | re.IGNORECASE)
-
-        # =========================================================
-        # [Step 2] 核心修复：自动补全与宽容匹配
-        # =========================================================
-        
-        # A. 自动闭合修复：如果代码块标记是奇数个，说明 LLM 没写完，强制补全
-        if content.count('```') % 2 != 0:
-            content += "\n```"
-
-        # B. 宽容正则：允许 ```python, ``` python, 甚至不写 python 的 ``` 
-        code_block_pattern = re.compile(r'(```\s*(?:python|py)?\s*[\s\S]*?```)', re.IGNORECASE)
-        
-        def image_replacer(match):
-            full_block = match.group(1).strip()
-            
-            # 提取内部代码
-            lines = full_block.split('\n')
-            
-            # 过滤掉第一行 (```xxx) 和最后一行 (```)
-            code_lines = [line for line in lines if '```' not in line]
-            
-            if not code_lines: return "" # 空块
-            
-            code = '\n'.join(code_lines).strip()
-            if not code: return ""
+        # 3. [Step 1] 清洗废话标题 (模型对绘图代码的解说行)
+        content = remove_code_chatter(content)
 
+        # [Step 2] 代码块自动闭合 + 宽容匹配，执行绘图替换为图片
+        def image_replacer(code, block):
+            if not code: return "" # 空块
             try:
-                # 执行绘图
-                # 确保引入了 MarkdownToDocx 或相应的绘图工具
-                img_buf = MarkdownToDocx.exec_python_plot(code)
-                if img_buf:
-                    b64_data = base64.b64encode(img_buf.getvalue()).decode('utf-8')
+                img_url = self._render_preview_image(code)
+                if img_url:
                     # 返回图片 HTML
-                    return f'\n\n<div align="center" class="plot-container"><img src="data:image/png;base64,{b64_data}" style="max-width:85%; border:1px solid #eee; padding:5px; border-radius:4px;"></div>\n\n'
-                else:
-                    return "" 
+                    return f'\n\n<div align="center" class="plot-container"><img src="{img_url}" style="max-width:85%; border:1px solid #eee; padding:5px; border-radius:4px;"></div>\n\n'
+                return ""
             except Exception as e:
                 print(f"Plot Logic Error: {e}")
                 return ""
 
-        # 执行替换
-        new_content = code_block_pattern.sub(image_replacer, content)
-        
-        # [Step 3] 最后的扫尾
-        new_content = re.sub(r'\n{3,}', '\n\n', new_content)
+        new_content = sub_code_blocks(content, image_replacer)
 
-        return new_content.strip()
+        # [Step 3] 最后的扫尾
+        return collapse_blank_lines(new_content).strip()
 
     def plan_word_count(self, total_words: int, outline_list: List[str]) -> Dict[str, Dict]:
         outline_str = "\n".join(outline_list)
@@ -0,0 +1,266 @@
+# utils/plotpool.py
+import io
+import re
+import json
+import threading
+import concurrent.futures
+import config
+from utils.cache import ContentCache, content_key
+from utils.fonts import get_font_name
+from utils.chartspec import ChartSpecError, is_chart_spec, parse_chart_spec, canonical_spec
+from utils.blobstore import put_image, get_image, get_image_meta, image_hash
+from utils.procpool import WorkerPool, WorkerTimeout, WorkerCrashed, RemoteError
+
+# 绘图进程池 (懒加载，全局共享)：每个进程同一时间只渲染一张图，pyplot 全局状态互不干扰
+_lock = threading.Lock()
+_plot_pool = None
+_chart_figure = None  # 工作进程内复用的 Figure (图表规格渲染)
+_chart_rc = None
+_inflight = {}  # 缓存键 -> Future：并发请求同一张图时只渲染一次
+
+# 渲染逻辑或统一样式变更时递增，使旧的渲染缓存失效
+PLOT_RENDER_VERSION = "1"
+PLOT_THEME = "whitegrid"
+
+# 生成时、改写时、导出时三处共用：同一段绘图代码只渲染一次
+plot_cache = ContentCache(
+    'plots',
+    max_items=512,
+    max_memory_bytes=config.PLOT_CACHE_MEMORY_MB * 1024 * 1024,
+    max_disk_bytes=config.PLOT_CACHE_DISK_MB * 1024 * 1024
+)
+
+_MIME_BY_FORMAT = {'png': 'image/png', 'jpeg': 'image/jpeg', 'jpg': 'image/jpeg', 'webp': 'image/webp', 'svg': 'image/svg+xml'}
+
+class PlotError(Exception):
+    """绘图代码执行失败 / 超时 / 超出资源限制"""
+    pass
+
+def normalize_plot_code(code_str: str) -> str:
+    """去掉代码围栏、不可见字符，以及会覆盖统一样式的 rcParams / set_theme 调用"""
+    code_str = re.sub(r'^```(?:python|py|chart|json)', '', code_str.strip(), flags=re.MULTILINE|re.IGNORECASE)
+    code_str = re.sub(r'^```', '', code_str.strip(), flags=re.MULTILINE)
+    code_str = code_str.replace('\u3000', ' ').replace('\u00A0', ' ').replace('\u200b', '')
+    code_str = re.sub(r"plt\.rcParams\[.*?\]\s*=\s*.*", "", code_str)
+    code_str = re.sub(r"sns\.set_theme\(.*?\)", "", code_str)
+    code_str = re.sub(r"sns\.set\(.*?\)", "", code_str)
+    return code_str
+
+def plot_source(code_str: str) -> str:
+    """
+    代码块的规范形式：图表规格 -> 校验后的规范 JSON；Python 代码 -> 规范化代码
+    渲染缓存与图片库元数据都使用该形式，规格不合法时抛出 PlotError
+    """
+    code_str = normalize_plot_code(code_str)
+    if not is_chart_spec(code_str):
+        return code_str
+    try:
+        return canonical_spec(parse_chart_spec(code_str))
+    except ChartSpecError as e:
+        raise PlotError(f"图表规格错误: {e}")
+
+def _canonical_code(code_str: str) -> str:
+    """缓存键用的规范形式：去掉整行注释、空行与行尾空白 (不影响渲染结果的差异)"""
+    lines = []
+    for line in code_str.split('\n'):
+        line = line.rstrip()
+        if not line or line.lstrip().startswith('#'): continue
+        lines.append(line)
+    return "\n".join(lines)
+
+def get_profile(profile: str) -> dict:
+    """返回渲染档位参数 {'dpi', 'format', 'quality'}，未知档位按 print 处理"""
+    options = config.PLOT_PROFILES.get(profile) or config.PLOT_PROFILES['print']
+    return {'dpi': options.get('dpi', 300), 'format': options.get('format', 'png').lower(), 'quality': options.get('quality')}
+
+def profile_mime(profile: str) -> str:
+    return _MIME_BY_FORMAT.get(get_profile(profile)['format'], 'image/png')
+
+def plot_cache_key(code_str: str, options: dict) -> str:
+    """键 = 规范化代码 + 渲染参数 + 统一样式 (主题、中文字体)"""
+    return content_key(_canonical_code(code_str).encode('utf-8'), PLOT_RENDER_VERSION,
+                       options['dpi'], options['format'], options['quality'], PLOT_THEME, get_font_name())
+
+# ===================== 工作进程内执行 =====================
+
+def _warm_renderer():
+    """进程启动时预加载 matplotlib / seaborn / pandas 并注册中文字体，再渲染一张空图完成字体缓存"""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    import seaborn  # noqa: F401
+    import pandas  # noqa: F401
+    get_font_name()  # 注册中文字体
+    fig = plt.figure(figsize=(1, 1))
+    fig.text(0.5, 0.5, "warm-up")
+    fig.savefig(io.BytesIO(), format='png')
+    plt.close('all')
+    _get_chart_figure()
+
+def _render(code_str: str, dpi: int, fmt: str, quality=None) -> bytes:
+    """工作进程入口：执行已规范化的绘图代码，返回图片字节"""
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    import pandas as pd
+    import numpy as np
+    plt.close('all')
+    plt.clf()
+    sns.set_theme(style=PLOT_THEME)
+    plt.rcParams['font.sans-serif'] = [get_font_name()]
+    plt.rcParams['axes.unicode_minus'] = False
+    local_vars = {'plt': plt, 'sns': sns, 'pd': pd, 'np': np}
+    try:
+        exec(code_str, {}, local_vars)
+        buf = io.BytesIO()
+        plt.tight_layout()
+        # 有损格式 (jpeg/webp) 的压缩质量通过 Pillow 传入
+        pil_kwargs = {'quality': quality} if quality and fmt in ('jpeg', 'jpg', 'webp') else None
+        plt.savefig(buf, format=fmt, dpi=dpi, bbox_inches='tight', pil_kwargs=pil_kwargs)
+        return buf.getvalue()
+    finally:
+        plt.close('all')
+
+def _get_chart_figure():
+    """图表规格渲染复用同一个 Figure，样式 (whitegrid + 中文字体) 只计算一次"""
+    global _chart_figure, _chart_rc
+    if _chart_figure is None:
+        import matplotlib
+        import seaborn as sns
+        from matplotlib.figure import Figure
+        _chart_rc = {**sns.axes_style(PLOT_THEME), **sns.plotting_context('notebook'),
+                     'font.sans-serif': [get_font_name()], 'axes.unicode_minus': False}
+        with matplotlib.rc_context(_chart_rc):
+            _chart_figure = Figure(figsize=(10, 6))
+    return _chart_figure, _chart_rc
+
+def _render_chart(spec_json: str, dpi: int, fmt: str, quality=None) -> bytes:
+    """工作进程入口：按已校验的图表规格直接绘制 (不经过 exec / pyplot)，返回图片字节"""
+    import matplotlib
+    from utils.chartspec import draw_chart
+    fig, rc = _get_chart_figure()
+    try:
+        with matplotlib.rc_context(rc):
+            fig.clear()
+            draw_chart(fig, json.loads(spec_json))
+            fig.tight_layout()
+            buf = io.BytesIO()
+            pil_kwargs = {'quality': quality} if quality and fmt in ('jpeg', 'jpg', 'webp') else None
+            fig.savefig(buf, format=fmt, dpi=dpi, bbox_inches='tight', pil_kwargs=pil_kwargs)
+            return buf.getvalue()
+    finally:
+        fig.clear()
+
+def _render_error(error_msg: str) -> bytes:
+    import matplotlib.pyplot as plt
+    plt.close('all')
+    plt.figure(figsize=(8, 4))
+    plt.text(0.5, 0.5, f"Plot Error:\n{error_msg}",
+             horizontalalignment='center', verticalalignment='center',
+             fontsize=12, color='red', bbox=dict(facecolor='#ffe6e6', edgecolor='red'))
+    plt.axis('off')
+    buf = io.BytesIO()
+    plt.savefig(buf, format='png', dpi=100)
+    plt.close('all')
+    return buf.getvalue()
+
+# ===================== 调用方接口 =====================
+
+def get_plot_pool() -> WorkerPool:
+    global _plot_pool
+    with _lock:
+        if _plot_pool is None:
+            _plot_pool = WorkerPool(
+                'plot', config.PLOT_WORKERS,
+                initializer=_warm_renderer,
+                memory_limit_mb=config.PLOT_MEMORY_MB
+            )
+        return _plot_pool
+
+def render_plot(code_str: str, profile: str = 'print') -> bytes:
+    """
+    按渲染档位 (见 config.PLOT_PROFILES) 在绘图进程池中渲染，返回图片字节
+    code_str 为图表规格 (JSON) 时走内置渲染器，否则执行 Python 绘图代码
+    结果按规范化代码缓存 (内存 + 磁盘)，失败不缓存
+    超过 PLOT_TIMEOUT 秒 (墙钟) 或 PLOT_CPU_SECONDS (CPU 时间) 的任务会被强制结束，抛出 PlotError
+    """
+    code_str = plot_source(code_str)
+    render_func = _render_chart if is_chart_spec(code_str) else _render
+    options = get_profile(profile)
+    key = plot_cache_key(code_str, options)
+    cached = plot_cache.get(key)
+    if cached is not None:
+        return cached
+
+    with _lock:
+        future = _inflight.get(key)
+        owner = future is None
+        if owner:
+            future = _inflight[key] = concurrent.futures.Future()
+    if not owner:
+        return future.result()
+
+    try:
+        data = _render_in_pool(render_func, code_str, options['dpi'], options['format'], options['quality'])
+        plot_cache.set(key, data)
+        future.set_result(data)
+        return data
+    except Exception as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _lock:
+            _inflight.pop(key, None)
+
+def _render_in_pool(render_func, code_str, dpi, fmt, quality) -> bytes:
+    try:
+        return get_plot_pool().run(render_func, code_str, dpi, fmt, quality,
+                                   timeout=config.PLOT_TIMEOUT, cpu_limit=config.PLOT_CPU_SECONDS)
+    except WorkerTimeout:
+        raise PlotError(f"绘图超时 (>{config.PLOT_TIMEOUT}s)")
+    except WorkerCrashed:
+        raise PlotError("绘图进程异常退出 (可能超出内存或 CPU 时间限制)")
+    except RemoteError as e:
+        # 只保留首行异常信息，完整堆栈不展示在图片上
+        raise PlotError(str(e).split('\n')[0])
+
+def render_error_image(error_msg: str) -> bytes:
+    return get_plot_pool().run(_render_error, error_msg, timeout=config.PLOT_TIMEOUT)
+
+def render_preview(code_str: str) -> tuple:
+    """
+    生成/改写时使用：按 preview 档位渲染并存入图片库 (元数据记录绘图代码，供导出时重新渲染)
+    返回 (图片哈希, mime, 字节数)
+    """
+    data = render_plot(code_str, 'preview')
+    mime = profile_mime('preview')
+    return put_image(data, mime, plot_source(code_str)), mime, len(data)
+
+def print_image(data: bytes, meta: dict = None) -> tuple:
+    """
+    导出时使用：把文中的图片换成可打印版本，返回 (图片字节, 扩展名)
+    1. 图片库中记录了绘图代码 -> 按 print 档位重新渲染 (命中渲染缓存则无需重绘)
+    2. 其他 Word 不支持的格式 (如 webp) -> 转为 PNG
+    """
+    if meta is None:
+        meta = get_image_meta(image_hash(data))
+    code_str = meta.get('code') if meta else None
+    if code_str is not None:
+        try:
+            return render_plot(code_str, 'print'), get_profile('print')['format']
+        except Exception as e:
+            print(f"[Plot] 导出时重新渲染失败，使用预览图: {e}")
+
+    from PIL import Image
+    with Image.open(io.BytesIO(data)) as img:
+        fmt = (img.format or 'PNG').upper()
+        if fmt in ('PNG', 'JPEG', 'GIF', 'BMP'):
+            return data, 'jpg' if fmt == 'JPEG' else fmt.lower()
+        buf = io.BytesIO()
+        img.save(buf, format='PNG')
+        return buf.getvalue(), 'png'
+
+def print_image_by_hash(h: str):
+    """按 /img/<hash> 引用取图并转为可打印版本；图片不存在或已过期返回 None"""
+    data, meta = get_image(h)
+    if data is None: return None
+    return print_image(data, meta)
@@ -0,0 +1,98 @@
+# utils/postprocess.py
+import re
+from functools import lru_cache
+
+# 生成 / 改写结果的文本后处理：正则在模块加载时编译一次，每个步骤对全文只扫描一遍
+# 章节生成: sub_code_blocks -> format_chapter (去摘要标题、去续写标记、分段缩进与表格行清理合并为一遍)
+# 章节改写: remove_code_chatter -> sub_code_blocks -> collapse_blank_lines -> strip_section_heading
+
+# 代码块：字数统计时整块剔除；绘图块为宽松匹配 (```python / ``` py / 不写语言)
+CODE_FENCE_RE = re.compile(r'```[\s\S]*?```')
+PLOT_BLOCK_RE = re.compile(r'(```\s*(?:python|py)?\s*[\s\S]*?```)', re.IGNORECASE)
+_CJK_RE = re.compile(r'[一-龥]')
+_CHAPTER_NUM_RE = re.compile(r'^(\d+)')
+_ABSTRACT_HEADING_RE = re.compile(r'^#+\s*(摘要|Abstract)\s*', re.IGNORECASE)
+# 模型续写时残留的标记：(接上文) / (空两格)，以及开头的省略号与 "接上文："
+_DIRTY_MARK_RE = re.compile(r'[\(（](?:接上文|空两格)[\)）]')
+_PARAGRAPH_SKIP_PREFIXES = ('　　', '#', '|', '```')
+# 改写结果中模型对绘图代码的解说行 ("设置绘图风格"、"Python 代码如下：" 等)
+_CODE_CHATTER_RE = re.compile(
+    r'^\s*(?:#+|\*\*|)?\s*(?:'
+    r'(?:设置|定义|创建|绘制|添加|导入|准备)(?:绘图)?(?:风格|数据|变量|画布|条形图|折线图|饼图|统计图|图表|数值|标签|引用|相关库|代码).*?'
+    r'|Python\s*代码(?:如下|示例)?[:：]?\s*'
+    r'|代码如下[:：]?\s*'
+    r')$', re.MULTILINE | re.IGNORECASE)
+_BLANK_RUN_RE = re.compile(r'\n{3,}')
+
+def count_chars(text: str) -> int:
+    """正文字数：不计代码块与空白字符 (str.split 的空白字符集与正则 \\s 相同，且快于逐字符替换)"""
+    if '```' in text:
+        text = CODE_FENCE_RE.sub('', text)
+    return sum(map(len, text.split()))
+
+def has_cjk(text: str) -> bool:
+    return _CJK_RE.search(text) is not None
+
+def chapter_num(title: str) -> str:
+    """章节标题开头的数字 ("3.1 研究设计" -> "3")"""
+    match = _CHAPTER_NUM_RE.match(title.strip())
+    return match.group(1) if match else ""
+
+def close_fences(text: str) -> str:
+    """代码块标记为奇数个时 (模型输出被截断) 在末尾补上闭合标记"""
+    return text + "\n```" if text.count('```') % 2 else text
+
+def sub_code_blocks(text: str, func) -> str:
+    """补全未闭合的代码块后，把每个代码块替换为 func(代码, 原代码块) 的返回值 (代码已去掉 ``` 行并 strip)"""
+    def replacer(match):
+        block = match.group(1)
+        code = '\n'.join(line for line in block.strip().split('\n') if '```' not in line).strip()
+        return func(code, block)
+    return PLOT_BLOCK_RE.sub(replacer, close_fences(text))
+
+def remove_dirty_marks(text: str) -> str:
+    """去掉续写标记；不含标记时原样返回"""
+    if '接上文' in text or '空两格' in text:
+        text = _DIRTY_MARK_RE.sub('', text)
+    if text.startswith('...'):
+        text = text[3:]
+    return text.replace('接上文：', '') if '接上文' in text else text
+
+def format_paragraphs(text: str) -> str:
+    """
+    逐行去首尾空白，段落之间空一行：
+    普通段落首行缩进两个全角空格 (标题、代码、导入语句除外)，表格行去掉全角空格 (防止被当做代码块)
+    每行之间都插入了空行，表格与上下文自然隔开，不必再单独修复表格边界
+    """
+    lines = []
+    for line in text.split('\n'):
+        line = line.strip()
+        if line.startswith('|'):
+            if line.count('|') >= 2: line = line.replace('　', '')
+        elif line and not line.startswith(_PARAGRAPH_SKIP_PREFIXES) and "import" not in line:
+            line = '　　' + line
+        lines.append(line)
+    return '\n\n'.join(lines)
+
+def format_chapter(raw_content: str, sec_title: str, ref_manager=None) -> str:
+    """章节生成结果的格式化 (代码块替换为图片之后调用)：去摘要重复标题、续写标记，(可选) 规范引用，分段缩进"""
+    if "摘要" in sec_title or "Abstract" in sec_title:
+        raw_content = _ABSTRACT_HEADING_RE.sub('', raw_content, count=1).strip()
+    raw_content = remove_dirty_marks(raw_content)
+    if ref_manager:
+        raw_content = ref_manager.process_text_deterministic(raw_content)
+    return format_paragraphs(raw_content)
+
+def remove_code_chatter(text: str) -> str:
+    return _CODE_CHATTER_RE.sub('', text)
+
+def collapse_blank_lines(text: str) -> str:
+    return _BLANK_RUN_RE.sub('\n\n', text)
+
+@lru_cache(maxsize=256)
+def _section_heading_re(title: str):
+    return re.compile(r'^#+\s*' + re.escape(title) + r'.*\n', re.IGNORECASE | re.MULTILINE)
+
+def strip_section_heading(text: str, title: str) -> str:
+    """去掉模型在改写结果中重复输出的章节标题行"""
+    return _section_heading_re(title).sub('', text).strip()
@@ -0,0 +1,217 @@
+# utils/procpool.py
+import os
+import time
+import queue
+import threading
+import traceback
+import multiprocessing
+import concurrent.futures
+try:
+    import resource
+except ImportError:  # Windows 无 resource 模块，资源限制不生效
+    resource = None
+
+# 当前进程是否为池中的工作进程 (工作进程内不再嵌套派发任务)
+IN_WORKER = False
+
+class WorkerTimeout(Exception):
+    """任务超过时限，工作进程已被强制结束"""
+    pass
+
+class WorkerCrashed(Exception):
+    """工作进程异常退出 (超内存 / 超 CPU 时间 / 段错误等)"""
+    pass
+
+class RemoteError(Exception):
+    """任务在工作进程内抛出的异常"""
+    pass
+
+def _cpu_seconds():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+def _vm_bytes():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[0]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return 0
+
+def _worker_main(conn, initializer, initargs, memory_limit_mb):
+    global IN_WORKER
+    IN_WORKER = True
+    if initializer:
+        initializer(*initargs)
+    if resource and memory_limit_mb:
+        # 在预热完成后的地址空间基础上再给出 memory_limit_mb 的余量
+        limit = _vm_bytes() + memory_limit_mb * 1024 * 1024
+        try:
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+        except (ValueError, OSError) as e:
+            print(f"[WorkerPool] 设置内存上限失败: {e}")
+    conn.send(('ready', os.getpid()))
+
+    while True:
+        try:
+            job = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            break
+        if job is None: break
+        func, args, cpu_limit = job
+        if resource:
+            # RLIMIT_CPU 是进程累计值：每个任务开始时在已用时间上追加配额，超出由 SIGXCPU 结束进程
+            # 不带配额的任务取消上一个任务留下的软上限 (否则可能因前一任务的用时被误杀)
+            soft = int(_cpu_seconds() + cpu_limit) + 1 if cpu_limit else resource.RLIM_INFINITY
+            try:
+                resource.setrlimit(resource.RLIMIT_CPU, (soft, resource.RLIM_INFINITY))
+            except (ValueError, OSError):
+                pass
+        try:
+            conn.send(('ok', func(*args)))
+        except MemoryError:
+            conn.send(('err', "MemoryError: 超出工作进程内存上限"))
+        except Exception as e:
+            conn.send(('err', f"{type(e).__name__}: {e}\n{traceback.format_exc(limit=3)}"))
+
+class _Worker:
+    def __init__(self, ctx, initializer, initargs, memory_limit_mb):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(
+            target=_worker_main, args=(child_conn, initializer, initargs, memory_limit_mb), daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+        self.ready = False
+
+    def wait_ready(self, timeout):
+        if self.ready: return True
+        if self.conn.poll(timeout):
+            msg = self.conn.recv()
+            self.ready = msg[0] == 'ready'
+        return self.ready
+
+    def kill(self):
+        try:
+            self.process.kill()
+            self.process.join(timeout=5)
+        except Exception:
+            pass
+        try:
+            self.conn.close()
+        except Exception:
+            pass
+
+class WorkerPool:
+    """
+    预启动 (pre-fork) 的工作进程池：
+    - 每个任务独占一个进程，超时直接 kill 并补充新进程，不会拖住调用方
+    - 可选每进程内存余量 (RLIMIT_AS) 与每任务 CPU 时间 (RLIMIT_CPU) 限制
+    - initializer 在进程启动时执行一次，用于预加载重量级模块
+    - run() 同步执行；submit() 返回 concurrent.futures.Future
+    """
+    def __init__(self, name, size, initializer=None, initargs=(), memory_limit_mb=None, start_timeout=60):
+        self.name = name
+        self.size = size
+        self.initializer = initializer
+        self.initargs = initargs
+        self.memory_limit_mb = memory_limit_mb
+        self.start_timeout = start_timeout
+        self._ctx = multiprocessing.get_context('spawn')
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._started = False
+        self._dispatcher = None
+        self._stats = {'jobs': 0, 'ok': 0, 'errors': 0, 'timeouts': 0, 'crashes': 0, 'busy_seconds': 0.0}
+
+    def _spawn(self):
+        return _Worker(self._ctx, self.initializer, self.initargs, self.memory_limit_mb)
+
+    def start(self):
+        """启动全部工作进程 (可在服务启动后的预热阶段调用，也会在首次使用时自动调用)"""
+        with self._lock:
+            if self._started: return
+            for _ in range(self.size):
+                self._idle.put(self._spawn())
+            self._dispatcher = concurrent.futures.ThreadPoolExecutor(
+                max_workers=self.size, thread_name_prefix=f'pool-{self.name}'
+            )
+            self._started = True
+
+    def _replace(self, worker):
+        worker.kill()
+        self._idle.put(self._spawn())
+
+    def run(self, func, *args, timeout=None, cpu_limit=None, deadline=None):
+        """
+        在工作进程中执行 func(*args)，func 必须是模块级函数 (可 pickle)
+        timeout 从任务真正开始执行时计时；deadline 为绝对截止时间 (排队等待也计入)
+        """
+        self.start()
+        worker = self._idle.get()
+        start = time.time()
+        with self._lock:
+            self._stats['jobs'] += 1
+        try:
+            if not worker.wait_ready(self.start_timeout):
+                raise WorkerCrashed(f"[{self.name}] 工作进程启动失败")
+            if deadline is not None:
+                left = deadline - time.time()
+                if left <= 0:
+                    with self._lock: self._stats['timeouts'] += 1
+                    raise WorkerTimeout(f"[{self.name}] 排队期间已超过截止时间，任务未执行")
+                timeout = left if timeout is None else min(timeout, left)
+            worker.conn.send((func, args, cpu_limit))
+            if not worker.conn.poll(timeout):
+                with self._lock: self._stats['timeouts'] += 1
+                self._replace(worker)
+                worker = None
+                raise WorkerTimeout(f"[{self.name}] 任务超过 {timeout}s 未完成，已终止工作进程")
+            status, payload = worker.conn.recv()
+        except (EOFError, OSError, BrokenPipeError) as e:
+            with self._lock: self._stats['crashes'] += 1
+            if worker is not None:
+                self._replace(worker)
+                worker = None
+            raise WorkerCrashed(f"[{self.name}] 工作进程异常退出: {e}")
+        except WorkerCrashed:
+            with self._lock: self._stats['crashes'] += 1
+            if worker is not None:
+                self._replace(worker)
+                worker = None
+            raise
+        finally:
+            with self._lock:
+                self._stats['busy_seconds'] += time.time() - start
+            if worker is not None:
+                self._idle.put(worker)
+
+        with self._lock:
+            self._stats['ok' if status == 'ok' else 'errors'] += 1
+        if status != 'ok':
+            raise RemoteError(payload)
+        return payload
+
+    def submit(self, func, *args, timeout=None, cpu_limit=None, deadline=None) -> concurrent.futures.Future:
+        self.start()
+        return self._dispatcher.submit(self.run, func, *args, timeout=timeout, cpu_limit=cpu_limit, deadline=deadline)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._stats, 'size': self.size, 'idle': self._idle.qsize()}
+
+    def shutdown(self):
+        with self._lock:
+            if not self._started: return
+            self._started = False
+        while True:
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                worker.conn.send(None)
+            except Exception:
+                pass
+            worker.kill()
+        if self._dispatcher:
+            self._dispatcher.shutdown(wait=False)
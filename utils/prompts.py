@@ -1,5 +1,45 @@
 
 from typing import List
+import config
+
+# 图表规格 (```chart JSON) 说明：常规图表不写代码，由内置渲染器直接绘制 (开关见 config.PLOT_CHART_SPEC)
+CHART_SPEC_GUIDE_CN = """
+    **统计图输出方式 (优先使用图表规格)**:
+    常规的柱状图 / 条形图 / 堆叠柱状图 / 折线图 / 饼图 / 散点图，**不要写 Python 代码**，而是输出一个 ```chart 代码块，内容为 JSON 图表规格：
+    ```chart
+    {"type": "bar", "title": "2019-2023年营业收入", "x_label": "年份", "y_label": "营业收入", "unit": "亿元",
+     "labels": ["2019", "2020", "2021", "2022", "2023"],
+     "series": [{"name": "营业收入", "values": [12.5, 13.1, 15.8, 17.2, 19.6]}]}
+    ```
+    - `type` 可选: bar (柱状) / barh (条形) / stacked_bar (堆叠柱状) / line (折线) / pie (饼图) / scatter (散点)
+    - `labels` 为类别 (横轴)；`series` 可有多项 (多组对比)，每项的 `values` 与 `labels` 一一对应，只能是数字
+    - 饼图只能有一个 series；散点图每项用 `x` 与 `values` 给出坐标，可省略 `labels`
+    - 只有上述类型无法表达的图 (如热力图、箱线图、双坐标轴) 才按下面的 Python 代码规范编写
+"""
+
+CHART_SPEC_GUIDE_EN = """
+    **Chart Output (Prefer Chart Specs)**:
+    For ordinary bar / horizontal bar / stacked bar / line / pie / scatter charts, **do NOT write Python code**. Output a ```chart block containing a JSON chart spec instead:
+    ```chart
+    {"type": "line", "title": "Revenue 2019-2023", "x_label": "Year", "y_label": "Revenue", "unit": "billion USD",
+     "labels": ["2019", "2020", "2021", "2022", "2023"],
+     "series": [{"name": "Revenue", "values": [12.5, 13.1, 15.8, 17.2, 19.6]}]}
+    ```
+    - `type`: bar / barh / stacked_bar / line / pie / scatter
+    - `labels` are the categories (x axis); each item in `series` has `values` aligned with `labels` (numbers only)
+    - Pie charts take exactly one series; scatter series give coordinates via `x` and `values`
+    - Only write Python code (rules below) for charts these types cannot express (heatmaps, box plots, dual axes, ...)
+"""
+
+def get_chart_spec_guide(lang: str = 'cn') -> str:
+    if not config.PLOT_CHART_SPEC: return ""
+    return CHART_SPEC_GUIDE_EN if lang == 'en' else CHART_SPEC_GUIDE_CN
+
+def get_plot_output_hint() -> str:
+    """改写用户提示中的绘图要求 (与系统提示中的图表规格说明保持一致)"""
+    if not config.PLOT_CHART_SPEC:
+        return "如果需要绘图，请输出完整的 Markdown 代码块 (```python ... ```)，不要解释代码。"
+    return "如果需要绘图，常规图表请输出 ```chart 图表规格 (JSON)，只有图表规格无法表达的图才输出完整的 ```python ... ``` 代码块，不要解释代码。"
 
 def get_academic_thesis_prompt_en(
         target_words: int, 
@@ -217,7 +257,7 @@ This section **MUST** cite the assigned references.
     # 4. Visualization Strategy (EN)
     # ------------------------------------------------------------------
     visuals_instruction = ""
-    plot_config = """
+    plot_config = get_chart_spec_guide('en') + """
     **Python Code Requirements**:
         - Must include imports: `import matplotlib.pyplot as plt`, `import seaborn as sns`, `import pandas as pd`, `import numpy as np`.
         - **English Support**: Labels and Titles must be in English.
@@ -256,7 +296,7 @@ This section **MUST** cite the assigned references.
         visuals_instruction = f"""
 ### **Strategy F: Mandatory Statistical Plot**
 **User explicitly requested a [Plot] for this section.**
-1. **Execution**: Write Python code to plot the data (Line/Bar/Pie).
+1. **Execution**: Plot the data (Line/Bar/Pie) following the output rules below.
 2. **No Tables**: **Forbidden** to use Markdown tables for core data.
 {plot_config}
 3. **Interaction**: Text must reference "As shown in Fig {chapter_num}.X...".
@@ -609,7 +649,7 @@ def get_academic_thesis_prompt_cn(
 
     # 策略F: Python 绘图 
     visuals_instruction = ""
-    plot_config = """
+    plot_config = get_chart_spec_guide('cn') + """
     **Python绘图代码终极规范 (Strict Code Rules)**:
     为了防止 'name ax is not defined' 和数据解析错误，你必须**严格照抄**以下模板逻辑：
 
@@ -671,7 +711,7 @@ def get_academic_thesis_prompt_cn(
         visuals_instruction = f"""
 ### **策略F: 强制统计图展示 (Mandatory Plot)**
 **用户明确要求本节必须包含一个【统计图】。**
-1.  **执行**: 请根据本节论述的数据，编写 Python 代码绘制最合适的统计图（折线/柱状/饼图）。
+1.  **执行**: 请根据本节论述的数据，绘制最合适的统计图（折线/柱状/饼图），输出方式见下方规范。
 2.  **严禁制表**: 本节**禁止**使用 Markdown 表格展示核心数据，必须转化成可视化图形。
 {plot_config}
 3.  **图文互动**: 正文中必须包含“如图{chapter_num}.X所示”的引用分析。
@@ -828,8 +868,8 @@ def get_rewrite_prompt(thesis_title: str, section_title: str, user_instruction:
         # 只有检测到关键词，才注入详细的绘图规范
         visuals_section = f"""
 6. **可视化响应（Visualization Strategy - ACTIVATED）**：
-    - **执行动作**：用户指令中包含绘图要求。请根据本节论述的数据，编写 Python 代码绘制最合适的统计图，或者绘制三线表。
-    
+    - **执行动作**：用户指令中包含绘图要求。请根据本节论述的数据，绘制最合适的统计图 (图表规格或 Python 代码)，或者绘制三线表。
+    {get_chart_spec_guide('cn')}
     **(1) Python绘图代码终极规范 (Strict Code Rules)**:
     为了防止 'name ax is not defined' 错误，你必须**严格照抄**以下模板：
     
@@ -998,3 +1038,40 @@ Value 是一个对象，包含 `words` (整数) 和 `needs_data` (布尔值)。
     "3.1 市场现状分析": {{ "words": 800, "needs_data": true }}
 }}
 """
+
+def get_chunk_summary_prompt(filename: str, chunk: str, part: int, total: int, max_chars: int) -> str:
+    return f"""
+# 角色
+你是一位严谨的研究助理，负责为论文写作整理参考资料。
+
+# 任务
+下面是文件 **“{filename}”** 的第 {part}/{total} 部分原文。请提炼其中对论文写作有用的信息。
+
+# 提炼要求
+1. **数据优先**: 完整保留具体数值、年份、单位、比例、排名、表格中的关键数据，严禁改动数字。
+2. **结论与观点**: 保留核心结论、因果关系、政策或方法要点。
+3. **去除冗余**: 删除目录、页眉页脚、重复表述、套话。
+4. **长度限制**: 不超过 {max_chars} 字，使用简洁的条目式中文输出。
+5. **禁止编造**: 原文没有的信息不得补充。
+
+# 原文
+{chunk}
+"""
+
+def get_merge_summary_prompt(filename: str, summaries: str, max_chars: int) -> str:
+    return f"""
+# 角色
+你是一位严谨的研究助理，负责为论文写作整理参考资料。
+
+# 任务
+下面是文件 **“{filename}”** 若干连续部分的摘要 (按原文顺序排列)。请将它们合并为一份连贯的综合摘要。
+
+# 合并要求
+1. **数据优先**: 保留全部关键数值、年份与出处信息，严禁改动数字。
+2. **合并去重**: 相同主题的要点合并，按原文顺序组织。
+3. **长度限制**: 不超过 {max_chars} 字，使用简洁的条目式中文输出。
+4. **禁止编造**: 摘要中没有的信息不得补充。
+
+# 待合并摘要
+{summaries}
+"""
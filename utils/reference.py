@@ -1,24 +1,100 @@
 import re
 import math
+from collections import deque
 from typing import List, Dict, Tuple
 
+_CLEAN_PATTERN = re.compile(r'^(\[\d+\]|\d+\.|（\d+）|\(\d+\))\s*')
+_CJK_RE = re.compile(r'[一-龥]')
+# 去重键：优先 DOI；否则为整条文献 (已去序号) 的规范化文本：全角转半角、忽略大小写、去掉标点与空白
+# 只合并同一文献的不同写法；同名但作者 / 年份不同的著作不会被合并
+_DOI_RE = re.compile(r'10\.\d{4,9}/[^\s"<>]+', re.IGNORECASE)
+# 规范化对整个列表拼接后的文本执行 (逐条调用 NFKC / 正则替换对上万条文献过慢)：
+# 逐个找出文本中出现的全角字符与中文标点，每种字符用一次 str.replace 全部替换；大小写与 ASCII 标点在 UTF-8 字节上一次完成
+_WIDTH_FOLD = {chr(c): chr(c - 0xFEE0) for c in range(0xFF01, 0xFF5F)}
+_WIDTH_FOLD['\u3000'] = ' '
+_WIDTH_FOLD.update(dict.fromkeys('、。《》〈〉「」『』【】〔〕“”‘’—…·・', ''))
+_WIDTH_FOLD_RE = re.compile('[' + re.escape(''.join(_WIDTH_FOLD)) + ']')
+_ASCII_DROP = bytes(c for c in range(128) if not chr(c).isalnum() and c != 10)
+_REVIEW_KEYS = ["现状", "综述", "Review", "Status", "背景"]
+_CONNECTORS = ["此外，", "另有研究表明，", "相关学者还指出，", "补充研究发现，", "同时，"]
+
+def _normalize_lines(refs: List[str]) -> List[str]:
+    """逐条规范化 (整个列表一次处理，换行作为各条之间的分隔保留)"""
+    text = '\n'.join(refs)
+    if not text.isascii():
+        match = _WIDTH_FOLD_RE.search(text)
+        while match:
+            ch = match.group()
+            text = text.replace(ch, _WIDTH_FOLD[ch])
+            match = _WIDTH_FOLD_RE.search(text, match.start())
+    return text.encode('utf-8').translate(None, _ASCII_DROP).lower().decode('utf-8').split('\n')
+
+def _doi_key(ref: str):
+    doi = _DOI_RE.search(ref)
+    return "doi:" + doi.group(0).rstrip('.,;。；').lower() if doi else None
+
+def reference_keys(refs: List[str]) -> List[str]:
+    """文献去重键 (国内 / 国外列表中同一篇文献的不同写法归为同一键)；refs 为已去掉序号的单行文献"""
+    return [('10.' in ref and _doi_key(ref)) or normalized or ref for ref, normalized in zip(refs, _normalize_lines(refs))]
+
+def reference_key(ref: str) -> str:
+    return reference_keys([' '.join(ref.split('\n'))])[0]
+
 class ReferenceManager:
-    def __init__(self, raw_references: str):
-        raw_lines = [r.strip() for r in raw_references.split('\n') if r.strip()]
-        self.all_refs = []
-        clean_pattern = re.compile(r'^(\[\d+\]|\d+\.|（\d+）|\(\d+\))\s*')
-        for line in raw_lines:
-            cleaned_line = clean_pattern.sub('', line)
-            self.all_refs.append(cleaned_line)
-        self.current_chapter_refs = []
-
-    def is_chinese(self, text: str) -> bool:
-        return bool(re.search(r'[\u4e00-\u9fa5]', text))
+    def __init__(self, raw_references: str, dedup: bool = True):
+        # all_refs 为去重后的文献，序号即 下标 + 1；is_cn 为对应的语言标记 (构建时计算一次)
+        # dedup=False 时不计算去重键 (只有一份文献列表时无需去重)，索引在第一次 add / find 时再建立
+        refs = [_CLEAN_PATTERN.sub('', line) for line in map(str.strip, raw_references.split('\n')) if line]
+        self._index = None
+        self.duplicates = 0
+        if dedup:
+            # 去重键对整个列表一次算出；同键的文献只保留第一次出现的写法 (没有重复时直接建索引)
+            keys = reference_keys(refs)
+            self._index = dict(zip(keys, range(len(keys))))
+            if len(self._index) < len(keys):
+                unique = {}
+                for key, ref in zip(keys, refs):
+                    unique.setdefault(key, ref)
+                self._index = {key: i for i, key in enumerate(unique)}
+                self.duplicates = len(refs) - len(unique)
+                refs = list(unique.values())
+        self.all_refs = refs
+        self.is_cn = [not ref.isascii() and _CJK_RE.search(ref) is not None for ref in refs]
+        self.current_chapter_refs = deque()
+
+    def _build_index(self) -> dict:
+        if self._index is None:
+            self._index = {}
+            for i, key in enumerate(reference_keys(self.all_refs)):
+                self._index.setdefault(key, i)
+        return self._index
+
+    def add(self, ref: str) -> int:
+        """加入一条文献 (已去掉序号)，返回全局序号；与已有文献重复时返回已有序号"""
+        index = self._build_index()
+        key = reference_key(ref)
+        if key in index:
+            self.duplicates += 1
+            return index[key] + 1
+        index[key] = len(self.all_refs)
+        self.all_refs.append(ref)
+        self.is_cn.append(self.is_chinese(ref))
+        return len(self.all_refs)
+
+    def find(self, ref: str) -> int:
+        """按去重键查找文献的全局序号，不存在返回 0"""
+        idx = self._build_index().get(reference_key(_CLEAN_PATTERN.sub('', ref.strip())))
+        return 0 if idx is None else idx + 1
+
+    @staticmethod
+    def is_chinese(text: str) -> bool:
+        return _CJK_RE.search(text) is not None
 
     def distribute_references_smart(self, chapters: List[Dict]) -> Dict[int, List[Tuple[int, str]]]:
         if not self.all_refs: return {}
-        cn_refs = [ (i+1, r) for i, r in enumerate(self.all_refs) if self.is_chinese(r) ]
-        en_refs = [ (i+1, r) for i, r in enumerate(self.all_refs) if not self.is_chinese(r) ]
+        cn_refs, en_refs = [], []
+        for i, (ref, cn) in enumerate(zip(self.all_refs, self.is_cn)):
+            (cn_refs if cn else en_refs).append((i + 1, ref))
 
         domestic_idxs = []
         foreign_idxs = []
@@ -28,11 +104,11 @@ class ReferenceManager:
         for i, chapter in enumerate(chapters):
             if chapter.get('is_parent'): continue
             title = chapter['title']
-            
+
             if "参考文献" not in title and "致谢" not in title and "摘要" not in title:
-                 last_content_idx = i
+                last_content_idx = i
 
-            if any(k in title for k in ["现状", "综述", "Review", "Status", "背景"]):
+            if any(k in title for k in _REVIEW_KEYS):
                 if "国内" in title or "我国" in title or "China" in title:
                     domestic_idxs.append(i)
                 elif "国外" in title or "国际" in title or "Foreign" in title:
@@ -40,82 +116,61 @@ class ReferenceManager:
                 else:
                     general_idxs.append(i)
 
-        allocation = {} 
+        allocation = {}
         def assign_chunks(refs_list, target_idxs):
             if not target_idxs: return refs_list
             if not refs_list: return []
             chunk_size = math.ceil(len(refs_list) / len(target_idxs))
             for k, idx in enumerate(target_idxs):
-                start = k * chunk_size
-                chunk = refs_list[start : start + chunk_size]
-                if not chunk: continue
-                if idx not in allocation: allocation[idx] = []
-                allocation[idx].extend(chunk)
+                chunk = refs_list[k * chunk_size : (k + 1) * chunk_size]
+                if chunk: allocation.setdefault(idx, []).extend(chunk)
             return []
 
         rem_cn = assign_chunks(cn_refs, domestic_idxs)
         rem_en = assign_chunks(en_refs, foreign_idxs)
-        rem_all = rem_cn + rem_en
-        rem_all.sort(key=lambda x: x[0])
+        # 两类都未分配时即全部文献 (已按序号排列)；否则只剩其中一类，本身有序
+        if rem_cn and rem_en:
+            rem_all = [(i + 1, ref) for i, ref in enumerate(self.all_refs)]
+        else:
+            rem_all = rem_cn or rem_en
         rem_final = assign_chunks(rem_all, general_idxs)
 
         if rem_final and last_content_idx != -1:
-             if last_content_idx not in allocation: allocation[last_content_idx] = []
-             allocation[last_content_idx].extend(rem_final)
+            allocation.setdefault(last_content_idx, []).extend(rem_final)
 
-        for idx in allocation:
-            allocation[idx].sort(key=lambda x: x[0])
+        for refs in allocation.values():
+            refs.sort(key=lambda x: x[0])
         return allocation
 
     def set_current_chapter_refs(self, refs: List[Tuple[int, str]]):
-        self.current_chapter_refs = list(refs) 
+        self.current_chapter_refs = deque(refs)
 
     def process_text_deterministic(self, text: str) -> str:
-        result_text = ""
         parts = text.split('[REF]')
-        
-        # 1. 填充 LLM 已经生成的引用位置
-        for i, part in enumerate(parts):
-            result_text += part
-            if i < len(parts) - 1:
-                if self.current_chapter_refs:
-                    global_id, _ = self.current_chapter_refs.pop(0)
-                    result_text += f"[{global_id}]"
-                else:
-                    # 如果 LLM 生成的标记多于分配的文献(极少见)，不填ID
-                    result_text += "" 
-        
-        # 2. [核心修复] 处理剩余未引用的文献
-        # 不再堆叠 ID，而是生成完整的补充句子
-        if self.current_chapter_refs:
-            result_text += "\n\n"
-            
-            # 定义一些连接词，让句子看起来不那么重复
-            connectors = ["此外，", "另有研究表明，", "相关学者还指出，", "补充研究发现，", "同时，"]
-            
-            for i, (global_id, content) in enumerate(self.current_chapter_refs):
-                # 尝试从文献内容中提取更有意义的信息 (比如作者或标题)
-                # 假设 content 格式是 "张三. 论人工智能. 期刊..."
-                # 简单的清洗：去掉换行，截取前50个字作为概述
+        pending = self.current_chapter_refs
+        out = [parts[0]]
+
+        # 1. 填充 LLM 已经生成的引用位置 (标记多于分配的文献时不填 ID)
+        for part in parts[1:]:
+            if pending:
+                out.append(f"[{pending.popleft()[0]}]")
+            out.append(part)
+
+        # 2. 剩余未引用的文献：不堆叠 ID，而是生成完整的补充句子
+        if pending:
+            out.append("\n\n")
+            for i, (global_id, content) in enumerate(pending):
+                # 截取前 60 个字作为概述，避免把整条参考文献贴进正文
                 clean_content = content.replace('\n', ' ').strip()
-                
-                # 提取简单的“指代物”，如果太长就截断，避免把整篇参考文献贴进去
-                if len(clean_content) > 60:
-                    summary = clean_content[:60] + "..."
-                else:
-                    summary = clean_content
-                
-                prefix = connectors[i % len(connectors)]
-                
-                # 生成通顺的句子： "此外，[文献内容]的研究具有参考价值[10]。"
-                # 这样既利用了文献，又不会显得只是堆砌数字
-                result_text += f"{prefix}文献“{summary}”对本领域亦有重要贡献[{global_id}]。 "
-                
-        return result_text
+                summary = clean_content[:60] + "..." if len(clean_content) > 60 else clean_content
+                out.append(f"{_CONNECTORS[i % len(_CONNECTORS)]}文献“{summary}”对本领域亦有重要贡献[{global_id}]。 ")
+
+        return ''.join(out)
 
     def generate_bibliography(self) -> str:
         if not self.all_refs: return ""
+        # CPython 对局部字符串的 += 原地扩展，实测快于先生成列表再 join
         res = "## 参考文献\n\n"
-        for i, ref_content in enumerate(self.all_refs):
-            res += f"[{i+1}] {ref_content}\n\n"
+        for i, ref in enumerate(self.all_refs, 1):
+            res += f"[{i}] {ref}\n\n"
         return res
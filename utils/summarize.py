@@ -0,0 +1,136 @@
+# utils/summarize.py
+import time
+import zlib
+import concurrent.futures
+import config
+from utils.cache import ContentCache, content_key
+from utils.llmpool import get_llm_pool, chat
+from utils.prompts import get_chunk_summary_prompt, get_merge_summary_prompt
+
+# 提示词或分段规则变更时递增，使旧摘要缓存失效
+SUMMARY_VERSION = "1"
+
+summary_cache = ContentCache(
+    'summaries',
+    max_items=1024,
+    max_disk_bytes=config.SUMMARY_CACHE_MB * 1024 * 1024
+)
+
+def split_chunks(text: str, target_chars: int = None) -> list:
+    """
+    按行切分为约 target_chars 字的段，切点由内容决定：
+    段长达到目标的一半后，遇到“行哈希 % 4 == 0”的行即切开 (超过 1.5 倍目标则强制切开)
+    这样文档中间插入/修改一段，只影响附近一两个分段，其余分段的缓存仍然命中
+    """
+    target = target_chars or config.SUMMARY_CHUNK_CHARS
+    chunks, current, size = [], [], 0
+    for line in text.split('\n'):
+        # 超长单行 (如无换行的 PDF 页) 先按目标长度硬切
+        pieces = [line[i:i + target] for i in range(0, len(line), target)] or [line]
+        for piece in pieces:
+            current.append(piece)
+            size += len(piece) + 1
+            if size >= target * 1.5 or (size >= target // 2 and zlib.crc32(piece.encode('utf-8')) % 4 == 0):
+                chunks.append("\n".join(current))
+                current, size = [], 0
+    if current and "".join(current).strip():
+        chunks.append("\n".join(current))
+    return chunks
+
+def _summarize_cached(llm_client, key, prompt, max_chars) -> str:
+    """LLM 线程池入口：调用模型并写入缓存"""
+    text = chat(llm_client, prompt, model=config.SUMMARY_MODEL)
+    text = text[:max_chars * 2]  # 模型偶尔超长，保留一定余量后截断
+    summary_cache.set_text(key, text)
+    return text
+
+def _run_level(llm_client, jobs, deadline, stats) -> list:
+    """
+    并行执行一层摘要，jobs = [(key, prompt, max_chars, fallback), ...]
+    先查缓存；超时或失败的分段使用 fallback (原文开头) 代替，且不写缓存
+    """
+    results = [None] * len(jobs)
+    futures = {}
+    pool = get_llm_pool()
+    for i, (key, prompt, max_chars, fallback) in enumerate(jobs):
+        cached = summary_cache.get_text(key)
+        if cached is not None:
+            results[i] = cached
+            stats['cached'] += 1
+        else:
+            futures[pool.submit(_summarize_cached, llm_client, key, prompt, max_chars)] = i
+    stats['calls'] += len(futures)
+
+    done, not_done = concurrent.futures.wait(futures, timeout=max(deadline - time.time(), 0))
+    for future in not_done:
+        future.cancel()
+    for future, i in futures.items():
+        try:
+            if future not in done: raise TimeoutError("摘要超时")
+            results[i] = future.result()
+        except Exception as e:
+            print(f"[Summary] 分段摘要失败，使用原文片段代替: {e}")
+            stats['failed'] += 1
+            results[i] = jobs[i][3]
+    return results
+
+def _group(summaries: list, limit: int) -> list:
+    """按原文顺序把相邻摘要合并成若干组，每组总长不超过 limit (至少两条一组)"""
+    groups, current, size = [], [], 0
+    for s in summaries:
+        if current and size + len(s) > limit and len(current) >= 2:
+            groups.append(current)
+            current, size = [], 0
+        current.append(s)
+        size += len(s)
+    if current:
+        if len(current) == 1 and groups:
+            groups[-1].append(current[0])
+        else:
+            groups.append(current)
+    return groups
+
+def summarize_document(llm_client, text: str, filename: str, timeout: int = None) -> tuple:
+    """
+    超长文档的分层摘要 (map-reduce)：
+    map    - 按内容切段，各段并行摘要 (共享 LLM 线程池)，每段结果按内容哈希缓存
+    reduce - 相邻摘要分组合并，逐层收敛，直到总长不超过 SUMMARY_DIGEST_CHARS
+    返回 (digest, stats)，stats = {'chunks', 'calls', 'cached', 'failed', 'levels', 'elapsed'}
+    """
+    start = time.time()
+    deadline = start + (timeout or config.SUMMARY_TIMEOUT)
+    chunk_out = config.SUMMARY_CHUNK_OUTPUT
+    digest_limit = config.SUMMARY_DIGEST_CHARS
+    stats = {'chunks': 0, 'calls': 0, 'cached': 0, 'failed': 0, 'levels': 0, 'elapsed': 0.0}
+
+    chunks = split_chunks(text)
+    stats['chunks'] = len(chunks)
+    jobs = [(
+        content_key(chunk.encode('utf-8'), SUMMARY_VERSION, config.SUMMARY_MODEL, 'map', chunk_out),
+        get_chunk_summary_prompt(filename, chunk, i + 1, len(chunks), chunk_out),
+        chunk_out,
+        chunk[:chunk_out]
+    ) for i, chunk in enumerate(chunks)]
+    summaries = _run_level(llm_client, jobs, deadline, stats)
+    stats['levels'] = 1
+
+    # 合并阶段：每组输入不超过一段原文的长度，输出上限随层数收敛到最终上限
+    while sum(len(s) for s in summaries) > digest_limit and len(summaries) > 1:
+        groups = _group(summaries, config.SUMMARY_CHUNK_CHARS)
+        if len(groups) == len(summaries): break
+        out = max(chunk_out, digest_limit // len(groups)) if len(groups) > 1 else digest_limit
+        jobs = []
+        for group in groups:
+            joined = "\n\n".join(f"【第 {i+1} 部分】\n{s}" for i, s in enumerate(group))
+            jobs.append((
+                content_key(joined.encode('utf-8'), SUMMARY_VERSION, config.SUMMARY_MODEL, 'reduce', out),
+                get_merge_summary_prompt(filename, joined, out),
+                out,
+                "\n".join(group)[:out]
+            ))
+        summaries = _run_level(llm_client, jobs, deadline, stats)
+        stats['levels'] += 1
+
+    digest = "\n\n".join(summaries)[:digest_limit]
+    stats['elapsed'] = time.time() - start
+    return digest, stats
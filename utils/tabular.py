@@ -0,0 +1,294 @@
+# utils/tabular.py
+"""
+表格数据 (CSV / Excel) 的流式摘要：
+分块读取 -> 向量化列画像 (类型/计数/极值/均值/分位数/高频取值/按年汇总) -> 紧凑摘要 + 分层抽样
+内存占用只与分块大小和摘要规模有关，与文件大小无关
+"""
+import re
+import numpy as np
+import pandas as pd
+import config
+
+RESERVOIR_SIZE = 2048        # 每列用于估算分位数的均匀样本容量
+TOP_CATEGORY_KEEP = 1000     # 每列高频取值计数表的上限 (超出后保留计数最高者)
+MAX_YEARS = 200              # 按年汇总的年份数上限
+MAX_STRATA = 30              # 分层抽样的层数上限，超出则退化为均匀抽样
+SMALL_TABLE_ROWS = 60        # 行数不超过该值的表格直接完整输出
+
+_TIME_COL_PATTERN = re.compile(r'年|year|date|日期|时间|期间|月份|季度|period', re.IGNORECASE)
+_YEAR_PATTERN = r'((?:19|20)\d{2})'
+
+class _ColumnProfile:
+    __slots__ = ('name', 'count', 'nulls', 'numeric_count', 'total', 'min', 'max',
+                 'sample_keys', 'sample_values', 'top')
+
+    def __init__(self, name):
+        self.name = name
+        self.count = 0
+        self.nulls = 0
+        self.numeric_count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self.sample_keys = np.empty(0)
+        self.sample_values = np.empty(0)
+        self.top = pd.Series(dtype='int64')
+
+    def update(self, series, nums, rng):
+        notna = series.notna()
+        nonnull_count = int(notna.sum())
+        self.nulls += len(series) - nonnull_count
+        self.count += nonnull_count
+        if not nonnull_count: return
+
+        is_num = nums.notna()
+        vals = nums[is_num].to_numpy(dtype=float)
+        if len(vals):
+            self.numeric_count += len(vals)
+            self.total += float(vals.sum())
+            vmin, vmax = float(vals.min()), float(vals.max())
+            self.min = vmin if self.min is None else min(self.min, vmin)
+            self.max = vmax if self.max is None else max(self.max, vmax)
+            # 随机键水塘抽样：保留随机键最小的 RESERVOIR_SIZE 个值 = 均匀无放回样本
+            keys = np.concatenate([self.sample_keys, rng.random(len(vals))])
+            values = np.concatenate([self.sample_values, vals])
+            if len(keys) > RESERVOIR_SIZE:
+                keep = np.argpartition(keys, RESERVOIR_SIZE)[:RESERVOIR_SIZE]
+                keys, values = keys[keep], values[keep]
+            self.sample_keys, self.sample_values = keys, values
+
+        texts = series[notna & ~is_num]
+        if len(texts):
+            counts = texts.astype(str).str.strip().value_counts()
+            merged = self.top.add(counts, fill_value=0)
+            if len(merged) > TOP_CATEGORY_KEEP:
+                merged = merged.nlargest(TOP_CATEGORY_KEEP)
+            self.top = merged
+
+    @property
+    def is_numeric(self):
+        return self.count > 0 and self.numeric_count >= 0.9 * self.count
+
+    def describe(self) -> dict:
+        row = {'列名': self.name, '类型': '数值' if self.is_numeric else '文本',
+               '非空': self.count, '缺失': self.nulls}
+        if self.is_numeric and self.numeric_count:
+            q25, q50, q75 = np.quantile(self.sample_values, [0.25, 0.5, 0.75])
+            row.update({'最小': _fmt(self.min), '最大': _fmt(self.max),
+                        '均值': _fmt(self.total / self.numeric_count),
+                        'P25': _fmt(q25), '中位数': _fmt(q50), 'P75': _fmt(q75), '高频取值': ''})
+        else:
+            top = self.top.nlargest(5)
+            row.update({'最小': '', '最大': '', '均值': '', 'P25': '', '中位数': '', 'P75': '',
+                        '高频取值': '、'.join(f"{k}({int(v)})" for k, v in top.items())})
+        return row
+
+def _fmt(v) -> str:
+    if v is None or (isinstance(v, float) and np.isnan(v)): return ''
+    if float(v).is_integer() and abs(v) < 1e15: return str(int(v))
+    return f"{v:.4g}" if abs(v) < 1e-3 or abs(v) >= 1e6 else f"{v:.2f}"
+
+def _unique_headers(header) -> list:
+    names, seen = [], {}
+    for i, h in enumerate(header):
+        name = str(h).strip() if h is not None and str(h).strip() else f"列{i+1}"
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}_{seen[name]}"
+        else:
+            seen[name] = 0
+        names.append(name)
+    return names
+
+class TableProfiler:
+    """逐块喂入 DataFrame，单遍完成全部统计"""
+    def __init__(self, sample_rows=40, seed=0):
+        self.rows = 0
+        self.columns = None
+        self.profiles = {}
+        self.head = None
+        self.rng = np.random.default_rng(seed)
+        self.sample_rows = sample_rows
+        self.sample = None
+        self.strata_col = None
+        self.time_col = None
+        self.year_stats = None  # DataFrame: index=年份, columns=(列, sum/count)
+
+    def _choose_special_columns(self, chunk, numeric):
+        # 时间列：列名像时间且大部分取值能抽出年份
+        for name in chunk.columns:
+            if not _TIME_COL_PATTERN.search(str(name)): continue
+            years = chunk[name].astype(str).str.extract(_YEAR_PATTERN, expand=False)
+            if years.notna().mean() >= 0.8:
+                self.time_col = name
+                break
+        # 分层列：非数值、取值种类少的列
+        for name in chunk.columns:
+            if name == self.time_col or numeric[name].notna().mean() >= 0.9: continue
+            distinct = chunk[name].nunique(dropna=True)
+            if 2 <= distinct <= 12:
+                self.strata_col = name
+                break
+
+    def update(self, chunk: pd.DataFrame):
+        if chunk.empty: return
+        if self.columns is None:
+            self.columns = list(chunk.columns)
+            self.profiles = {c: _ColumnProfile(c) for c in self.columns}
+        chunk = chunk.reindex(columns=self.columns)
+        chunk.index = pd.RangeIndex(self.rows, self.rows + len(chunk))
+
+        # 每列只做一次数值转换，供画像与按年汇总共用
+        numeric = {c: pd.to_numeric(chunk[c], errors='coerce') for c in self.columns}
+        if self.head is None:
+            self._choose_special_columns(chunk, numeric)
+        for c in self.columns:
+            self.profiles[c].update(chunk[c], numeric[c], self.rng)
+
+        if self.head is None or len(self.head) < SMALL_TABLE_ROWS:
+            need = SMALL_TABLE_ROWS - (0 if self.head is None else len(self.head))
+            part = chunk.iloc[:need]
+            self.head = part if self.head is None else pd.concat([self.head, part])
+
+        self._update_years(chunk, numeric)
+        self._update_sample(chunk)
+        self.rows += len(chunk)
+
+    def _update_years(self, chunk, numeric):
+        if self.time_col is None: return
+        years = chunk[self.time_col].astype(str).str.extract(_YEAR_PATTERN, expand=False)
+        num_cols = [c for c in self.columns if c != self.time_col and numeric[c].notna().any()]
+        if not num_cols: return
+        frame = pd.DataFrame({c: numeric[c] for c in num_cols})
+        agg = frame.groupby(years).agg(['sum', 'count'])
+        if self.year_stats is None:
+            self.year_stats = agg
+        else:
+            self.year_stats = self.year_stats.add(agg, fill_value=0)
+        if len(self.year_stats) > MAX_YEARS:
+            self.year_stats = self.year_stats.sort_index().iloc[-MAX_YEARS:]
+
+    def _update_sample(self, chunk):
+        keyed = chunk.assign(_key=self.rng.random(len(chunk)), _row=chunk.index)
+        if self.strata_col is not None:
+            part = keyed.sort_values('_key').groupby(self.strata_col, dropna=False, sort=False).head(self.sample_rows)
+            combined = part if self.sample is None else pd.concat([self.sample, part])
+            combined = combined.sort_values('_key').groupby(self.strata_col, dropna=False, sort=False).head(self.sample_rows)
+            if combined[self.strata_col].nunique(dropna=False) > MAX_STRATA:
+                self.strata_col = None
+                combined = combined.nsmallest(self.sample_rows, '_key')
+        else:
+            part = keyed.nsmallest(self.sample_rows, '_key')
+            combined = part if self.sample is None else pd.concat([self.sample, part]).nsmallest(self.sample_rows, '_key')
+        self.sample = combined
+
+    # ---------- 输出 ----------
+    def _profile_table(self) -> str:
+        return pd.DataFrame([self.profiles[c].describe() for c in self.columns]).to_markdown(index=False)
+
+    def _year_table(self, max_cols=4, max_years=12) -> str:
+        if self.year_stats is None or len(self.year_stats) < 2: return ""
+        # 多取一年用于计算首行同比，输出只保留最近 max_years 年
+        stats = self.year_stats.sort_index().iloc[-(max_years + 1):]
+        cols = [c for c in dict.fromkeys(stats.columns.get_level_values(0)) if self.profiles[c].is_numeric][:max_cols]
+        if not cols: return ""
+        table = pd.DataFrame(index=stats.index)
+        for c in cols:
+            mean = stats[(c, 'sum')] / stats[(c, 'count')].replace(0, np.nan)
+            table[f"{c} 均值"] = mean.map(_fmt)
+            table[f"{c} 同比"] = (mean.pct_change() * 100).map(lambda v: '' if pd.isna(v) else f"{v:+.1f}%")
+        table.index.name = str(self.time_col)
+        if len(table) > max_years:
+            table = table.iloc[1:]
+        return table.reset_index().to_markdown(index=False)
+
+    def _sample_table(self, budget) -> tuple:
+        if self.sample is None or self.sample.empty: return "", 0
+        sample = self.sample
+        per_group = self.sample_rows
+        while True:
+            if self.strata_col is not None:
+                rows = sample.sort_values('_key').groupby(self.strata_col, dropna=False, sort=False).head(per_group)
+            else:
+                rows = sample.nsmallest(per_group, '_key')
+            rows = rows.sort_values('_row')
+            text = rows.drop(columns=['_key', '_row']).to_markdown(index=False)
+            if len(text.encode('utf-8')) <= budget or per_group <= 1:
+                return text, len(rows)
+            per_group = max(1, int(per_group * 0.7))
+
+    def render(self, byte_budget=None) -> str:
+        byte_budget = byte_budget or config.TABULAR_SAMPLE_BYTES
+        if self.columns is None: return ""
+        if self.rows <= SMALL_TABLE_ROWS:
+            return self.head.to_markdown(index=False)
+
+        parts = [f"[表格概况] 共 {self.rows} 行，{len(self.columns)} 列", self._profile_table()]
+        year_table = self._year_table()
+        if year_table:
+            parts += [f"[年度变化] 按 “{self.time_col}” 汇总的年度均值与同比变化:", year_table]
+        used = sum(len(p.encode('utf-8')) for p in parts)
+        sample_text, n = self._sample_table(max(byte_budget - used, byte_budget // 3))
+        if sample_text:
+            how = f"按 “{self.strata_col}” 分层" if self.strata_col is not None else "随机"
+            parts += [f"[数据样本] {how}抽样 {n} 行 (按原始行序排列):", sample_text]
+        return "\n\n".join(parts)
+
+def summarize_csv(stream, byte_budget=None) -> str:
+    """分块读取 CSV (UTF-8 失败时按 GBK 重读)"""
+    for encoding in ('utf-8', 'gbk'):
+        stream.seek(0)
+        profiler = TableProfiler()
+        try:
+            for chunk in pd.read_csv(stream, chunksize=config.TABULAR_CHUNK_ROWS, encoding=encoding):
+                profiler.update(chunk)
+            return profiler.render(byte_budget)
+        except UnicodeDecodeError:
+            if encoding == 'gbk': raise
+    return ""
+
+def _iter_sheet_chunks(rows, chunk_rows):
+    header = None
+    buf = []
+    for row in rows:
+        if header is None:
+            if row is None or all(v is None for v in row): continue
+            header = _unique_headers(row)
+            continue
+        if all(v is None for v in row): continue
+        buf.append(row[:len(header)])
+        if len(buf) >= chunk_rows:
+            yield pd.DataFrame(buf, columns=header)
+            buf = []
+    if header is not None and buf:
+        yield pd.DataFrame(buf, columns=header)
+
+def iter_excel_summaries(stream, filename, byte_budget=None):
+    """
+    逐个工作表产出 (工作表名, 摘要)
+    .xlsx 使用 openpyxl 只读模式逐行读取全部工作表；.xls 无法流式读取，退回 pandas 后再分块统计
+    """
+    byte_budget = byte_budget or config.TABULAR_SAMPLE_BYTES
+    if filename.endswith('.xlsx'):
+        import openpyxl
+        wb = openpyxl.load_workbook(stream, read_only=True, data_only=True)
+        try:
+            names = wb.sheetnames
+            per_sheet = max(byte_budget // max(len(names), 1), 1500)
+            for name in names:
+                profiler = TableProfiler()
+                for chunk in _iter_sheet_chunks(wb[name].iter_rows(values_only=True), config.TABULAR_CHUNK_ROWS):
+                    profiler.update(chunk)
+                text = profiler.render(per_sheet)
+                if text: yield name, text
+        finally:
+            wb.close()
+    else:
+        frames = pd.read_excel(stream, sheet_name=None)
+        per_sheet = max(byte_budget // max(len(frames), 1), 1500)
+        for name, df in frames.items():
+            profiler = TableProfiler()
+            for start in range(0, len(df), config.TABULAR_CHUNK_ROWS):
+                profiler.update(df.iloc[start:start + config.TABULAR_CHUNK_ROWS])
+            text = profiler.render(per_sheet)
+            if text: yield name, text
@@ -35,6 +35,14 @@ class TaskManager:
             }
             print(f"[System] 任务启动: User={user_id}, Task={task_id}")
 
+    def remove_task(self, user_id, task_id):
+        """删除任务及其事件 (用户没有其他任务时一并删除用户条目)"""
+        with self._lock:
+            tasks = self._user_tasks.get(user_id)
+            if tasks is None: return
+            tasks.pop(task_id, None)
+            if not tasks: del self._user_tasks[user_id]
+
     def append_event(self, user_id, task_id, event_data):
         """写入消息"""
         with self._lock:
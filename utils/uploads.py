@@ -0,0 +1,130 @@
+# utils/uploads.py
+import io
+import os
+import mmap
+import tempfile
+import threading
+from contextlib import contextmanager
+import config
+
+CHUNK_SIZE = 1024 * 1024
+
+# 每个用户当前仍驻留 (内存或临时文件) 的上传字节数
+_user_bytes = {}
+_lock = threading.Lock()
+
+class UploadTooLarge(Exception):
+    """上传体积超过单次请求或单用户上限"""
+    pass
+
+def _reserve(user_id, n):
+    limit = config.UPLOAD_MAX_USER_MB * 1024 * 1024
+    with _lock:
+        used = _user_bytes.get(user_id, 0)
+        if used + n > limit:
+            raise UploadTooLarge(f"当前账号正在处理的上传文件总量超过 {config.UPLOAD_MAX_USER_MB}MB，请等待已有任务完成后再试")
+        _user_bytes[user_id] = used + n
+
+def _unreserve(user_id, n):
+    with _lock:
+        left = _user_bytes.get(user_id, 0) - n
+        if left > 0: _user_bytes[user_id] = left
+        else: _user_bytes.pop(user_id, None)
+
+def _spool_one(file_storage, user_id, request_budget):
+    """
+    分块读取一个上传文件：小于阈值留在内存 (BytesIO)，超过阈值转存到临时文件
+    返回 (upload_dict, 读取字节数)
+    """
+    threshold = config.UPLOAD_SPOOL_THRESHOLD
+    upload = {'name': file_storage.filename, 'content': io.BytesIO(), 'path': None, 'size': 0, 'user_id': user_id}
+    stream = file_storage.stream
+    try:
+        while True:
+            chunk = stream.read(CHUNK_SIZE)
+            if not chunk: break
+            if upload['size'] + len(chunk) > request_budget:
+                raise UploadTooLarge(f"单次上传文件总量不能超过 {config.UPLOAD_MAX_REQUEST_MB}MB")
+            _reserve(user_id, len(chunk))
+            upload['size'] += len(chunk)
+
+            if upload['path'] is None and upload['size'] > threshold:
+                # 超过阈值：把已缓冲的内容搬到临时文件，后续直接写盘
+                buffered = upload['content']
+                fd, path = tempfile.mkstemp(prefix='upload_', suffix=os.path.splitext(upload['name'])[1], dir=config.UPLOAD_SPOOL_DIR)
+                upload['path'] = path
+                # 按路径重新打开，使流的 name 为文件路径 (PDF 分页解析据此直接把路径交给子进程)
+                os.close(fd)
+                upload['content'] = open(path, 'w+b')
+                upload['content'].write(buffered.getbuffer())
+                buffered.close()
+            upload['content'].write(chunk)
+    except BaseException:
+        release_uploads([upload])
+        raise
+
+    upload['content'].seek(0)
+    return upload, upload['size']
+
+def spool_uploads(file_storages, user_id) -> list:
+    """
+    将 request.files 中的上传文件转存为可长期持有的流，边复制边检查大小上限
+    (Werkzeug 已把请求体解析为 FileStorage，网络读取阶段只受 MAX_CONTENT_LENGTH 限制；这里的上限约束的是转存后驻留的字节数)
+    返回 [{'name', 'content', 'path', 'size', 'user_id'}, ...]；超限抛出 UploadTooLarge
+    用完后必须调用 release_uploads 释放
+    """
+    if config.UPLOAD_SPOOL_DIR:
+        os.makedirs(config.UPLOAD_SPOOL_DIR, exist_ok=True)
+    budget = config.UPLOAD_MAX_REQUEST_MB * 1024 * 1024
+    uploads = []
+    try:
+        for fs in file_storages or []:
+            if not fs.filename: continue
+            upload, size = _spool_one(fs, user_id, budget)
+            uploads.append(upload)
+            budget -= size
+    except BaseException:
+        release_uploads(uploads)
+        raise
+    return uploads
+
+def release_uploads(uploads):
+    """关闭流、删除临时文件、归还用户配额 (可重复调用)"""
+    for upload in uploads or []:
+        if upload.get('released'): continue
+        upload['released'] = True
+        try:
+            upload['content'].close()
+        except Exception:
+            pass
+        if upload.get('path'):
+            try:
+                os.remove(upload['path'])
+            except OSError as e:
+                print(f"[Upload] 删除临时文件失败 {upload['path']}: {e}")
+        _unreserve(upload.get('user_id'), upload.get('size', 0))
+
+@contextmanager
+def mapped_stream(stream):
+    """
+    文件型流尽量使用只读内存映射 (PDF 解析大量随机 seek/read，mmap 避免反复系统调用与整体复制)
+    内存流 (BytesIO) 原样返回
+    """
+    try:
+        fd = stream.fileno()
+        size = os.fstat(fd).st_size
+    except (AttributeError, OSError, ValueError):
+        yield stream
+        return
+    if size == 0:
+        yield stream
+        return
+    mm = mmap.mmap(fd, 0, access=mmap.ACCESS_READ)
+    try:
+        yield mm
+    finally:
+        try:
+            mm.close()
+        except BufferError:
+            # 仍有解析器持有的切片引用，交给 GC 回收
+            pass
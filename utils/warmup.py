@@ -0,0 +1,72 @@
+# utils/warmup.py
+import time
+import threading
+import config
+
+# 启动预热：服务开始监听后在后台线程中执行一次，把原本由首个请求承担的一次性开销提前做掉
+# (导入阶段只加载轻量模块，重量级依赖均在首次使用处导入)
+_lock = threading.Lock()
+_thread = None
+_status = {'state': 'pending', 'steps': {}, 'elapsed': 0.0}
+
+def _warm_fonts():
+    """注册中文字体 (同时建立 matplotlib 字体缓存，绘图进程启动时直接复用)"""
+    from utils.fonts import get_font_name
+    return get_font_name()
+
+def _warm_pandoc():
+    """查找 Pandoc 并探测版本；未安装时仅记录 (导出改用 python-docx)"""
+    from utils.exporter import pandoc_path
+    if not pandoc_path():
+        raise OSError("未找到 Pandoc，Word 导出将使用 python-docx")
+    import pypandoc
+    return pypandoc.get_pandoc_version()
+
+def _warm_openai():
+    import openai
+    return openai.__version__
+
+def _warm_pools():
+    """预启动绘图与文档解析进程池 (进程内各自预加载 matplotlib / pandas / pypdf)"""
+    from utils.plotpool import get_plot_pool
+    from utils.extraction import get_parse_pool
+    get_plot_pool().start()
+    get_parse_pool().start()
+    return f"plot={config.PLOT_WORKERS}, parse={config.FILE_PARSE_PROCESSES}"
+
+_STEPS = [
+    ('fonts', _warm_fonts),
+    ('pandoc', _warm_pandoc),
+    ('openai', _warm_openai),
+    ('pools', _warm_pools),
+]
+
+def run_warmup():
+    """依次执行各预热步骤，单步失败不影响其他步骤"""
+    start = time.time()
+    _status['state'] = 'running'
+    for name, step in _STEPS:
+        if name == 'pools' and not config.WARMUP_PROCESS_POOLS: continue
+        t0 = time.time()
+        try:
+            detail = step()
+            _status['steps'][name] = {'ok': True, 'seconds': round(time.time() - t0, 3), 'detail': str(detail)}
+        except Exception as e:
+            print(f"⚠️ [Warmup] {name} 预热失败: {e}")
+            _status['steps'][name] = {'ok': False, 'seconds': round(time.time() - t0, 3), 'detail': str(e)}
+    _status['elapsed'] = round(time.time() - start, 3)
+    _status['state'] = 'done'
+    summary = ", ".join(f"{k} {v['seconds']}s" for k, v in _status['steps'].items())
+    print(f"🔥 [Warmup] 预热完成 ({_status['elapsed']}s): {summary}")
+
+def start_warmup() -> threading.Thread:
+    """在后台线程中预热 (重复调用只执行一次)"""
+    global _thread
+    with _lock:
+        if _thread is None:
+            _thread = threading.Thread(target=run_warmup, name='warmup', daemon=True)
+            _thread.start()
+        return _thread
+
+def warmup_status() -> dict:
+    return {**_status, 'steps': dict(_status['steps'])}
@@ -1,64 +1,72 @@
 import re
 import io
-import os
-import matplotlib.pyplot as plt
-import seaborn as sns
 import base64
-import pandas as pd  
-import numpy as np
-from matplotlib import font_manager
 from docx import Document
 from docx.shared import Pt, RGBColor, Cm
 from docx.enum.text import WD_ALIGN_PARAGRAPH
 from docx.oxml.ns import qn
 from docx.oxml import OxmlElement
+from utils.plotpool import render_plot, render_error_image, print_image, print_image_by_hash
 
-def register_custom_font():
-    """
-    自动查找并加载中文字体
-    查找顺序：本地文件 -> Linux常见字体 -> Windows常见字体
-    """
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    project_root = os.path.dirname(current_dir)
-    
-    possible_font_paths = [
-        'SimHei.ttf',
-        os.path.join(current_dir, 'SimHei.ttf'),
-        os.path.join(project_root, 'SimHei.ttf'),
-        '/usr/share/fonts/truetype/wqy/wqy-microhei.ttc',
-        '/usr/share/fonts/truetype/arphic/ukai.ttc'
-    ]
-
-    for font_path in possible_font_paths:
-        if os.path.exists(font_path):
-            try:
-                prop = font_manager.FontProperties(fname=font_path)
-                font_manager.fontManager.addfont(font_path)
-                # print(f"[Font] 成功加载字体文件: {font_path}")
-                plt.rcParams['font.sans-serif'] = [prop.get_name()]
-                plt.rcParams['axes.unicode_minus'] = False
-                return prop.get_name()
-            except Exception as e:
-                print(f"[Font] 尝试加载 {font_path} 失败: {e}")
-
-    fonts_to_try = [
-        'WenQuanYi Micro Hei', 'WenQuanYi Zen Hei', 'Noto Sans CJK SC',
-        'Droid Sans Fallback', 'SimHei', 'Microsoft YaHei', 'SimSun'
-    ]
-    
-    system_fonts = {f.name for f in font_manager.fontManager.ttflist}
-    
-    for f in fonts_to_try:
-        if f in system_fonts:
-            plt.rcParams['font.sans-serif'] = [f]
-            plt.rcParams['axes.unicode_minus'] = False
-            return f
+# MarkdownToDocx 使用的正则 (模块加载时编译一次)
+_IMG_MD_RE = re.compile(r'!\[.*?\]\((?:data:image\/(?:png|jpe?g|gif|webp);base64,(?P<data>.*?)|[^)\s]*?/img/(?P<ref>[0-9a-f]{64})(?:\.\w+)?)\)')
+_IMG_SRC_RE = re.compile(r'src=["\'](?:data:image\/(?:png|jpe?g|gif|webp);base64,(?P<data>.*?)|[^"\']*?/img/(?P<ref>[0-9a-f]{64})(?:\.\w+)?)["\']')
+_TABLE_SEP_RE = re.compile(r'^[|\-\s:—–]+$')
+_HEADING_BULLET_RE = re.compile(r'^[•\*\-\s]+')
+_CAPTION_RE = re.compile(r'^(图|表)\s*\d+')
+_BOLD_SPLIT_RE = re.compile(r'(\*\*.*?\*\*)')
+# 标题级别 -> (字号, 段前段后)；三级及以下相同
+_HEADING_FORMATS = {1: (16, 12), 2: (14, 12)}
+
+# TextCleaner.correct_punctuation 使用的正则与字符表
+_CJK_RE = re.compile(r'[\u4e00-\u9fa5]')
+# 需要判断的字符：普通标点、引号、左括号 (含其前方连续空白，空白段从非空白字符之后开始)
+_PUNCT_RE = re.compile(r'[,.:;?!)"]|(?<!\s)\s*\(')
+_FULLWIDTH = {',': '，', ':': '：', ';': '；', '?': '？', '!': '！', ')': '）'}
+# (触发子串, 受保护片段正则)：文本不含触发子串时跳过该轮
+_MASK_PASSES = [
+    ('```', re.compile(r'```[\s\S]*?```')),
+    ('`', re.compile(r'`[^`\n]+`')),
+    ('![', re.compile(r'!\[.*?\]\(.*?\)')),
+    ('](', re.compile(r'\[.*?\]\(.*?\)')),
+]
 
-    print("[Font] ❌ 警告: 未找到任何中文字体，中文将无法显示！请上传 SimHei.ttf 到项目目录。")
-    return 'sans-serif'
+def _is_cjk(ch):
+    return '\u4e00' <= ch <= '\u9fa5'
 
-# 初始化字体
-CURRENT_FONT_NAME = register_custom_font()
+def _pick_sentinel(text):
+    """占位符：取正文中未出现的私用区字符"""
+    code = 0xE000
+    while chr(code) in text: code += 1
+    return chr(code)
+
+def _mask_pass(pattern, text, masks, sentinel):
+    """
+    把 pattern 命中的片段换成占位符，返回 (新文本, 新占位内容列表)
+    masks 按占位符出现顺序排列；命中片段内已有的占位符就地还原，使每个占位内容都是原文
+    """
+    out, new_masks, pos, idx = [], [], 0, 0
+    for m in pattern.finditer(text):
+        before = text[pos:m.start()]
+        count = before.count(sentinel)
+        new_masks.extend(masks[idx:idx + count])
+        idx += count
+        segment = m.group(0)
+        if sentinel in segment:
+            pieces = segment.split(sentinel)
+            restored = [pieces[0]]
+            for piece in pieces[1:]:
+                restored.append(masks[idx])
+                restored.append(piece)
+                idx += 1
+            segment = ''.join(restored)
+        out.append(before)
+        out.append(sentinel)
+        new_masks.append(segment)
+        pos = m.end()
+    out.append(text[pos:])
+    new_masks.extend(masks[idx:])
+    return ''.join(out), new_masks
 
 class TextCleaner:
     @staticmethod
@@ -122,49 +130,55 @@ class TextCleaner:
     
     @staticmethod
     def correct_punctuation(text):
-        masks = {}
-        def save_mask(match):
-            key = f"__MASK_{len(masks)}__"
-            masks[key] = match.group(0)
-            return key
-
-        text = re.sub(r'```[\s\S]*?```', save_mask, text)
-        text = re.sub(r'`[^`\n]+`', save_mask, text)
-        text = re.sub(r'!\[.*?\]\(.*?\)', save_mask, text)
-        text = re.sub(r'\[.*?\]\(.*?\)', save_mask, text)
-        
-        # 智能标点替换
-        pairs = [
-            (r'(?<=[\u4e00-\u9fa5]),', '，'),
-            (r',(?=[\u4e00-\u9fa5])', '，'),
-            (r'(?<=[\u4e00-\u9fa5])\.', '。'),
-            (r'(?<=[\u4e00-\u9fa5]):', '：'),
-            (r':(?=[\u4e00-\u9fa5])', '：'),
-            (r'(?<=[\u4e00-\u9fa5]);', '；'),
-            (r';(?=[\u4e00-\u9fa5])', '；'),
-            (r'(?<=[\u4e00-\u9fa5])\?', '？'),
-            (r'\?(?=[\u4e00-\u9fa5])', '？'),
-            (r'(?<=[\u4e00-\u9fa5])!', '！'),
-            (r'!(?=[\u4e00-\u9fa5])', '！'),
-            (r'(?<=[\u4e00-\u9fa5])\s*\(', '（'),
-            (r'\((?=[\u4e00-\u9fa5])', '（'),
-            (r'(?<=[\u4e00-\u9fa5])\)', '）'),
-            (r'\)(?=[\u4e00-\u9fa5])', '）')
-        ]
-        
-        for p, r in pairs:
-            text = re.sub(p, r, text)
-
-        def quote_replacer(match):
-            content = match.group(1)
-            if re.search(r'[\u4e00-\u9fa5]', content):
-                return f'“{content}”'
-            return match.group(0)
-        text = re.sub(r'"(.*?)"', quote_replacer, text, flags=re.DOTALL)
-
-        for key in reversed(list(masks.keys())):
-            text = text.replace(key, masks[key])
-        return text
+        """
+        中文语境下的半角标点转全角 (代码、链接、图片原样保留)：
+        先把受保护片段替换为单字符占位符，再一次扫描完成全部标点与引号替换，最后按顺序还原
+        """
+        masks = []
+        sentinel = _pick_sentinel(text)
+        # 保护顺序与优先级不可调换：代码块 > 行内代码 > 图片 > 链接 (后一类可包住前一类的占位符)
+        for trigger, pattern in _MASK_PASSES:
+            if trigger in text:
+                text, masks = _mask_pass(pattern, text, masks, sentinel)
+
+        out, pos, quote_at, quote_end = [], 0, None, 0
+        for m in _PUNCT_RE.finditer(text):
+            start, end = m.span()
+            out.append(text[pos:start])
+            pos = end
+            ch = text[end - 1]
+            prev_cjk = start > 0 and _is_cjk(text[start - 1])
+            next_cjk = end < len(text) and _is_cjk(text[end])
+            if ch == '(':
+                # 中文后的 ( 连同前面的空白一起替换；否则仅在后接中文时替换
+                if prev_cjk: out.append('（')
+                else: out.append(text[start:end - 1] + ('（' if next_cjk else '('))
+            elif ch == '"':
+                # 引号按出现顺序两两配对，配对内容含中文才换成中文引号
+                if quote_at is None:
+                    quote_at, quote_end = len(out), end
+                    out.append('"')
+                else:
+                    if _CJK_RE.search(text, quote_end, start):
+                        out[quote_at] = '“'
+                        out.append('”')
+                    else:
+                        out.append('"')
+                    quote_at = None
+            elif ch == '.':
+                out.append('。' if prev_cjk else '.')
+            else:
+                out.append(_FULLWIDTH[ch] if prev_cjk or next_cjk else ch)
+        out.append(text[pos:])
+        text = ''.join(out)
+
+        if not masks: return text
+        parts = text.split(sentinel)
+        restored = [parts[0]]
+        for mask, part in zip(masks, parts[1:]):
+            restored.append(mask)
+            restored.append(part)
+        return ''.join(restored)
     
     @staticmethod
     def convert_cn_numbers(text: str) -> str:
@@ -208,40 +222,17 @@ class MarkdownToDocx:
 
     @staticmethod
     def create_error_image(error_msg):
-        plt.close('all')
-        plt.figure(figsize=(8, 4))
-        plt.text(0.5, 0.5, f"Plot Error:\n{error_msg}", 
-                 horizontalalignment='center', verticalalignment='center',
-                 fontsize=12, color='red', bbox=dict(facecolor='#ffe6e6', edgecolor='red'))
-        plt.axis('off')
-        buf = io.BytesIO()
-        plt.savefig(buf, format='png', dpi=100)
-        plt.close('all')
-        buf.seek(0)
-        return buf
+        try:
+            return io.BytesIO(render_error_image(error_msg))
+        except Exception as e:
+            print(f"Plot Error Image Error: {e}")
+            return None
 
     @staticmethod
     def exec_python_plot(code_str):
+        """在绘图进程池中渲染 Python 绘图代码或图表规格 (超时/超限直接结束进程)，失败时返回错误提示图"""
         try:
-            code_str = re.sub(r'^```python', '', code_str.strip(), flags=re.MULTILINE|re.IGNORECASE)
-            code_str = re.sub(r'^```', '', code_str.strip(), flags=re.MULTILINE)
-            code_str = code_str.replace('\u3000', ' ').replace('\u00A0', ' ').replace('\u200b', '')
-            code_str = re.sub(r"plt\.rcParams\[.*?\]\s*=\s*.*", "", code_str)
-            code_str = re.sub(r"sns\.set_theme\(.*?\)", "", code_str) 
-            code_str = re.sub(r"sns\.set\(.*?\)", "", code_str)
-            plt.close('all') 
-            plt.clf()
-            sns.set_theme(style="whitegrid")
-            plt.rcParams['font.sans-serif'] = [CURRENT_FONT_NAME]
-            plt.rcParams['axes.unicode_minus'] = False
-            local_vars = {'plt': plt, 'sns': sns, 'pd': pd, 'np': np}
-            exec(code_str, {}, local_vars)
-            buf = io.BytesIO()
-            plt.tight_layout()
-            plt.savefig(buf, format='png', dpi=300, bbox_inches='tight') 
-            plt.close('all')
-            buf.seek(0)
-            return buf
+            return io.BytesIO(render_plot(code_str))
         except Exception as e:
             print(f"Python Plot Error: {e}")
             return MarkdownToDocx.create_error_image(str(e))
@@ -255,7 +246,7 @@ class MarkdownToDocx:
         i += 1
         # 兼容中文破折号和冒号
         separator_line = lines[i].strip() if i < len(lines) else ""
-        if i < len(lines) and re.match(r'^[|\-\s:—–]+$', separator_line): i += 1
+        if i < len(lines) and _TABLE_SEP_RE.match(separator_line): i += 1
         else: return None, start_idx
             
         data = [headers]
@@ -270,210 +261,300 @@ class MarkdownToDocx:
         return data, i
 
     @staticmethod
-    def convert(markdown_text):
-        doc = Document()
-        style = doc.styles['Normal']
-        style.font.name = u'Times New Roman'
-        style._element.rPr.rFonts.set(qn('w:eastAsia'), u'宋体')
-        style.font.size = Pt(12)
-        style.paragraph_format.line_spacing = 1.5
-        style.paragraph_format.space_before = Pt(0)
-        style.paragraph_format.space_after = Pt(0)
-        
-        # 1. 【关键】先修复表格粘连问题
-        markdown_text = TextCleaner.fix_table_newlines(markdown_text)
-        # 2. 标点修正
-        markdown_text = TextCleaner.correct_punctuation(markdown_text)
-        
+    def tokenize(markdown_text):
+        """
+        块级切分：逐行扫描一遍，产出 (类型, 数据)：
+        heading (级别, 文本) / image (base64, 引用哈希) / plot (代码) / table (二维表) / paragraph (行文本)
+        """
         lines = markdown_text.split('\n')
         i = 0
         while i < len(lines):
             line = lines[i].strip()
-            if not line: 
+            if not line:
                 i += 1
                 continue
-            
-            # 标题
+
             if line.startswith('#'):
-                level = len(line.split(' ')[0])
-                content = line.lstrip('#').strip()
-                content = re.sub(r'^[•\*\-\s]+', '', content)
-                doc_level = min(level, 3)
-                heading = doc.add_heading('', level=doc_level)
-                heading.alignment = WD_ALIGN_PARAGRAPH.CENTER if level == 1 else WD_ALIGN_PARAGRAPH.LEFT
-                run = heading.add_run(content)
-                run.font.name = u'Times New Roman'
-                run._element.rPr.rFonts.set(qn('w:eastAsia'), u'黑体')
-                run.font.color.rgb = RGBColor(0, 0, 0)
-                heading.paragraph_format.keep_with_next = False
-                if level == 1:
-                    run.font.size = Pt(16)
-                    heading.paragraph_format.space_before = Pt(12)
-                    heading.paragraph_format.space_after = Pt(12)
-                elif level == 2:
-                    run.font.size = Pt(14)
-                    heading.paragraph_format.space_before = Pt(12)
-                    heading.paragraph_format.space_after = Pt(12)
-                else:
-                    run.font.size = Pt(13)
-                    heading.paragraph_format.space_before = Pt(6)
-                    heading.paragraph_format.space_after = Pt(6)
+                yield 'heading', (len(line.split(' ')[0]), _HEADING_BULLET_RE.sub('', line.lstrip('#').strip()))
                 i += 1
                 continue
-            
-            # Base64 图片
-            img_match = re.search(r'!\[.*?\]\(data:image\/png;base64,(.*?)\)', line)
-            if not img_match:
-                img_match = re.search(r'src=["\']data:image\/png;base64,(.*?)["\']', line)
+
+            # 图片：Base64 内联或图片库引用 /img/<hash>
+            img_match = _IMG_MD_RE.search(line) or _IMG_SRC_RE.search(line) if '(' in line or 'src=' in line else None
             if img_match:
-                try:
-                    base64_str = img_match.group(1)
-                    img_data = base64.b64decode(base64_str)
-                    img_stream = io.BytesIO(img_data)
-                    p = doc.add_paragraph()
-                    p.alignment = WD_ALIGN_PARAGRAPH.CENTER
-                    run = p.add_run()
-                    run.add_picture(img_stream, width=Cm(14)) 
-                except Exception as e:
-                    print(f"Base64 Image Error: {e}")
+                yield 'image', (img_match.group('data'), img_match.group('ref'))
                 i += 1
                 continue
 
-            # Python 代码块
-            if line.startswith('```python'):
+            # Python 绘图代码块 / 图表规格 (```chart)
+            if line.startswith('```python') or line.startswith('```chart'):
                 code_block = []
                 i += 1
                 while i < len(lines) and not lines[i].strip().startswith('```'):
                     code_block.append(lines[i])
                     i += 1
+                yield 'plot', "\n".join(code_block)
                 i += 1
-                img_stream = MarkdownToDocx.exec_python_plot("\n".join(code_block))
-                p = doc.add_paragraph()
-                p.alignment = WD_ALIGN_PARAGRAPH.CENTER
-                run = p.add_run()
-                if img_stream:
-                    run.add_picture(img_stream, width=Cm(14))
                 continue
-            
-            # 表格处理
+
             if line.startswith('|'):
                 table_data, next_i = MarkdownToDocx.parse_markdown_table(lines, i)
                 if table_data and len(table_data) > 1:
-                    rows = len(table_data)
-                    cols = max(len(r) for r in table_data)
-                    if cols > 0:
-                        table = doc.add_table(rows=rows, cols=cols)
-                        table.alignment = WD_ALIGN_PARAGRAPH.CENTER
-                        table.autofit = True
-                        for r, row_data in enumerate(table_data):
-                            for c, cell_text in enumerate(row_data):
-                                if c >= cols: break
-                                cell = table.cell(r, c)
-                                cell.text = ""
-                                p = cell.paragraphs[0]
-                                p.alignment = WD_ALIGN_PARAGRAPH.CENTER
-                                clean_text = cell_text.replace('**', '').strip()
-                                clean_text = TextCleaner.correct_punctuation(clean_text)
-                                run = p.add_run(clean_text)
-                                run.font.name = u'Times New Roman'
-                                run._element.rPr.rFonts.set(qn('w:eastAsia'), u'宋体')
-                                run.font.size = Pt(10.5)
-                                if r == 0: run.bold = True
-                        try: 
-                            # 应用三线表
-                            MarkdownToDocx.set_table_borders(table)
-                        except Exception as e: 
-                            print(f"Table formatting error: {e}")
-                        
-                        doc.add_paragraph()
-                        i = next_i
-                        continue
-            
-            # 正文段落
-            if line:
-                clean_line = line.replace('**', '').strip() 
-                line = TextCleaner.correct_punctuation(line)
-                is_caption = re.match(r'^(图|表)\s*\d+[\.\-]\d+', clean_line) or re.match(r'^(图|表)\s*\d+', clean_line)
-                p = doc.add_paragraph()
-                if is_caption:
-                    p.alignment = WD_ALIGN_PARAGRAPH.CENTER
-                    p.paragraph_format.first_line_indent = None
-                    p.paragraph_format.space_before = Pt(6)
-                    p.paragraph_format.space_after = Pt(6)
-                else:
-                    p.alignment = WD_ALIGN_PARAGRAPH.JUSTIFY
-                    p.paragraph_format.first_line_indent = Pt(24) 
-                    p.paragraph_format.line_spacing = 1.5
-                    p.paragraph_format.space_after = Pt(0)
-                    p.paragraph_format.space_before = Pt(0)
-                
-                parts = re.split(r'(\*\*.*?\*\*)', line)
-                for part in parts:
-                    if not part: continue
-                    is_bold = part.startswith('**') and part.endswith('**')
-                    text_content = part.replace('**', '') if is_bold else part
-                    run = p.add_run(text_content)
-                    run.font.name = u'Times New Roman'
-                    run._element.rPr.rFonts.set(qn('w:eastAsia'), u'宋体')
-                    run.font.size = Pt(12)
-                    run.bold = is_bold
+                    yield 'table', table_data
+                    i = next_i
+                    continue
+
+            yield 'paragraph', line
             i += 1
+
+    @staticmethod
+    def inline_spans(text):
+        """行内切分：[(文本, 是否加粗)]，**...** 为加粗"""
+        spans = []
+        for part in _BOLD_SPLIT_RE.split(text):
+            if not part: continue
+            is_bold = part.startswith('**') and part.endswith('**')
+            spans.append((part.replace('**', '') if is_bold else part, is_bold))
+        return spans
+
+    @staticmethod
+    def _set_run_font(run, east_asia, size_pt):
+        run.font.name = u'Times New Roman'
+        run._element.rPr.rFonts.set(qn('w:eastAsia'), east_asia)
+        run.font.size = Pt(size_pt)
+
+    @staticmethod
+    def _add_heading(doc, level, content):
+        heading = doc.add_heading('', level=min(level, 3))
+        heading.alignment = WD_ALIGN_PARAGRAPH.CENTER if level == 1 else WD_ALIGN_PARAGRAPH.LEFT
+        run = heading.add_run(content)
+        run.font.name = u'Times New Roman'
+        run._element.rPr.rFonts.set(qn('w:eastAsia'), u'黑体')
+        run.font.color.rgb = RGBColor(0, 0, 0)
+        heading.paragraph_format.keep_with_next = False
+        size, space = _HEADING_FORMATS.get(level, (13, 6))
+        run.font.size = Pt(size)
+        heading.paragraph_format.space_before = Pt(space)
+        heading.paragraph_format.space_after = Pt(space)
+
+    @staticmethod
+    def _add_image(doc, b64_data, ref):
+        """预览档位的统计图在此按打印档位重新渲染"""
+        try:
+            if ref:
+                printable = print_image_by_hash(ref)
+                if printable is None:
+                    doc.add_paragraph("[图片已过期，请重新生成]")
+                    return
+                img_data = printable[0]
+            else:
+                img_data, _ = print_image(base64.b64decode(b64_data))
+            p = doc.add_paragraph()
+            p.alignment = WD_ALIGN_PARAGRAPH.CENTER
+            p.add_run().add_picture(io.BytesIO(img_data), width=Cm(14))
+        except Exception as e:
+            print(f"Base64 Image Error: {e}")
+
+    @staticmethod
+    def _add_plot(doc, code):
+        img_stream = MarkdownToDocx.exec_python_plot(code)
+        p = doc.add_paragraph()
+        p.alignment = WD_ALIGN_PARAGRAPH.CENTER
+        run = p.add_run()
+        if img_stream:
+            run.add_picture(img_stream, width=Cm(14))
+
+    @staticmethod
+    def _add_table(doc, table_data):
+        cols = max(len(r) for r in table_data)
+        table = doc.add_table(rows=len(table_data), cols=cols)
+        table.alignment = WD_ALIGN_PARAGRAPH.CENTER
+        table.autofit = True
+        # 按行取单元格 (table.cell(r, c) 每次都会重建整表的单元格列表，大表上是平方级开销)
+        for r, (row, row_data) in enumerate(zip(table.rows, table_data)):
+            for cell, cell_text in zip(row.cells, row_data):
+                cell.text = ""
+                p = cell.paragraphs[0]
+                p.alignment = WD_ALIGN_PARAGRAPH.CENTER
+                clean_text = TextCleaner.correct_punctuation(cell_text.replace('**', '').strip())
+                run = p.add_run(clean_text)
+                MarkdownToDocx._set_run_font(run, u'宋体', 10.5)
+                if r == 0: run.bold = True
+        try: 
+            # 应用三线表
+            MarkdownToDocx.set_table_borders(table)
+        except Exception as e: 
+            print(f"Table formatting error: {e}")
+        doc.add_paragraph()
+
+    @staticmethod
+    def _add_paragraph(doc, line):
+        clean_line = line.replace('**', '').strip() 
+        line = TextCleaner.correct_punctuation(line)
+        p = doc.add_paragraph()
+        if _CAPTION_RE.match(clean_line):
+            p.alignment = WD_ALIGN_PARAGRAPH.CENTER
+            p.paragraph_format.first_line_indent = None
+            p.paragraph_format.space_before = Pt(6)
+            p.paragraph_format.space_after = Pt(6)
+        else:
+            p.alignment = WD_ALIGN_PARAGRAPH.JUSTIFY
+            p.paragraph_format.first_line_indent = Pt(24) 
+            p.paragraph_format.line_spacing = 1.5
+            p.paragraph_format.space_after = Pt(0)
+            p.paragraph_format.space_before = Pt(0)
+        for text_content, is_bold in MarkdownToDocx.inline_spans(line):
+            run = p.add_run(text_content)
+            MarkdownToDocx._set_run_font(run, u'宋体', 12)
+            run.bold = is_bold
+
+    @staticmethod
+    def convert(markdown_text):
+        doc = Document()
+        style = doc.styles['Normal']
+        style.font.name = u'Times New Roman'
+        style._element.rPr.rFonts.set(qn('w:eastAsia'), u'宋体')
+        style.font.size = Pt(12)
+        style.paragraph_format.line_spacing = 1.5
+        style.paragraph_format.space_before = Pt(0)
+        style.paragraph_format.space_after = Pt(0)
+        
+        # 1. 【关键】先修复表格粘连问题
+        markdown_text = TextCleaner.fix_table_newlines(markdown_text)
+        # 2. 标点修正
+        markdown_text = TextCleaner.correct_punctuation(markdown_text)
+        
+        # 3. 单次切分 + 逐块渲染
+        for kind, data in MarkdownToDocx.tokenize(markdown_text):
+            if kind == 'heading': MarkdownToDocx._add_heading(doc, *data)
+            elif kind == 'image': MarkdownToDocx._add_image(doc, *data)
+            elif kind == 'plot': MarkdownToDocx._add_plot(doc, data)
+            elif kind == 'table': MarkdownToDocx._add_table(doc, data)
+            else: MarkdownToDocx._add_paragraph(doc, data)
+
         out_stream = io.BytesIO()
         doc.save(out_stream)
         out_stream.seek(0)
         return out_stream
     
+# TextReportParser 使用的正则：全部按单行匹配 (不跨行回溯)，长行只检查行首
+_REPORT_TITLE_RE = re.compile(r'(?:论文)?(?:题目|Title)[:：]\s*(.*)', re.IGNORECASE)
+_REPORT_REF_PREFIX_RE = re.compile(r'^(\[\d+\]|\d+\.|（\d+）|\(\d+\))\s*')
+_REPORT_TOC_RE = re.compile(r'(?:目录|提纲|章节安排|结构安排|Table of Contents|Outline)[:：]?\s*', re.IGNORECASE)
+_REPORT_REVIEW_RE = re.compile(r'文献综述|研究现状|国内外研究|Literature Review|Related Work', re.IGNORECASE)
+_REPORT_REVIEW_KEYWORDS = ["文献综述", "研究现状", "国内外研究", "literature review", "related work"]
+# 逐行只匹配一次的合并正则：行首用可选前瞻同时判断各类标题，再在前 20 个字符内查找目录 / 综述关键词
+# - refs: 整行为 "参考文献" 标题   - outline: 形如章节标题的提纲行
+# - number: 一级编号 ("二、" 为中文编号 cn，"2." / "2 " 为数字编号，"2.1" 为二级，不算)
+# - stop: 综述之后的章节 (研究内容、研究方法、提纲等)，出现即结束综述
+# - toc / review: 目录、综述关键词 (起始位置不超过 20)
+# 只对英文部分忽略大小写，并先用首字符集合过滤 (全局 IGNORECASE 下逐字符比较中文关键词很慢)
+_REPORT_LINE_RE = re.compile(
+    r'(?:(?=[\d一二三四五六七八九十参第摘绪结致附研论目提进AaCcDdIiLlMmPpRrSs])'
+    r'(?=(?P<refs>(?:参考文献|(?i:References))[:：]?\Z))?'
+    r'(?=(?P<outline>(?i:Chapter\s+\d+|Section\s+\d+|Part\s+\d+)|第[一二三四五六七八九十0-9]+章|\d+(?:\.\d+)*\s|\d+\.\s|[一二三四五六]+、'
+    r'|(?i:Abstract|Introduction|Literature Review|Methodology|Results|Discussion|Conclusion|References|Appendix)'
+    r'|摘要|绪论|结论|参考文献|致谢|附录))?'
+    r'(?=(?P<number>(?P<cn>[一二三四五六七八九十]+)、|\d+(?:[.、．]|\s)(?!\d)))?'
+    r'(?=(?P<stop>(?:[一二三四五六七八九十0-9]+[、.．]?\s*)?'
+    r'(?:研究内容|研究方法|论文提纲|论文目录|目录|提纲|研究计划|进度安排|(?i:Methodology|Research Content|Chapter\s+\d+)|第[一二三四五六七八九十0-9]+章)))?)?'
+    r'(?:.{0,20}?(?=[目提章结文研国LlOoRrTt])'
+    r'(?:(?P<toc>目录|提纲|章节安排|结构安排|(?i:Table of Contents|Outline))'
+    r'|(?P<review>文献综述|研究现状|国内外研究|(?i:Literature Review|Related Work))))?')
+_REPORT_HEADING_MAX = 100       # 超过该长度的行视为正文，不参与标题 / 提纲判断
+_REPORT_REVIEW_MAX_OPEN = 16    # 同时跟踪的综述候选节数上限 (嵌套的 "国内研究现状" 等)
+
 class TextReportParser:
     @staticmethod
-    def parse(text: str) -> dict:
+    def _review_heading(line: str):
+        """综述标题行 -> (包含的关键词集合, 标题后同一行的正文)；不是标题返回 None"""
+        match = _REPORT_REVIEW_RE.search(line, 0, 60)
+        if not match or match.start() > 20: return None
+        colon = max(line.find('：', match.end(), match.end() + 12), line.find(':', match.end(), match.end() + 12))
+        if colon < 0 and len(line) > 40: return None
+        head = line.casefold() if colon < 0 else line[:colon].casefold()
+        keywords = {kw for kw in _REPORT_REVIEW_KEYWORDS if kw in head}
+        return keywords, (line[colon + 1:].strip() if colon >= 0 else "")
+
+    @staticmethod
+    def parse(text: str, max_chars: int = None) -> dict:
         """
-        解析开题报告文本
+        解析开题报告文本：逐行扫描一遍 (每行只做一次合并正则匹配)，识别参考文献、文献综述、目录 / 提纲等标题并切出对应内容
+        - 正文 (题目、综述、提纲) 为第一个 "参考文献" 标题之前的部分，参考文献取最后一个该标题之后的部分
+        - 综述为综述标题到下一个同级编号或后续章节 (研究内容、研究方法、提纲等) 之间的内容
+        - 提纲为第一个目录标题 (关键词位于行首 20 字以内) 之后 (没有则为全文) 形如章节标题的短行
         """
         data = { "title": "", "outline_content": "", "cn_refs": [], "en_refs": [], "review": "" }
         if not text: return data
-        title_match = re.search(r'(?:论文)?(?:题目|Title)[:：]\s*(.*)', text, re.IGNORECASE)
+        if max_chars and len(text) > max_chars: text = text[:max_chars]
+        title_match = _REPORT_TITLE_RE.search(text)
         if title_match: data["title"] = title_match.group(1).strip()
-        else:
-            lines = [l.strip() for l in text.split('\n') if l.strip()]
-            if lines and len(lines[0]) < 100: data["title"] = lines[0]
-        
-        ref_split = re.split(r'^\s*(?:参考文献|References)[:：]?\s*$', text, flags=re.MULTILINE | re.IGNORECASE)
-        main_body = text 
-        if len(ref_split) > 1:
-            ref_text = ref_split[-1].strip()
-            main_body = ref_split[0] 
-            refs = [line.strip() for line in ref_text.split('\n') if line.strip()]
-            for ref in refs:
-                clean_ref = re.sub(r'^(\[\d+\]|\d+\.|（\d+）|\(\d+\))\s*', '', ref)
+
+        lines = text.split('\n')
+        first_line = None
+        body_end = len(lines)
+        ref_start = None
+        toc_seen = False
+        outline = []
+        reviews = []        # [关键词集合, 同行正文, 起始行, 结束行, 一级编号类型]
+        open_reviews = []
+
+        for i, raw in enumerate(lines):
+            line = raw.strip()
+            if not line: continue
+            if first_line is None: first_line = line
+            short = len(line) < _REPORT_HEADING_MAX
+            match = _REPORT_LINE_RE.match(line)
+
+            if short and match.group('refs'):
+                body_end = min(body_end, i)
+                ref_start = i + 1
+                continue
+            if ref_start is not None: continue
+
+            # 综述：先结束已打开的候选节，再判断本行是否为新的综述标题
+            style = match.group('number') and ('cn' if match.group('cn') else 'num')
+            if open_reviews and short:
+                stop = match.group('stop') is not None
+                for review in open_reviews[:]:
+                    if stop or (style and style == review[4]):
+                        review[3] = i
+                        open_reviews.remove(review)
+            keyword = match.group('review') or match.group('toc')
+            heading = TextReportParser._review_heading(line) if keyword else None
+            if heading and len(reviews) < _REPORT_REVIEW_MAX_OPEN:
+                review = [heading[0], heading[1], i + 1, None, style]
+                reviews.append(review)
+                open_reviews.append(review)
+
+            # 提纲：以第一个目录标题为起点 (之前收集的行作废，关键词同一行的剩余部分也参与判断)
+            if match.group('toc') and not toc_seen:
+                toc_seen = True
+                outline = []
+                rest = line[_REPORT_TOC_RE.match(line, match.start('toc')).end():].strip()
+                if rest and len(rest) < _REPORT_HEADING_MAX and _REPORT_LINE_RE.match(rest).group('outline'): outline.append(rest)
+                continue
+            if short and match.group('outline'): outline.append(line)
+
+        if not data["title"] and first_line and len(first_line) < 100: data["title"] = first_line
+
+        if ref_start is not None:
+            for ref in lines[ref_start:]:
+                clean_ref = _REPORT_REF_PREFIX_RE.sub('', ref.strip())
                 if len(clean_ref) < 5: continue
-                if re.search(r'[\u4e00-\u9fa5]', clean_ref): data["cn_refs"].append(clean_ref)
+                if _CJK_RE.search(clean_ref): data["cn_refs"].append(clean_ref)
                 else: data["en_refs"].append(clean_ref)
-        
-        review_keywords = ["文献综述", "研究现状", "国内外研究", "Literature Review", "Related Work"]
-        for kw in review_keywords:
-            pattern = rf'{kw}[:：]?\s*([\s\S]*?)(?=(?:研究内容|研究方法|论文提纲|论文目录|第[一二三]章|3\.|^3\s|Chapter|Methodology|Research Content)|$)'
-            match = re.search(pattern, main_body, re.IGNORECASE | re.MULTILINE)
-            if match:
-                review_content = match.group(1).strip()
-                if len(review_content) > 50:
-                    data["review"] = review_content
+
+        # 综述按关键词优先级选取第一个内容超过 50 字的候选节
+        for kw in _REPORT_REVIEW_KEYWORDS:
+            for keywords, inline, begin, end, _ in reviews:
+                if kw not in keywords: continue
+                body = '\n'.join(lines[begin:body_end if end is None else end]).strip()
+                content = f"{inline}\n{body}".strip() if inline else body
+                if len(content) > 50:
+                    data["review"] = content
                     break
-        
-        outline_match = re.search(r'(?:目录|提纲|章节安排|结构安排|Table of Contents|Outline)[:：]?\s*([\s\S]*)', main_body, re.MULTILINE | re.IGNORECASE)
-        source_for_outline = outline_match.group(1) if outline_match else main_body
-        outline_lines = []
-        raw_lines = source_for_outline.split('\n')
-        outline_patterns = [
-            r'^Chapter\s+\d+', r'^Section\s+\d+', r'^Part\s+\d+', 
-            r'^第[一二三四五六七八九十0-9]+章', r'^\d+(\.\d+)*\s', r'^\d+\.\s', 
-            r'^[一二三四五六]+、', 
-            r'^(?:Abstract|Introduction|Literature Review|Methodology|Results|Discussion|Conclusion|References|Appendix)',
-            r'^(?:摘要|绪论|结论|参考文献|致谢|附录)'
-        ]
-        combined_pattern = '|'.join(outline_patterns)
-        for line in raw_lines:
-            line = line.strip()
-            if len(line) < 100 and re.match(combined_pattern, line, re.IGNORECASE): 
-                outline_lines.append(line)
-        if outline_lines: data["outline_content"] = "\n".join(outline_lines)
-        return data
\ No newline at end of file
+            if data["review"]: break
+
+        if outline: data["outline_content"] = "\n".join(outline)
+        return data
@@ -2,7 +2,20 @@
 import time
 import json
 from utils.state import task_manager
-from utils.files import extract_file_content
+from utils.docstore import doc_store
+from utils.files import extract_files_parallel, IMAGE_EXTS
+from utils.uploads import release_uploads
+
+def record_content(user_id, task_id, chunk):
+    """生成的章节写入服务端文档库，事件中附带章节 id 与文档版本号 (客户端据此做增量同步)"""
+    if not chunk.startswith('data: ') or '"type": "content"' not in chunk: return chunk
+    payload = json.loads(chunk[len('data: '):])
+    try:
+        payload['section_ids'], payload['version'] = doc_store.append(user_id, task_id, payload['md'])
+    except Exception as e:
+        print(f"[Worker] 文档库写入失败: {e}")
+        return chunk
+    return f"data: {json.dumps(payload)}\n\n"
 
 def background_worker(
         writer, 
@@ -22,58 +35,47 @@ def background_worker(
         final_custom_data = text_custom_data
         
         if raw_files_data:
-            task_manager.append_event(user_id, task_id, f"data: {json.dumps({'type': 'log', 'msg': '📂 正在后台解析上传的文件 (含图片识别)...'})}\n\n")
-            
-            file_extracted_text = ""
-            for file_info in raw_files_data:
-                time.sleep(0.01) # 释放 GIL
-                
-                try:
-                    # [修改] 传入 writer.main_client 以支持图片解析
-                    extracted = extract_file_content(
-                        file_info['content'], 
-                        file_info['name'], 
-                        llm_client=writer.main_client
-                    )
-                    file_extracted_text += extracted + "\n\n"
+            task_manager.append_event(user_id, task_id, f"data: {json.dumps({'type': 'log', 'msg': f'📂 正在后台并发解析 {len(raw_files_data)} 个上传文件 (含图片识别)...'})}\n\n")
 
-                    # 1. 服务器后台打印 (完整内容，用于深度排查)
-                    print(f"\n{'='*30} [DEBUG] 解析文件: {file_info['name']} {'='*30}")
-                    print(f"解析长度: {len(file_extracted_text)} 字符")
-                    print(f"解析内容:\n{file_extracted_text}")  # 这里会打印全部解析出的文字/图片描述
-                    print(f"{'='*80}\n")
+            def on_file_done(file_info, extracted, elapsed, stats=None):
+                # 1. 服务器后台打印 (用于排查)
+                print(f"[Worker] 解析文件: {file_info['name']} | 长度: {len(extracted)} 字符 | 耗时: {elapsed:.1f}s")
 
-                    # 2. 前端界面日志 (预览内容，用于快速确认)
-                    # 去掉多余换行，截取前 300 字预览
-                    preview = file_extracted_text.replace('\n', ' ').strip()[:300]
-                    debug_msg = f"🔍 [解析结果] {file_info['name']} (len={len(file_extracted_text)}):\n{preview}..."
-                    task_manager.append_event(user_id, task_id, f"data: {json.dumps({'type': 'log', 'msg': debug_msg})}\n\n")
+                # 2. 前端界面日志 (预览内容，用于快速确认)
+                # 去掉多余换行，截取前 300 字预览
+                preview = extracted.replace('\n', ' ').strip()[:300]
+                debug_msg = f"🔍 [解析结果] {file_info['name']} (len={len(extracted)}, {elapsed:.1f}s):\n{preview}..."
+                task_manager.append_event(user_id, task_id, f"data: {json.dumps({'type': 'log', 'msg': debug_msg})}\n\n")
 
+                # 超长文档做了分段摘要，记录摘要规模与缓存命中情况
+                if stats and 'summary' in stats:
+                    s = stats['summary']
+                    sum_msg = (f"📚 超长文档已分段摘要: {file_info['name']} (原文 {s['source_chars']} 字, {s['chunks']} 段, "
+                               f"合并 {s['levels']} 层, 调用 {s['calls']} 次, 缓存命中 {s['cached']} 次, 耗时 {s['elapsed']:.1f}s)")
+                    if s['failed']:
+                        sum_msg += f"，其中 {s['failed']} 段摘要失败已用原文片段代替"
+                    task_manager.append_event(user_id, task_id, f"data: {json.dumps({'type': 'log', 'msg': sum_msg})}\n\n")
 
-                    # 如果是图片，记录一条特殊的日志
-                    if file_info['name'].lower().endswith(('.png', '.jpg', '.jpeg')):
-                        img_msg = f"👁️ 图片识别完成: {file_info['name']}"
-                        json_payload = json.dumps({'type': 'log', 'msg': img_msg})
-                        task_manager.append_event(user_id, task_id, f"data: {json_payload}\n\n")
+                # 如果是图片，记录一条特殊的日志
+                if file_info['name'].lower().endswith(IMAGE_EXTS):
+                    img_msg = f"👁️ 图片识别完成: {file_info['name']}"
+                    if stats:
+                        img_msg += (f" (压缩 {stats['original_bytes'] // 1024}KB → {stats['bytes'] // 1024}KB, "
+                                    f"预处理 {stats['preprocess_elapsed'] * 1000:.0f}ms, "
+                                    f"识别 {stats.get('vision_elapsed', 0):.1f}s)")
+                    json_payload = json.dumps({'type': 'log', 'msg': img_msg})
+                    task_manager.append_event(user_id, task_id, f"data: {json_payload}\n\n")
+
+            # 单阶段并发解析：文档走进程池，图片走 Vision 线程池
+            file_extracted_text = extract_files_parallel(
+                raw_files_data,
+                llm_client=writer.main_client,
+                on_progress=on_file_done
+            )
+
+            # 解析完成立即释放上传文件 (内存缓冲 / 临时文件)，不随生成过程长期驻留
+            release_uploads(raw_files_data)
 
-                except Exception as e:
-                    file_extracted_text += f"\n文件 {file_info['name']} 解析失败: {e}\n"
-            
-            final_custom_data = text_custom_data + "\n" + file_extracted_text
-        
-        if raw_files_data:
-            task_manager.append_event(user_id, task_id, f"data: {json.dumps({'type': 'log', 'msg': '📂 正在后台解析上传的文件...'})}\n\n")
-            
-            file_extracted_text = ""
-            for file_info in raw_files_data:
-                time.sleep(0.01) # 释放 GIL
-                
-                try:
-                    extracted = extract_file_content(file_info['content'], file_info['name'])
-                    file_extracted_text += extracted + "\n\n"
-                except Exception as e:
-                    file_extracted_text += f"\n文件 {file_info['name']} 解析失败: {e}\n"
-            
             final_custom_data = text_custom_data + "\n" + file_extracted_text
             task_manager.append_event(user_id, task_id, f"data: {json.dumps({'type': 'log', 'msg': '✅ 文件解析完成，开始生成...'})}\n\n")
 
@@ -87,13 +89,14 @@ def background_worker(
             if check_status_func() == 'stopped':
                 print(f"[Worker] 线程检测到停止信号，正在退出: {task_id}")
                 return
-            task_manager.append_event(user_id, task_id, chunk)
+            task_manager.append_event(user_id, task_id, record_content(user_id, task_id, chunk))
             time.sleep(0.005) 
             
     except Exception as e:
         error_msg = json.dumps({'type': 'log', 'msg': f'❌ 后台任务异常: {str(e)}'})
         task_manager.append_event(user_id, task_id, f"data: {error_msg}\n\n")
     finally:
+        release_uploads(raw_files_data)
         current_status = task_manager.get_status(user_id, task_id)
         if current_status == 'running':
             task_manager.set_status(user_id, task_id, 'completed')
\ No newline at end of file